@@ -0,0 +1,149 @@
+"""
+Signal-conditioning stages applied by DeviceIOC to individual records.
+
+A record with a 'filter:' entry under 'records:' in settings.yaml publishes
+the filtered value, and the unfiltered one on {name}_RAW:
+
+  records:
+    Magnet_LI:
+      PREC: 3
+      filter:                  # one stage, or a list of stages applied in order
+        type: mean             # mean | median | ewma | outlier
+        window: 10             # samples (mean, median, outlier)
+    uWave_FI:
+      filter:
+        - {type: outlier, window: 15, threshold: 4}   # floor: MAD floor, default 10**-PREC
+        - {type: ewma, alpha: 0.2}
+
+Every stage keeps a fixed-size ring of past samples. mean and ewma update in
+O(1); median and outlier keep the window sorted as well (binary search for
+each insert and remove). Non-finite samples (NaN, inf) never enter a stage;
+DeviceIOC passes them straight through.
+"""
+import bisect
+import math
+
+
+class Stage():
+    """Base for filter stages: update(x) takes a raw sample and returns the output."""
+
+    def __init__(self, window=1):
+        self.window = int(window)
+        if self.window < 1:
+            raise ValueError('filter window must be at least 1')
+        self.ring = [0.0] * self.window
+        self.index = 0
+        self.count = 0
+
+    def push(self, x):
+        """Store x in the ring; returns the sample it displaced, or None while filling."""
+        old = self.ring[self.index] if self.count == self.window else None
+        self.ring[self.index] = x
+        self.index = (self.index + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        return old
+
+
+class Mean(Stage):
+    """Moving average over the last window samples, from a running sum."""
+
+    def __init__(self, window=10):
+        super().__init__(window)
+        self.total = 0.0
+        self.updates = 0
+
+    def update(self, x):
+        old = self.push(x)
+        self.total += x - (old or 0.0)
+        self.updates += 1
+        if self.updates % (1000 * self.window) == 0:    # shed accumulated rounding error
+            self.total = math.fsum(self.ring[:self.count])
+        return self.total / self.count
+
+
+class Median(Stage):
+    """Moving median over the last window samples."""
+
+    def __init__(self, window=5):
+        super().__init__(window)
+        self.sorted = []
+
+    def update(self, x):
+        old = self.push(x)
+        if old is not None:
+            del self.sorted[bisect.bisect_left(self.sorted, old)]
+        bisect.insort(self.sorted, x)
+        return median_of(self.sorted)
+
+
+class EWMA(Stage):
+    """Exponentially weighted moving average, y += alpha * (x - y)."""
+
+    def __init__(self, alpha=0.2):
+        super().__init__(1)
+        self.alpha = float(alpha)
+        if not 0 < self.alpha <= 1:
+            raise ValueError('ewma alpha must be in (0, 1]')
+        self.value = None
+
+    def update(self, x):
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+        return self.value
+
+
+class Outlier(Median):
+    """
+    Hampel filter: a sample further than threshold scaled MADs from the median
+    of the window (itself included) is replaced by that median. A genuine step
+    is passed once it fills half the window. The MAD is floored at 'floor'
+    (by default the record's resolution, 10**-PREC), so small real changes on
+    a flat or quantized signal pass while spikes on it are still rejected;
+    with no floor, nothing is rejected while the MAD is zero.
+    """
+
+    def __init__(self, window=15, threshold=3.5, floor=0.0):
+        super().__init__(window)
+        self.threshold = float(threshold)
+        self.floor = float(floor)
+
+    def update(self, x):
+        median = super().update(x)
+        if self.count >= 3:
+            mad = 1.4826 * median_of(sorted(abs(v - median) for v in self.sorted))
+            scale = max(mad, self.floor)
+            if scale > 0 and abs(x - median) > self.threshold * scale:
+                return median
+        return x
+
+
+def median_of(values):
+    """Median of an already sorted list."""
+    n = len(values)
+    mid = n // 2
+    return values[mid] if n % 2 else (values[mid - 1] + values[mid]) / 2
+
+
+STAGES = {'mean': Mean, 'median': Median, 'ewma': EWMA, 'outlier': Outlier}
+
+
+class Pipeline():
+    """Stages from one record's 'filter:' setting, applied in order. resolution, if
+    given, is the default MAD floor of outlier stages."""
+
+    def __init__(self, config, resolution=None):
+        if isinstance(config, dict):
+            config = [config]
+        self.stages = []
+        for entry in config:
+            entry = dict(entry)
+            kind = entry.pop('type', None)
+            if kind not in STAGES:
+                raise ValueError(f'unknown filter type {kind!r}; use one of {", ".join(STAGES)}')
+            if kind == 'outlier' and resolution is not None:
+                entry.setdefault('floor', resolution)
+            self.stages.append(STAGES[kind](**entry))
+
+    def update(self, x):
+        for stage in self.stages:
+            x = stage.update(x)
+        return x
@@ -0,0 +1,230 @@
+"""
+Logging for master_ioc: records are handed to a background thread through a
+bounded queue, so a log call never waits on the terminal or the disk. The
+thread writes the usual human-readable lines to stdout (the screen log) and
+JSON lines to a size-rotated <log_dir>/<ioc>.jsonl. A message that recurs,
+such as a device failing every cycle, is written once per interval and then
+summarized as "repeated N times", even when other messages come in between.
+Only identical messages count as repeats, so events differing in a channel,
+address or error code are each written.
+
+The screen log <log_dir>/<ioc>, which screen appends stdout to, is rotated
+as well: copied to <ioc>.1 (older copies shifted up) and truncated in place,
+after which the caller is told, so it can print the record list again for
+the tools that read PV names from it. Records dropped because the queue was full are reported every
+interval, not only at exit.
+
+Settings (general): log_max_bytes (default 10 MB, for each of the two logs),
+log_backups (default 5), log_repeat_summary (default 60 s: the interval).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+HUMAN_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class JSONFormatter(logging.Formatter):
+    def __init__(self, ioc):
+        super().__init__()
+        self.ioc = ioc
+
+    def format(self, record):
+        entry = {'time': record.created, 'level': record.levelname, 'ioc': self.ioc,
+                 'logger': record.name, 'msg': record.getMessage()}
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if getattr(record, 'repeated', None):
+            entry['repeated'] = record.repeated
+        return json.dumps(entry)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Format message and traceback here, where the arguments are still current, but keep
+        # them apart so the JSON output can hold the traceback in its own field.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RepeatCollapser(logging.Handler):
+    """
+    Forwards records to the target handlers. A message already forwarded within
+    the last 'interval' seconds (same level, logger, text and traceback) is held back
+    and counted; the count goes out as a summary once the interval is over,
+    from the next such message or from expire().
+    """
+    MAX_KEYS = 1000
+
+    def __init__(self, targets, interval=60.0):
+        super().__init__()
+        self.targets = targets
+        self.interval = interval
+        self.seen = {}     # key -> [window start, repeats held back, latest held back record]
+
+    def forward(self, record):
+        for target in self.targets:
+            if record.levelno >= target.level:
+                target.handle(record)
+
+    def summary(self, entry):
+        last = entry[2]
+        record = logging.makeLogRecord(last.__dict__)
+        record.msg = f'{last.msg} [repeated {entry[1]} times]'
+        record.exc_text = None
+        record.created = time.time()
+        record.repeated = entry[1]
+        return record
+
+    def emit(self, record):
+        key = (record.levelno, record.name, record.msg, record.exc_text)
+        now = time.monotonic()
+        entry = self.seen.get(key)
+        if entry is not None and now - entry[0] < self.interval:
+            entry[1] += 1
+            entry[2] = record
+            return
+        if entry is not None and entry[1]:
+            self.forward(self.summary(entry))
+        self.seen.pop(key, None)
+        if len(self.seen) >= self.MAX_KEYS:       # forget the oldest message
+            old = next(iter(self.seen))
+            if self.seen[old][1]:
+                self.forward(self.summary(self.seen[old]))
+            del self.seen[old]
+        self.seen[key] = [now, 0, None]
+        self.forward(record)
+
+    def expire(self):
+        """Send the summaries of intervals that are over, and forget those messages."""
+        now = time.monotonic()
+        for key, entry in list(self.seen.items()):
+            if now - entry[0] >= self.interval:
+                if entry[1]:
+                    self.forward(self.summary(entry))
+                del self.seen[key]
+
+    def flush(self):
+        for entry in self.seen.values():
+            if entry[1]:
+                self.forward(self.summary(entry))
+                entry[1] = 0
+        for target in self.targets:
+            target.flush()
+
+
+class Listener(logging.handlers.QueueListener):
+    """QueueListener that can be stopped more than once."""
+    stopped = False
+
+    def stop(self):
+        if not self.stopped:
+            self.stopped = True
+            super().stop()
+
+
+def rotate_copy(path, backups):
+    """Copy path to path.1 (shifting older copies up) and truncate it in place, for a file
+    another process keeps appending to. Returns False if there was nothing to rotate."""
+    if not os.path.exists(path):
+        return False
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f'{path}.{i}'):
+            os.replace(f'{path}.{i}', f'{path}.{i + 1}')
+    if backups > 0:
+        shutil.copyfile(path, f'{path}.1')
+    with open(path, 'r+b') as f:
+        f.truncate(0)
+    return True
+
+
+def setup_logging(ioc, settings, level=logging.INFO, on_rotate=None):
+    """
+    Route the root logger through the queue. Returns the listener (stopped at exit).
+    on_rotate is called after the screen log has been truncated, from the log maintenance
+    thread, so it should only signal the thread that acts on it (e.g. to list the records again).
+    """
+    general = settings['general']
+    log_dir = general.get('log_dir', 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    max_bytes = general.get('log_max_bytes', 10_000_000)
+    backups = general.get('log_backups', 5)
+    interval = general.get('log_repeat_summary', 60.0)
+
+    human = logging.StreamHandler(sys.stdout)
+    human.setFormatter(logging.Formatter(HUMAN_FORMAT, datefmt=DATE_FORMAT))
+    structured = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, f'{ioc}.jsonl'), maxBytes=max_bytes, backupCount=backups)
+    structured.setFormatter(JSONFormatter(ioc))
+    collapser = RepeatCollapser([human, structured], interval)
+
+    q = queue.Queue(maxsize=10000)
+    handler = DroppingQueueHandler(q)
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = Listener(q, collapser)
+    listener.start()
+
+    screen_log = os.path.join(log_dir, ioc)
+    reported = [0]
+    done = threading.Event()
+
+    def report_drops():
+        if handler.dropped > reported[0]:
+            collapser.forward(logging.makeLogRecord({
+                'levelno': logging.WARNING, 'levelname': 'WARNING', 'created': time.time(),
+                'msg': f'{handler.dropped - reported[0]} log records dropped (queue full)'}))
+            reported[0] = handler.dropped
+
+    def maintain():
+        """Every few seconds: due repeat summaries, drop reports and screen log rotation."""
+        while not done.wait(min(interval, 10.0)):
+            with collapser.lock:       # the listener thread emits under the same lock
+                collapser.expire()
+                report_drops()
+            try:
+                if os.path.getsize(screen_log) > max_bytes and rotate_copy(screen_log, backups) and on_rotate:
+                    on_rotate()
+            except OSError:
+                pass
+
+    threading.Thread(target=maintain, name='log-maintenance', daemon=True).start()
+
+    def stop():
+        done.set()
+        listener.stop()
+        with collapser.lock:
+            collapser.flush()
+            report_drops()
+    atexit.register(stop)
+    return listener
+
@@ -7,10 +7,18 @@ import re
 import time
 import os.path
 import subprocess
+import json
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+import psutil
 import aioca
 import datetime
 
+from profiler import profiler_pvs
+from screens import launch_ioc, screen_sessions
+
 
 async def main():
     """
@@ -39,6 +47,9 @@ async def main():
             await i.heartbeat()
 
     dispatcher(loop)  # put functions to loop in here
+    if 'metrics_port' in settings['general'] or 'metrics_textfile' in settings['general']:
+        exporter = MetricsExporter(i, settings['general'])
+        dispatcher(exporter.loop)
     softioc.interactive_ioc(globals())
 
 
@@ -57,6 +68,18 @@ class IOCManager:
         self.pvs = {}
         self.screens = {}     # Dict of all screens made for the iocs, keyed by screen name
         self.ioc_pvs = {}  # Dict of lists of all PVs in each screen instance, keyed by screen name
+        token = settings['general'].get('agent_token')
+        self.nodes = {node: NodeClient(url, token) for node, url in settings['general'].get('nodes', {}).items()}
+        self.placement = {}   # IOCs running through a node agent: name -> node name
+        self.starts = {}      # number of times each IOC was started, for the metrics exporter
+        for node, status in self.node_replies('status').items():   # IOCs agents kept running across a restart
+            if status is None:
+                print(f"Node agent {node} at {self.nodes[node].url} not reachable.")
+                continue
+            for name in status['iocs']:
+                if name in settings:
+                    self.placement[name] = node
+                    self.screens[name] = self.nodes[node]
 
 
         for name in settings.keys():  # each IOC has controls to start, stop or reset
@@ -76,6 +99,7 @@ class IOCManager:
                                        on_update=self.all_screen_update
                                        )
         self.pv_all.set(0)
+        self.profiler = profiler_pvs('profile', 'ioc_manager', settings)   # on-demand stack sampler
         #self.pv_pid = builder.mbbOut('pids',
         #                               ("Stop",'MINOR'),
         #                               ("Run", 0),
@@ -88,15 +112,19 @@ class IOCManager:
 
         #self.pid_update(1)
 
-    def screen_update(self, i, pv):
+    async def screen_update(self, i, pv):
         """
         Multiple Choice PV has changed for the given control PV. Follow command. 0=Stop, 1=Start, 2=Reset
+        Runs in an executor thread: screen and node agent calls block, and must not hold up the dispatcher.
         """
         pv_name = pv.replace(self.device_name + ':', '')  # remove device name from PV to get bare pv_name
+        await asyncio.get_running_loop().run_in_executor(None, self.control, i, pv_name)
+
+    def control(self, i, pv_name):
         if i==0:
             self.stop_ioc(pv_name)
         elif i==1:
-            if Screen(pv_name).exists:
+            if self.is_running(pv_name.replace('_control', '')):
                 self.reset_ioc(pv_name)   # if it already exists, restart it instead
                 #pass        # if it already exists, do nothing
             else:
@@ -120,7 +148,13 @@ class IOCManager:
         """
         name = pv_name.replace('_control', '')  # remove suffix from pv name to name screen
 
-        self.st = StartThread(self, name, self.screens)
+        self.starts[name] = self.starts.get(name, 0) + 1
+        node = self.node_for(name)
+        if node:
+            self.placement[name] = node
+            self.st = RemoteStartThread(self, name, self.nodes[node])
+        else:
+            self.st = StartThread(self, name, self.screens)
         self.st.daemon = True
         self.st.start()
 
@@ -130,12 +164,62 @@ class IOCManager:
         Kill screen and ioc running within it.
         """
         name = pv_name.replace('_control', '')  # remove suffix from pv name to name screen
-        if Screen(name).exists:
+        if name in self.placement:
+            node = self.placement.pop(name)
+            try:
+                self.nodes[node].stop(name)
+            except OSError as e:
+                print(f"Failed to stop {name} ioc on {node}: {e}")
+            self.pvs[name].set(0)
+        elif name in screen_sessions():
             subprocess.run(["screen","-XS",name,"kill"])
             self.pvs[name].set(0)
         if name in self.screens:
             del self.screens[name]
 
+    def node_for(self, name):
+        """
+        Node to run an IOC on, from its 'host' setting: None for this host (no setting, 'local',
+        or no nodes configured), a node from general 'nodes', or 'auto' for the least loaded node.
+        """
+        host = self.settings[name].get('host', 'local')
+        if host == 'local' or not self.nodes:
+            return None
+        if host != 'auto':
+            if host not in self.nodes:
+                print(f"Unknown host {host} for {name} ioc, starting it locally.")
+                return None
+            return host
+        loads = {}
+        for node, r in self.node_replies('resources').items():
+            if r is not None:
+                loads[node] = r['load'][0] / r['cpus'] + r['iocs'] / 100   # ties go to fewer IOCs
+        if not loads:
+            print(f"No node agent reachable for {name} ioc, starting it locally.")
+            return None
+        return min(loads, key=loads.get)
+
+    def node_replies(self, call):
+        """Ask every node agent at once (e.g. 'status'); {node: reply, or None if it failed}."""
+        def ask(client):
+            try:
+                return getattr(client, call)()
+            except OSError:
+                return None
+        if not self.nodes:
+            return {}
+        with ThreadPoolExecutor(len(self.nodes)) as pool:
+            return dict(zip(self.nodes, pool.map(ask, self.nodes.values())))
+
+    def is_running(self, name):
+        """Is the IOC's screen session up, on this host or on the node it was placed on?"""
+        if name in self.placement:
+            try:
+                return name in self.nodes[self.placement[name]].status()['iocs']
+            except OSError:
+                return False
+        return name in screen_sessions()
+
     def reset_ioc(self, pv_name):
         """
         Kill screen and ioc running within it, then restart.
@@ -177,6 +261,150 @@ class IOCManager:
         except aioca.CANothing as e:
             print("Get error:", e, f"{self.device_name}:{name}_time")
 
+class MetricsExporter:
+    '''
+    OpenMetrics text for all IOCs, collected every 'metrics_period' seconds (blocking parts off the loop):
+    up (local: master_ioc process alive; on a node agent: PVs answering), heartbeat age since the
+    last _time value read, start counts, process CPU/memory/threads of local IOCs, and each IOC's poll
+    cycle time, failed cycles and scheduling latency from its MAN PVs (one batched caget).
+    Served from the cached text at http://<metrics_bind>:<metrics_port>/metrics and, if
+    'metrics_textfile' is set, written there (e.g. for the node_exporter textfile collector).
+    Scrapes never touch CA.
+    '''
+
+    def __init__(self, manager, general):
+        self.manager = manager
+        self.period = general.get('metrics_period', 10)
+        self.textfile = general.get('metrics_textfile')
+        self.text = b'# EOF\n'
+        self.procs = {}    # ioc -> psutil.Process of its master_ioc
+        self.last_time = {}   # ioc -> last _time value read, for the heartbeat age
+        if 'metrics_port' in general:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path != '/metrics':
+                        self.send_error(404)
+                        return
+                    body = exporter.text
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            server = ThreadingHTTPServer((general.get('metrics_bind', '127.0.0.1'), general['metrics_port']), Handler)
+            Thread(target=server.serve_forever, daemon=True).start()
+
+    async def loop(self):
+        while True:
+            try:
+                await self.collect()
+            except Exception as e:   # keep exporting; one bad collection must not end the loop
+                print(f"Metrics collection failed: {e}")
+            await asyncio.sleep(self.period)
+
+    def process(self, name, sessions):
+        """psutil.Process of the master_ioc running in the IOC's screen session, or None."""
+        proc = self.procs.get(name)
+        if proc is not None and proc.is_running():
+            return proc
+        self.procs.pop(name, None)
+        if name not in sessions:
+            return None
+        try:
+            for child in psutil.Process(sessions[name]).children(recursive=True):
+                if any(arg.endswith('master_ioc.py') for arg in child.cmdline()):
+                    self.procs[name] = child
+                    return child
+        except psutil.Error:
+            pass
+        return None
+
+    async def collect(self):
+        """Read the MAN PVs on the loop, then do the blocking part (screen -ls, psutil, textfile)
+        in an executor so the manager's CA callbacks are not held up."""
+        m = self.manager
+        names = [n for n in m.settings if n != 'general']
+        stats = ('time', 'cycle', 'fails', 'sched_lat_max')
+        running = [n for n in names if n in m.screens]
+        values = await aioca.caget([f"{m.device_name}:{n}_{stat}" for n in running for stat in stats],
+                                   timeout=2, throw=False)
+        ioc_stats = {}
+        for k, v in enumerate(values):
+            if not isinstance(v, aioca.CANothing):
+                ioc_stats[(running[k // len(stats)], stats[k % len(stats)])] = float(v)
+        placed, starts = set(m.placement), dict(m.starts)     # snapshots for the worker thread
+        await asyncio.get_running_loop().run_in_executor(None, self.render, names, ioc_stats, placed, starts)
+
+    def render(self, names, ioc_stats, placed, starts):
+        """Build the exposition text from the CA stats plus process data, and write the textfile."""
+        sessions = screen_sessions()
+        families = {
+            'meop_ioc_up': ('gauge', 'IOC is running', {}),
+            'meop_ioc_heartbeat_age_seconds': ('gauge', 'Seconds since the IOC last completed a poll', {}),
+            'meop_ioc_starts': ('counter', 'IOC starts since the manager started', {}),
+            'meop_ioc_cpu_seconds': ('counter', 'CPU time used by the IOC process', {}),
+            'meop_ioc_memory_rss_bytes': ('gauge', 'Resident memory of the IOC process', {}),
+            'meop_ioc_threads': ('gauge', 'Threads in the IOC process', {}),
+            'meop_ioc_cycle_seconds': ('gauge', 'Duration of the last poll cycle', {}),
+            'meop_ioc_failed_cycles': ('counter', 'Poll cycles whose reads failed', {}),
+            'meop_ioc_sched_latency_max_seconds': ('gauge', 'Worst recent loop wake-up lateness', {}),
+        }
+        now = datetime.datetime.now().timestamp()
+        for name in names:
+            if (name, 'time') in ioc_stats:
+                self.last_time[name] = ioc_stats[(name, 'time')]
+            if name in placed:          # on a node agent: up while its PVs answer
+                proc = None
+                up = (name, 'time') in ioc_stats
+            else:                       # local: up while the master_ioc process lives
+                proc = self.process(name, sessions)
+                up = proc is not None
+            families['meop_ioc_up'][2][name] = int(up)
+            families['meop_ioc_starts'][2][name] = starts.get(name, 0)
+            if name in self.last_time:  # keeps growing after the IOC stops answering
+                families['meop_ioc_heartbeat_age_seconds'][2][name] = now - self.last_time[name]
+            if not up:
+                continue
+            if proc is not None:
+                try:
+                    with proc.oneshot():
+                        t = proc.cpu_times()
+                        families['meop_ioc_cpu_seconds'][2][name] = t.user + t.system
+                        families['meop_ioc_memory_rss_bytes'][2][name] = proc.memory_info().rss
+                        families['meop_ioc_threads'][2][name] = proc.num_threads()
+                except psutil.Error:
+                    pass
+            for stat, family, scale in (('cycle', 'meop_ioc_cycle_seconds', 1e-3),
+                                        ('fails', 'meop_ioc_failed_cycles', 1),
+                                        ('sched_lat_max', 'meop_ioc_sched_latency_max_seconds', 1e-3)):
+                if (name, stat) in ioc_stats:
+                    families[family][2][name] = ioc_stats[(name, stat)] * scale
+
+        lines = []
+        for family, (kind, help_text, samples) in families.items():
+            lines.append(f'# TYPE {family} {kind}')
+            lines.append(f'# HELP {family} {help_text}')
+            suffix = '_total' if kind == 'counter' else ''
+            for name, value in samples.items():
+                lines.append(f'{family}{suffix}{{ioc="{name}"}} {value:.12g}')
+        lines.append('# EOF')
+        self.text = ('\n'.join(lines) + '\n').encode()
+        if self.textfile:
+            tmp = self.textfile + '.tmp'
+            try:
+                with open(tmp, 'wb') as f:
+                    f.write(self.text)
+                os.replace(tmp, self.textfile)
+            except OSError as e:
+                print(f"Could not write metrics textfile {self.textfile}: {e}")
+
+
 class StartThread(Thread):
     '''Thread to interact with IOCs in screens. Each thread starts one ioc.'''
 
@@ -190,34 +418,68 @@ class StartThread(Thread):
         '''
         Start screen to run ioc, then run ioc. Wait until started, then get PV names from IOC after run.
         '''
-        screen = Screen(self.name, True)
-        screen.send_commands('bash')
-        screen.send_commands(f'python master_ioc.py -i {self.name}')
-        screen.enable_logs(f"{self.parent.settings['general']['log_dir']}/{self.name}")
-        screen.send_commands('softioc.dbl()')
-
-        elapsed = 0
-        pvs = []
-        while True:           # wait until ioc starts to get response
-            #print("Waiting for logfile for", self.name)
-            if os.path.getsize(f"{self.parent.settings['general']['log_dir']}/{self.name}") > 10:
-                with open(f"{self.parent.settings['general']['log_dir']}/{self.name}") as f:
-                    for line in f:
-                        match = re.search(f"({self.parent.settings['general']['prefix']}.+)"+r'\s', line)
-                        if match:
-                            pvs.append(match.group(1))
-                self.parent.ioc_pvs[self.name] = pvs   # send the list of pvs back to manager
-                self.parent.pvs[self.name].set(1)
-                break
-            time.sleep(1)
-            elapsed += 1
-            if elapsed > 20:
-                print(f"Failed to start {self.name} ioc, died waiting on log file after {elapsed} seconds.")
-                break
-
+        screen, pvs = launch_ioc(self.parent.settings, self.name)
+        if pvs is not None:
+            self.parent.ioc_pvs[self.name] = pvs   # send the list of pvs back to manager
+            self.parent.pvs[self.name].set(1)
         self.screens[self.name] = screen
 
 
+class RemoteStartThread(Thread):
+    '''Thread to start one ioc through the node agent of another host.'''
+
+    def __init__(self, parent, name, node):
+        Thread.__init__(self)
+        self.parent = parent
+        self.name = name
+        self.node = node
+
+    def run(self):
+        try:
+            reply = self.node.start(self.name)
+        except OSError as e:
+            print(f"Failed to start {self.name} ioc on {self.node.url}: {e}")
+            self.parent.placement.pop(self.name, None)
+            return
+        if reply.get('pvs') is not None:
+            self.parent.ioc_pvs[self.name] = reply['pvs']
+            self.parent.pvs[self.name].set(1)
+        self.parent.screens[self.name] = self.node
+
+
+class NodeClient:
+    '''Talks to the node_agent of one host over HTTP/JSON. Every failure, including a reply
+    that is not JSON, raises OSError. Only start waits longer, as the agent waits for the IOC.'''
+
+    def __init__(self, url, token=None, timeout=3, start_timeout=30):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+
+    def request(self, method, path, timeout=None):
+        req = urllib.request.Request(self.url + path, method=method)
+        if self.token:
+            req.add_header('X-Agent-Token', self.token)
+        with urllib.request.urlopen(req, timeout=timeout or self.timeout) as reply:
+            try:
+                return json.load(reply)
+            except ValueError as e:
+                raise OSError(f"Bad reply from {self.url}{path}: {e}") from e
+
+    def start(self, name):
+        return self.request('POST', f'/start/{name}', self.start_timeout)
+
+    def stop(self, name):
+        return self.request('POST', f'/stop/{name}')
+
+    def status(self):
+        return self.request('GET', '/status')
+
+    def resources(self):
+        return self.request('GET', '/resources')
+
+
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Expression engine for derived PVs.
+
+Each entry under 'calcs' becomes an ai record computed from an expression
+over input PVs (named by the aliases under 'inputs') and over other calcs.
+Expressions are parsed once at startup, checked against a small whitelist
+of operators and NumPy functions, and compiled; inputs are held as monitors
+(logic_devices.inputs). When inputs change, only the calcs that depend on
+them are re-evaluated, in topological order so chained calcs see fresh
+values, and a burst of updates is coalesced into one pass.
+
+derived:
+  module: 'logic_devices.calc'
+  autostart: True
+  delay: 1                             # input health check period
+  inputs:                              # alias: PV
+    loop_ma: 'TGT:MEOP:Datexel_CI1'
+    p_high: 'TGT:MEOP:Gauge1_PI'
+    p_low: 'TGT:MEOP:Gauge2_PI'
+  calcs:
+    He_Level_LI:
+      expr: 'clip((loop_ma - 4) / 16 * 100, 0, 100)'
+      egu: '%'
+      prec: 1
+      desc: 'Helium level'
+    P_Ratio_RI: 'p_high / p_low'       # short form: just the expression
+    P_Ratio_Log_RI: 'log10(P_Ratio_RI)'
+  channels: []
+
+A calc goes INVALID if any input is disconnected or INVALID, or if its result
+is not finite (e.g. a division by zero); otherwise it takes the highest
+severity among its inputs.
+"""
+import ast
+import asyncio
+import graphlib
+
+import numpy as np
+from softioc import alarm, builder
+
+from logic_devices.inputs import InputCache
+
+FUNCTIONS = {
+    'abs': np.abs, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log, 'log10': np.log10,
+    'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'min': lambda *a: np.min(a), 'max': lambda *a: np.max(a),
+    'clip': np.clip, 'where': np.where, 'pi': np.pi,
+}
+ARITY = {    # function: (least, most) arguments, None for any number; checked when compiling
+    'abs': (1, 1), 'sqrt': (1, 1), 'exp': (1, 1), 'log': (1, 1), 'log10': (1, 1),
+    'sin': (1, 1), 'cos': (1, 1), 'tan': (1, 1), 'min': (1, None), 'max': (1, None),
+    'clip': (3, 3), 'where': (3, 3),
+}
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+)
+
+
+class Expression():
+    """One parsed and compiled expression, with the names it depends on."""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        try:
+            tree = ast.parse(text, mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f'{name}: cannot parse {text!r}: {e.msg}') from None
+        for node in ast.walk(tree):
+            if not isinstance(node, ALLOWED_NODES):
+                raise ValueError(f'{name}: {type(node).__name__} not allowed in {text!r}')
+            if isinstance(node, ast.Call):
+                if not (isinstance(node.func, ast.Name) and node.func.id in ARITY):
+                    raise ValueError(f'{name}: unknown function in {text!r}')
+                least, most = ARITY[node.func.id]
+                if len(node.args) < least or (most is not None and len(node.args) > most):
+                    raise ValueError(f'{name}: {node.func.id}() takes {least if least == most else f"{least} or more"} '
+                                     f'argument(s), not {len(node.args)}, in {text!r}')
+        self.deps = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name)} - set(FUNCTIONS)
+        self.code = compile(tree, f'<calc {name}>', 'eval')
+
+    def __call__(self, namespace):
+        return eval(self.code, {'__builtins__': {}}, namespace)
+
+
+class Device():
+    """Derived PVs computed from monitored inputs."""
+
+    def __init__(self, device_name, settings):
+        self.device_name = device_name
+        self.settings = settings
+        self.aliases = dict(settings.get('inputs', {}))
+        self.by_pv = {}       # pv -> every alias naming it
+        for alias, pv in self.aliases.items():
+            self.by_pv.setdefault(pv, []).append(alias)
+        self.exprs = {}
+        self.pvs = {}
+        for name, entry in settings.get('calcs', {}).items():
+            if isinstance(entry, str):
+                entry = {'expr': entry}
+            self.exprs[name] = Expression(name, entry['expr'])
+            self.pvs[name] = builder.aIn(name, PREC=entry.get('prec', 3), EGU=entry.get('egu', ''),
+                                         DESC=entry.get('desc', '')[:40])
+
+        known = set(self.aliases) | set(self.exprs)
+        for expr in self.exprs.values():
+            unknown = expr.deps - known
+            if unknown:
+                raise ValueError(f'{expr.name}: unknown name(s) {", ".join(sorted(unknown))}')
+        try:
+            self.order = list(graphlib.TopologicalSorter(
+                {name: expr.deps & set(self.exprs) for name, expr in self.exprs.items()}).static_order())
+        except graphlib.CycleError as e:
+            raise ValueError(f'calcs depend on each other in a cycle: {" -> ".join(e.args[1])}') from None
+
+        # name -> every calc that needs re-evaluating when it changes, in evaluation order
+        self.dependents = {}
+        for name in known:
+            affected = {name}
+            for calc in self.order:
+                if self.exprs[calc].deps & affected:
+                    affected.add(calc)
+            self.dependents[name] = [c for c in self.order if c in affected and c != name]
+
+        self.namespace = dict(FUNCTIONS)
+        self.namespace.update({name: np.float64(np.nan) for name in known})
+        self.severity = {name: alarm.INVALID_ALARM for name in known}
+        self.inputs = InputCache(list(self.aliases.values()), on_change=self.input_changed)
+        self.scheduled = False
+
+    def connect(self):
+        """Nothing to connect to; inputs are subscribed from the first read."""
+        return True
+
+    def input_changed(self, pv):
+        """Schedule one evaluation pass for however many updates arrive in this loop pass."""
+        if not self.scheduled and self.inputs.started:
+            self.scheduled = True
+            asyncio.get_event_loop().call_soon(self.evaluate)
+
+    async def do_reads(self):
+        """Subscribe on the first call. Always succeeds: a bad input shows as INVALID on the calcs
+        that use it, and must not stop this IOC's heartbeat."""
+        if not self.inputs.started:
+            self.inputs.start()
+            self.evaluate(everything=True)
+        return True
+
+    def evaluate(self, everything=False):
+        self.scheduled = False
+        todo = set(self.order) if everything else set()
+        for pv in self.inputs.take_dirty():
+            value = self.inputs.values[pv]
+            for alias in self.by_pv[pv]:
+                self.namespace[alias] = np.float64(np.nan if value is None else value)
+                self.severity[alias] = self.inputs.severity[pv]
+                todo.update(self.dependents[alias])
+
+        with np.errstate(all='ignore'):
+            for name in self.order:
+                if name not in todo:
+                    continue
+                expr = self.exprs[name]
+                severity = max((self.severity[d] for d in expr.deps), default=alarm.NO_ALARM)
+                try:
+                    value = float(expr(self.namespace))
+                except (ArithmeticError, ValueError, TypeError):
+                    value = np.nan
+                if not np.isfinite(value):
+                    severity = alarm.INVALID_ALARM
+                self.namespace[name] = np.float64(value)
+                self.severity[name] = severity
+                self.pvs[name].set(value, severity=severity,
+                                   alarm=alarm.NO_ALARM if severity == alarm.NO_ALARM else alarm.CALC_ALARM)
@@ -0,0 +1,185 @@
+"""
+General-purpose feed-forward: a scaled, clamped sum of transformed source PVs.
+
+Sources are held as monitors (logic_devices.inputs), so adding one costs a
+subscription rather than a caget per cycle. Coefficients and lookup tables
+are compiled into padded NumPy arrays at startup and every source is
+evaluated in one vectorized pass, and only when an input has changed; a
+burst of updates arriving together is coalesced into one evaluation.
+
+ff_heater:
+  module: 'logic_devices.feedforward'
+  autostart: True
+  delay: 1                             # input health check period
+  egu: '%'                             # units for the output PV
+  prec: 3
+  #output_pv: 'TGT:MEOP:Some_Actuator' # optional: caput result directly (standalone use)
+  sources:                             # each source: read PV, transform, then summed
+    - pv: 'TGT:MEOP:PID_Temp_V2_SP'
+      type: 'poly'                     # y = c0 + c1*x + c2*x^2 (coeffs ascending)
+      coeffs: [0.0, 0.5, 0.01]
+    - pv: 'TGT:MEOP:OVC_TI'
+      type: 'lookup'                   # piecewise-linear over (x, y) breakpoints (distinct x), held at the ends
+      table: [[4.0, 10.0], [10.0, 25.0], [20.0, 60.0]]
+    - pv: 'TGT:MEOP:Some_Flow'
+      type: 'linear'                   # y = gain*x + offset
+      gain: 2.0
+      offset: 1.0
+  outs:
+    scale: 1.0                         # overall multiplier on summed sources
+    bias: 0.0                          # constant added after scaling
+    min_output: 0                      # output clamp low  (omit for none)
+    max_output: 100                    # output clamp high (omit for none)
+    enable: True                       # start enabled? (Off forces output to 0)
+  channels:                            # single channel; output PV is {channel}_CV
+    - FF_Heater
+"""
+import asyncio
+import logging
+
+import aioca
+import numpy as np
+from softioc import alarm, builder
+
+from logic_devices.inputs import InputCache
+
+
+class Transforms():
+    """
+    Source transforms compiled to arrays. Linear sources are first-order
+    polynomials; polynomials share one zero-padded coefficient matrix and
+    lookups one breakpoint matrix padded with +inf.
+    """
+
+    def __init__(self, sources):
+        self.n = len(sources)
+        poly, lookup = [], []
+        for i, source in enumerate(sources):
+            kind = source.get('type', 'linear')
+            if kind == 'poly':
+                poly.append((i, [float(c) for c in source['coeffs']]))
+            elif kind == 'linear':
+                poly.append((i, [float(source.get('offset', 0.0)), float(source.get('gain', 1.0))]))
+            elif kind == 'lookup':
+                table = sorted((float(x), float(y)) for x, y in source['table'])
+                if len(table) < 2:
+                    raise ValueError(f"lookup source {source['pv']} needs at least two breakpoints")
+                if any(a[0] == b[0] for a, b in zip(table, table[1:])):
+                    raise ValueError(f"lookup source {source['pv']} has repeated x breakpoints")
+                lookup.append((i, table))
+            else:
+                raise ValueError(f"unknown source type {kind!r} for {source['pv']}")
+
+        self.poly_idx = np.array([i for i, _ in poly], dtype=np.intp)
+        degree = max((len(c) for _, c in poly), default=1)
+        self.coeffs = np.zeros((len(poly), degree))
+        for row, (_, c) in enumerate(poly):
+            self.coeffs[row, :len(c)] = c
+
+        self.lookup_idx = np.array([i for i, _ in lookup], dtype=np.intp)
+        width = max((len(t) for _, t in lookup), default=2)
+        self.bx = np.full((len(lookup), width), np.inf)
+        self.by = np.zeros((len(lookup), width))
+        self.last = np.zeros(len(lookup), dtype=np.intp)       # index of each table's last real point
+        for row, (_, table) in enumerate(lookup):
+            xs, ys = zip(*table)
+            self.bx[row, :len(xs)] = xs
+            self.by[row, :len(ys)] = ys
+            self.by[row, len(ys):] = ys[-1]
+            self.last[row] = len(xs) - 1
+
+    def __call__(self, x):
+        """Transformed value of every source, for input vector x."""
+        y = np.empty(self.n)
+        if len(self.poly_idx):
+            xp = x[self.poly_idx]
+            acc = self.coeffs[:, -1].copy()
+            for k in range(self.coeffs.shape[1] - 2, -1, -1):       # Horner, all rows at once
+                acc *= xp
+                acc += self.coeffs[:, k]
+            y[self.poly_idx] = acc
+        if len(self.lookup_idx):
+            xl = x[self.lookup_idx]
+            rows = np.arange(len(xl))
+            seg = np.clip((self.bx <= xl[:, None]).sum(axis=1) - 1, 0, self.last - 1)
+            x0, x1 = self.bx[rows, seg], self.bx[rows, seg + 1]
+            y0, y1 = self.by[rows, seg], self.by[rows, seg + 1]
+            frac = np.clip((xl - x0) / (x1 - x0), 0.0, 1.0)
+            y[self.lookup_idx] = y0 + frac * (y1 - y0)
+        return y
+
+
+class Device():
+    """Feed-forward output recomputed whenever one of its sources changes."""
+
+    def __init__(self, device_name, settings):
+        self.device_name = device_name
+        self.settings = settings
+        self.outs = settings.get('outs', {})
+        self.delay = settings.get('delay', 1)
+        self.output_pv = settings.get('output_pv')
+        self.channel = settings['channels'][0]
+        self.sources = settings.get('sources', [])
+        self.source_pvs = [s['pv'] for s in self.sources]
+        self.transforms = Transforms(self.sources)
+        self.x = np.zeros(len(self.sources))
+        self.inputs = InputCache(self.source_pvs, on_change=self.input_changed)
+        self.scheduled = False
+
+        c = self.channel
+        self.pvs = {
+            f'{c}_CV': builder.aIn(f'{c}_CV', EGU=settings.get('egu', ''), PREC=settings.get('prec', 3)),
+            f'{c}_Enable': builder.boolOut(f'{c}_Enable', ZNAM='Off', ONAM='On',
+                                           initial_value=bool(self.outs.get('enable', True)),
+                                           on_update=lambda v: self.input_changed(None)),
+            f'{c}_Scale': builder.aOut(f'{c}_Scale', initial_value=self.outs.get('scale', 1.0), PREC=4,
+                                       on_update=lambda v: self.input_changed(None)),
+            f'{c}_Bias': builder.aOut(f'{c}_Bias', initial_value=self.outs.get('bias', 0.0), PREC=4,
+                                      on_update=lambda v: self.input_changed(None)),
+        }
+
+    def connect(self):
+        """Nothing to connect to; sources are subscribed from the first read."""
+        return True
+
+    def input_changed(self, pv):
+        """Schedule one recompute for however many updates arrive in this loop pass."""
+        if not self.scheduled and self.inputs.started:
+            self.scheduled = True
+            asyncio.get_event_loop().call_soon(lambda: asyncio.ensure_future(self.evaluate()))
+
+    async def do_reads(self):
+        """Subscribe on the first call; afterwards report whether every source is valid."""
+        if not self.inputs.started:
+            self.inputs.start()
+            await self.evaluate()
+        return self.inputs.ready() and all(
+            self.inputs.severity[pv] != alarm.INVALID_ALARM for pv in self.source_pvs)
+
+    async def evaluate(self):
+        self.scheduled = False
+        c = self.channel
+        dirty = self.inputs.take_dirty()
+        for i, pv in enumerate(self.source_pvs):
+            if pv in dirty:
+                self.x[i] = float(self.inputs.values[pv])
+
+        if not self.pvs[f'{c}_Enable'].get():
+            output = 0.0
+        else:
+            total = self.transforms(self.x).sum() if len(self.x) else 0.0
+            output = float(total * self.pvs[f'{c}_Scale'].get() + self.pvs[f'{c}_Bias'].get())
+            if 'min_output' in self.outs:
+                output = max(output, self.outs['min_output'])
+            if 'max_output' in self.outs:
+                output = min(output, self.outs['max_output'])
+
+        valid = self.inputs.ready() and all(
+            self.inputs.severity[pv] != alarm.INVALID_ALARM for pv in self.source_pvs)
+        self.pvs[f'{c}_CV'].set(output, severity=alarm.NO_ALARM if valid else alarm.INVALID_ALARM,
+                                alarm=alarm.NO_ALARM if valid else alarm.UDF_ALARM)
+        if self.output_pv and valid:
+            try:
+                await aioca.caput(self.output_pv, output, timeout=self.delay)
+            except aioca.CANothing as e:
+                logging.warning(f'Feed-forward output {self.output_pv} not written: {e}')
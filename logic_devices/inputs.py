@@ -0,0 +1,129 @@
+"""
+Subscribed input cache shared by the logic devices.
+
+Holds the latest value, timestamp and severity of a set of input PVs. Remote
+PVs are camonitored once; PVs served by records in this same process are
+tapped directly, so no CA round trip is made for them. Each change of value
+or severity (including a disconnect) marks the PV dirty and calls
+on_change(pv), letting a device recompute only when an input actually moved.
+
+    inputs = InputCache(['TGT:MEOP:Test_TI'], on_change=self.input_changed)
+    inputs.start()          # from the dispatcher loop, i.e. the first do_reads()
+"""
+import time
+
+import aioca
+from softioc import alarm
+from softioc.device_core import LookupRecord
+
+# softioc keeps an Out record's on_update callback here (name-mangled private attribute)
+OUT_ON_UPDATE = '_ProcessDeviceSupportOut__on_update'
+
+
+class InputCache():
+    """Latest values of a list of PVs, kept current by monitors."""
+
+    def __init__(self, pvs, on_change=None):
+        self.pvs = list(dict.fromkeys(pvs))
+        self.on_change = on_change
+        self.values = dict.fromkeys(self.pvs)
+        self.stamps = dict.fromkeys(self.pvs)          # wall-clock time of the sample
+        self.arrived = dict.fromkeys(self.pvs)         # monotonic time the update reached us
+        self.severity = {pv: alarm.INVALID_ALARM for pv in self.pvs}
+        self.dirty = set()
+        self.local = {}
+        self.remote = []
+        self.subs = []
+        self.started = False
+
+    def start(self):
+        """Subscribe to every input. Must run on the dispatcher's event loop."""
+        if self.started:
+            return
+        self.started = True
+        for pv in self.pvs:
+            if pv in self.local:        # already tapped on an earlier start()
+                continue
+            record = local_record(pv)
+            if record is None:
+                self.remote.append(pv)
+            else:
+                self.local[pv] = record
+                self._tap(pv, record)
+        if self.remote:
+            self.subs = aioca.camonitor(self.remote, self._update, format=aioca.FORMAT_TIME,
+                                        notify_disconnect=True)
+
+    def close(self):
+        for sub in self.subs:
+            sub.close()
+        self.subs = []
+        self.remote = []
+        self.started = False
+
+    def _tap(self, pv, record):
+        """
+        Wrap a local record's set() so writes land here without going through CA.
+        An Out record's second positional argument is process, not severity, so
+        the severity is only taken as a keyword. Out records are also written by
+        CA puts, which never call set(): their on_update hook is wrapped as well.
+        """
+        original = record.set
+
+        def set(value, *args, **kwargs):
+            original(value, *args, **kwargs)
+            self.store(pv, record.get(), time.time(), kwargs.get('severity', alarm.NO_ALARM))
+        record.set = set
+
+        if hasattr(record, OUT_ON_UPDATE):
+            user = getattr(record, OUT_ON_UPDATE)
+
+            def on_update(value):
+                self.store(pv, value, time.time(), alarm.NO_ALARM)
+                if user is not None:
+                    return user(value)
+            setattr(record, OUT_ON_UPDATE, on_update)
+        self.store(pv, record.get(), time.time(), alarm.NO_ALARM)
+
+    def _update(self, value, index):
+        pv = self.remote[index]
+        if not value.ok:           # disconnected
+            self.severity[pv] = alarm.INVALID_ALARM
+            self.dirty.add(pv)
+            if self.on_change:
+                self.on_change(pv)
+            return
+        self.store(pv, value, value.timestamp, value.severity)
+
+    def store(self, pv, value, stamp, severity):
+        changed = value != self.values[pv] or severity != self.severity[pv]
+        self.values[pv] = value
+        self.stamps[pv] = stamp
+        self.arrived[pv] = time.monotonic()
+        self.severity[pv] = severity
+        if changed:
+            self.dirty.add(pv)
+            if self.on_change:
+                self.on_change(pv)
+
+    def ready(self):
+        """True once every input has a value."""
+        return all(v is not None for v in self.values.values())
+
+    def age(self, pv):
+        """Seconds since pv last updated, or None if it never has."""
+        arrived = self.arrived[pv]
+        return None if arrived is None else time.monotonic() - arrived
+
+    def take_dirty(self):
+        """Return and clear the set of inputs changed since the last call."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+
+def local_record(pv):
+    """The softioc record serving pv in this process, or None."""
+    try:
+        return LookupRecord(pv)
+    except KeyError:
+        return None
@@ -0,0 +1,203 @@
+"""
+Self-contained PID controller with optional event-driven execution.
+
+Reads a process value from input_pv and writes the control value to
+output_pv. Inputs are held by monitors (logic_devices.inputs), and those
+served by records in this same IOC are read and written directly, without
+a CA round trip.
+
+In 'poll' mode the loop runs once per 'delay', as the IOC polls. In
+'monitor' mode the control value is recomputed as soon as a new input
+sample arrives, no sooner than min_interval after the previous computation;
+the 'delay' tick then only keeps the integral moving while the input is
+steady. In both modes a watchdog flags the input stale and holds the output
+once the input record has not processed for 'watchdog' seconds.
+
+pid_temp_v2:
+  module: 'logic_devices.pid'
+  autostart: True
+  delay: 1                             # poll period, or steady-input tick in monitor mode
+  update_mode: monitor                 # poll (default) or monitor
+  min_interval: 0.1                    # monitor mode: minimum seconds between computations
+  watchdog: 5                          # input stale after this many seconds without processing
+  input_pv: 'TGT:MEOP:Test_TI'
+  output_pv: 'TGT:MEOP:Test_Heater_CI'
+  feedforward_pv: 'TGT:MEOP:FF_Heater_CV'  # optional, summed into the output
+  outs:
+    kp: 2.0
+    ki: 0.5
+    kd: 0.1
+    setpoint: 4.5
+    min_output: 0
+    max_output: 100
+    kaw: 1.0                           # anti-windup back-calculation gain
+    feedforward: 0.0                   # constant feed-forward term
+    auto_start: False                  # start in Manual mode
+  channels:
+    - PID_Temp_V2
+
+Records, for channel C: C_SP, C_KP, C_KI, C_KD, C_Mode (Manual/Auto),
+C_CV (control value; writable in Manual), C_PV (last process value) and
+C_Stale (input watchdog).
+"""
+import asyncio
+import logging
+import time
+
+import aioca
+from softioc import alarm, builder
+
+from logic_devices.inputs import InputCache, local_record
+
+
+class Device():
+    """PID loop from input_pv to output_pv, polled or driven by input monitors."""
+
+    def __init__(self, device_name, settings):
+        self.device_name = device_name
+        self.settings = settings
+        self.outs = settings.get('outs', {})
+        self.delay = settings.get('delay', 1)
+        self.mode = settings.get('update_mode', 'poll')
+        if self.mode not in ('poll', 'monitor'):
+            raise ValueError(f"update_mode must be 'poll' or 'monitor', not {self.mode!r}")
+        self.min_interval = settings.get('min_interval', 0.0)
+        self.watchdog = settings.get('watchdog', 5 * self.delay)
+        self.input_pv = settings['input_pv']
+        self.output_pv = settings['output_pv']
+        self.ff_pv = settings.get('feedforward_pv')
+        self.channel = settings['channels'][0]
+
+        self.integral = 0.0
+        self.last_pv = None
+        self.last_time = None        # monotonic time of the last computation
+        self.pending = None          # scheduled or running computation (monitor mode)
+        self.lock = asyncio.Lock()   # one step() at a time, whichever path started it
+        self.output_record = None
+        self.inputs = InputCache([self.input_pv] + ([self.ff_pv] if self.ff_pv else []),
+                                 on_change=self.input_changed if self.mode == 'monitor' else None)
+
+        c = self.channel
+        self.pvs = {
+            f'{c}_SP': builder.aOut(f'{c}_SP', initial_value=self.outs.get('setpoint', 0), PREC=3),
+            f'{c}_KP': builder.aOut(f'{c}_KP', initial_value=self.outs.get('kp', 0), PREC=4),
+            f'{c}_KI': builder.aOut(f'{c}_KI', initial_value=self.outs.get('ki', 0), PREC=4),
+            f'{c}_KD': builder.aOut(f'{c}_KD', initial_value=self.outs.get('kd', 0), PREC=4),
+            f'{c}_Mode': builder.boolOut(f'{c}_Mode', ZNAM='Manual', ONAM='Auto',
+                                         initial_value=bool(self.outs.get('auto_start', False))),
+            f'{c}_CV': builder.aOut(f'{c}_CV', initial_value=self.outs.get('min_output', 0), PREC=3,
+                                    DRVL=self.outs.get('min_output', 0),
+                                    DRVH=self.outs.get('max_output', 100),
+                                    on_update=self.manual_output),
+            f'{c}_PV': builder.aIn(f'{c}_PV', PREC=3),
+            f'{c}_Stale': builder.boolIn(f'{c}_Stale', ZNAM='OK', ONAM='Stale', ONSV='MAJOR'),
+        }
+
+    def connect(self):
+        """Nothing to connect to; inputs are subscribed from the first read."""
+        return True
+
+    def manual_output(self, value):
+        """Operator wrote the control value: pass it through in Manual."""
+        if not self.pvs[f'{self.channel}_Mode'].get():
+            asyncio.ensure_future(self.write_output(value))
+
+    def input_changed(self, pv):
+        """Monitor mode: run the loop on each new input sample, rate limited by min_interval."""
+        if pv != self.input_pv or self.pending is not None:
+            return
+        wait = 0.0 if self.last_time is None else self.min_interval - (time.monotonic() - self.last_time)
+        if wait <= 0:
+            self.pending = asyncio.ensure_future(self.step())
+        else:
+            self.pending = asyncio.get_event_loop().call_later(
+                wait, lambda: setattr(self, 'pending', asyncio.ensure_future(self.step())))
+
+    async def do_reads(self):
+        """Poll mode: one loop iteration. Monitor mode: watchdog and steady-input tick."""
+        if not self.inputs.started:
+            self.inputs.start()
+            self.output_record = local_record(self.output_pv)
+        stale = await self.input_stale()
+        self.pvs[f'{self.channel}_Stale'].set(stale)
+        if stale:
+            self.last_time = None     # no integral or derivative across the gap on recovery
+            return False
+        if self.mode == 'poll':
+            return await self.step()
+        if self.pending is None and (self.last_time is None
+                                     or time.monotonic() - self.last_time >= self.delay):
+            self.pending = asyncio.ensure_future(self.step())   # so input_changed() waits its turn
+            await self.pending
+        return True
+
+    async def input_stale(self):
+        """
+        True if the input record has stopped processing. A quiet monitor alone
+        is not enough, since a steady value posts no updates (MDEL), so a remote
+        input is confirmed with one caget: an advanced timestamp means it is alive.
+        """
+        age = self.inputs.age(self.input_pv)
+        if age is not None and age <= self.watchdog:
+            return False
+        if self.input_pv in self.inputs.local:
+            return True
+        try:
+            value = await aioca.caget(self.input_pv, format=aioca.FORMAT_TIME, timeout=self.delay)
+        except aioca.CANothing as e:
+            logging.warning(f'PID input {self.input_pv} unavailable: {e}')
+            return True
+        if value.timestamp == self.inputs.stamps[self.input_pv] and age is not None:
+            return True
+        self.inputs.store(self.input_pv, value, value.timestamp, value.severity)
+        return False
+
+    async def step(self):
+        """Compute and write one control value. Returns True if the input was usable."""
+        async with self.lock:
+            try:
+                return await self._step()
+            finally:
+                self.pending = None
+
+    async def _step(self):
+        pv = self.inputs.values[self.input_pv]
+        if pv is None or self.inputs.severity[self.input_pv] == alarm.INVALID_ALARM:
+            return False
+        pv = float(pv)
+        now = time.monotonic()
+        dt = 0.0 if self.last_time is None else now - self.last_time
+        c = self.channel
+        self.pvs[f'{c}_PV'].set(pv)
+
+        kp, ki, kd = (self.pvs[f'{c}_{k}'].get() for k in ('KP', 'KI', 'KD'))
+        error = self.pvs[f'{c}_SP'].get() - pv
+        # derivative on measurement, so setpoint steps do not kick the output
+        d = -kd * (pv - self.last_pv) / dt if dt > 0 and self.last_pv is not None else 0.0
+        p = kp * error
+        ff = self.outs.get('feedforward', 0.0)
+        if self.ff_pv and self.inputs.values[self.ff_pv] is not None:
+            ff += float(self.inputs.values[self.ff_pv])
+
+        if self.pvs[f'{c}_Mode'].get():
+            unclamped = p + self.integral + d + ff
+            output = min(max(unclamped, self.outs.get('min_output', 0)),
+                         self.outs.get('max_output', 100))
+            self.integral += ki * error * dt + self.outs.get('kaw', 1.0) * (output - unclamped) * dt
+            self.pvs[f'{c}_CV'].set(output, process=False)
+            await self.write_output(output)
+        else:
+            # track the manual output so switching to Auto is bumpless
+            self.integral = self.pvs[f'{c}_CV'].get() - p - d - ff
+
+        self.last_pv, self.last_time = pv, now
+        return True
+
+    async def write_output(self, value):
+        if self.output_record is not None:
+            self.output_record.set(value)
+            return
+        try:
+            await aioca.caput(self.output_pv, value, timeout=self.delay)
+        except aioca.CANothing as e:
+            logging.warning(f'PID output {self.output_pv} not written: {e}')
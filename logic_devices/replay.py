@@ -0,0 +1,149 @@
+"""
+Replays recorded channel data into live PVs of the same names, at 1x or
+faster, keeping the original spacing between samples. Data is streamed from
+the file or archive as it is due, never loaded whole, so hours of history
+can be replayed in minutes at any size. Do not run it alongside the IOC
+whose records it stands in for.
+
+replay_cooldown:
+  module: 'logic_devices.replay'
+  autostart: False
+  delay: 0.1                 # publish tick in seconds
+  format: csv                # csv or archive
+  source: 'cooldown.csv'     # csv file, or the pv_archiver folder for 'archive'
+  start: '2024-05-01T08:00'  # optional, archive only: first and last sample times
+  end: '2024-05-01T20:00'
+  speed: 10                  # replay rate, 1 = real time (also the Replay_Speed PV)
+  loop: False                # start over at the end
+  max_per_tick: 1000         # most samples published per tick; beyond it the replay falls behind
+  channels:                  # records to publish: csv columns, or archived {prefix}:{channel}
+    - Test_TI
+    - Test_Heater_CI
+
+CSV files are either wide, a 'time' column then one column per channel, or
+long, with 'time', 'pv' and 'value' (and optionally 'severity') columns; pv
+may carry the prefix. Times are epoch seconds or ISO format, in order.
+Extra records: Replay_Speed, Replay_Run (Pause/Run) and Replay_Time (the
+original timestamp of the latest published sample).
+
+Every sample is published, in timestamp order, so transients reach PID
+loops and alarm limits however fast the replay runs. If more than
+max_per_tick samples come due in one tick, the replay clock is held back at
+the last one published rather than skipping any.
+"""
+import csv
+import datetime
+import heapq
+import os
+import time
+
+from softioc import builder
+
+
+def parse_time(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def csv_samples(path, channels):
+    """Yield (time, channel, value, severity) from a wide or long CSV file, one row at a time."""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        if header[:3] == ['time', 'pv', 'value']:
+            has_severity = len(header) > 3 and header[3] == 'severity'
+            for row in reader:
+                name = row[1].split(':')[-1]
+                if name in channels and row[2] != '':
+                    severity = int(row[3]) if has_severity and len(row) > 3 and row[3] != '' else 0
+                    yield parse_time(row[0]), name, float(row[2]), severity
+        else:
+            columns = [(i, name) for i, name in enumerate(header) if name in channels]
+            for row in reader:
+                t = parse_time(row[0])
+                for i, name in columns:
+                    if i < len(row) and row[i] != '':
+                        yield t, name, float(row[i]), 0
+
+
+def archive_samples(folder, prefix, channels, start, end):
+    """Yield (time, channel, value, severity) from pv_archiver chunks, merged across channels in time order."""
+    from pv_archiver import ArchiveReader
+    reader = ArchiveReader(folder)
+
+    def one(name):
+        for t, v, s in reader.iter_range(f'{prefix}:{name}', start, end):
+            yield t, name, v, s
+    return heapq.merge(*(one(name) for name in channels), key=lambda sample: sample[0])
+
+
+class Device():
+    """Publishes recorded samples as their replay time comes due."""
+
+    def __init__(self, device_name, settings):
+        self.device_name = device_name
+        self.settings = settings
+        self.channels = [c for c in settings.get('channels', []) if c != 'None']
+        self.format = settings.get('format', 'csv')
+        self.source = settings['source']
+        if self.format not in ('csv', 'archive'):
+            raise ValueError(f"format must be 'csv' or 'archive', not {self.format!r}")
+        self.start = parse_time(str(settings['start'])) if 'start' in settings else None
+        self.end = parse_time(str(settings['end'])) if 'end' in settings else None
+        self.loop = settings.get('loop', False)
+        self.max_per_tick = max(1, int(settings.get('max_per_tick', 1000)))
+
+        self.pvs = {name: builder.aIn(name, PREC=4) for name in self.channels}
+        self.pvs['Replay_Speed'] = builder.aOut('Replay_Speed', initial_value=settings.get('speed', 1.0),
+                                                PREC=2, DRVL=0.01, DRVH=10000)
+        self.pvs['Replay_Run'] = builder.boolOut('Replay_Run', ZNAM='Pause', ONAM='Run', initial_value=True)
+        self.pvs['Replay_Time'] = builder.aIn('Replay_Time', PREC=3, EGU='s')
+        self.samples = None
+        self.pending = None       # next sample, read ahead but not yet due
+        self.clock = None         # replay position, in original timestamps
+        self.last_tick = None
+
+    def connect(self):
+        """Open the source."""
+        if self.format == 'csv' and not os.path.exists(self.source):
+            raise FileNotFoundError(self.source)
+        self.rewind()
+        return True
+
+    def rewind(self):
+        if self.format == 'csv':
+            self.samples = csv_samples(self.source, set(self.channels))
+        else:
+            prefix = self.device_name
+            self.samples = archive_samples(self.source, prefix, self.channels, self.start, self.end)
+        self.pending = next(self.samples, None)
+        self.clock = self.pending[0] if self.pending else None
+        self.last_tick = time.monotonic()
+
+    async def do_reads(self):
+        """Advance the replay clock by the elapsed time times the speed and publish what came due."""
+        now = time.monotonic()
+        elapsed, self.last_tick = now - self.last_tick, now
+        if self.pending is None:
+            if not self.loop:
+                return True
+            self.rewind()
+            if self.pending is None:
+                return False
+        if not self.pvs['Replay_Run'].get():
+            return True
+        self.clock += elapsed * self.pvs['Replay_Speed'].get()
+        published = 0
+        while self.pending is not None and self.pending[0] <= self.clock:
+            if published == self.max_per_tick:
+                self.clock = t              # fall behind rather than skip samples
+                break
+            t, name, value, severity = self.pending
+            self.pvs[name].set(value, severity=severity)
+            published += 1
+            self.pending = next(self.samples, None)
+        if published:
+            self.pvs['Replay_Time'].set(t)
+        return True
@@ -0,0 +1,83 @@
+"""
+Simulated device for benchmarks and tests. Needs no hardware.
+
+Each entry in 'channels' becomes an ai record following a noisy sine wave,
+each entry in 'outputs' an ao record whose writes are echoed straight into
+a {name}_RBV ai record, and the 'counter' record a longin that increments
+once per read cycle (lets clients count dropped or merged monitor updates).
+Channels honour per-record 'rate:' settings (see DeviceIOC).
+Each entry in 'arrays' is an array channel of that many noisy samples
+around the sine, published by DeviceIOC as a waveform with summaries.
+
+sim:
+  module: 'logic_devices.sim'
+  autostart: False
+  delay: 0.1
+  period: 30          # sine period in seconds
+  noise: 0.01         # gaussian noise amplitude
+  counter: Sim_Counter
+  channels:
+    - Sim1_TI
+    - Sim2_TI
+  outputs:
+    - Sim_VC
+  arrays:
+    Sim_WF: 250
+"""
+import math
+import random
+import time
+
+import numpy as np
+from softioc import builder
+
+
+class Device():
+    """Simulated device: generated inputs, echoed outputs and a cycle counter."""
+
+    def __init__(self, device_name, settings):
+        self.device_name = device_name
+        self.settings = settings
+        self.period = settings.get('period', 30)
+        self.noise = settings.get('noise', 0.01)
+        self.channels = [c for c in settings.get('channels', []) if c != 'None']
+        self.outputs = [c for c in settings.get('outputs', []) if c != 'None']
+        self.counter = settings.get('counter', 'Sim_Counter')
+        self.array_channels = dict(settings.get('arrays', {}))
+        self.arrays, self.array_counts = {}, {}     # buffers allocated by DeviceIOC
+        self.rng = np.random.default_rng()
+        self.pvs = {}
+        self.count = 0
+        self.t0 = time.monotonic()
+
+        for name in self.channels:
+            self.pvs[name] = builder.aIn(name, initial_value=0, PREC=3)
+        for name in self.outputs:
+            self.pvs[name + '_RBV'] = builder.aIn(name + '_RBV', initial_value=0, PREC=3)
+            self.pvs[name] = builder.aOut(name, initial_value=0, PREC=3, always_update=True,
+                                          on_update_name=self.echo)
+        self.pvs[self.counter] = builder.longIn(self.counter, initial_value=0)
+
+    def connect(self):
+        """Nothing to connect to."""
+        return True
+
+    def echo(self, value, pv):
+        """Output written: publish it on the readback as the 'device' would."""
+        name = pv.split(':')[-1]
+        self.pvs[name + '_RBV'].set(value)
+
+    async def do_reads(self, due=None):
+        """Advance the simulated signals by one cycle; only the channels in due, if given."""
+        phase = 2 * math.pi * (time.monotonic() - self.t0) / self.period
+        for i, name in enumerate(self.channels):
+            if due is None or name in due:
+                self.pvs[name].set(math.sin(phase + i) + random.gauss(0, self.noise))
+        for name, buffer in self.arrays.items():
+            self.rng.standard_normal(out=buffer)
+            buffer *= self.noise
+            buffer += math.sin(phase)
+            self.array_counts[name] = len(buffer)
+        self.count += 1
+        self.pvs[self.counter].set(self.count)
+        return True
@@ -0,0 +1,77 @@
+"""
+Simulated first-order thermal plant, for exercising control loops without
+hardware. The heater output record drives a temperature input record:
+
+    dT/dt = (ambient + gain * heater - T) / tau
+
+Writing {temperature}_DIST adds a sensor offset that is published at once,
+which gives benchmarks a timestamped input change to measure against.
+
+plant:
+  module: 'logic_devices.thermal_plant'
+  autostart: False
+  delay: 0.05                  # integration step / publish period in seconds
+  heater: Test_Heater_CI       # ao written by the controller (0-100 %)
+  temperature: Test_TI         # ai read by the controller
+  ambient: 4.0                 # K with the heater off
+  gain: 0.05                   # K per % of heater at steady state
+  tau: 20                      # time constant in seconds
+  noise: 0.0                   # gaussian measurement noise in K
+  channels: []
+"""
+import random
+import time
+
+from softioc import builder
+
+
+class Device():
+    """First-order thermal plant: integrates the heater input into a temperature."""
+
+    def __init__(self, device_name, settings):
+        self.device_name = device_name
+        self.settings = settings
+        self.ambient = settings.get('ambient', 4.0)
+        self.gain = settings.get('gain', 0.05)
+        self.tau = settings.get('tau', 20)
+        self.noise = settings.get('noise', 0.0)
+        self.heater_name = settings.get('heater', 'Test_Heater_CI')
+        self.temp_name = settings.get('temperature', 'Test_TI')
+        self.temperature = self.ambient
+        self.heater = 0.0
+        self.offset = 0.0
+        self.last = time.monotonic()
+
+        self.pvs = {
+            self.temp_name: builder.aIn(self.temp_name, initial_value=self.ambient, PREC=4, EGU='K'),
+            # MDEL=-1: post a monitor on every write, so clients see each controller update
+            self.heater_name: builder.aOut(self.heater_name, initial_value=0, PREC=3, EGU='%',
+                                           MDEL=-1, always_update=True, on_update=self.set_heater),
+            self.temp_name + '_DIST': builder.aOut(self.temp_name + '_DIST', initial_value=0, PREC=4,
+                                                   EGU='K', always_update=True,
+                                                   on_update=self.set_offset),
+        }
+
+    def connect(self):
+        """Nothing to connect to."""
+        return True
+
+    def set_heater(self, value):
+        self.heater = float(value)
+
+    def set_offset(self, value):
+        """Apply a sensor offset and publish it immediately, outside the integration step."""
+        self.offset = float(value)
+        self.pvs[self.temp_name].set(self.temperature + self.offset)
+
+    async def do_reads(self):
+        """Integrate the plant over the time since the last step and publish the temperature."""
+        now = time.monotonic()
+        dt, self.last = now - self.last, now
+        target = self.ambient + self.gain * self.heater
+        self.temperature += (target - self.temperature) * min(dt / self.tau, 1.0)
+        measured = self.temperature + self.offset
+        if self.noise:
+            measured += random.gauss(0, self.noise)
+        self.pvs[self.temp_name].set(measured)
+        return True
@@ -1,13 +1,24 @@
 # J. Maxwell 2023
-from softioc import softioc, builder, asyncio_dispatcher
+from softioc import softioc, builder, asyncio_dispatcher, alarm
 import asyncio
 import yaml
 import argparse
 import importlib
+import inspect
 import logging
+import math
 import os
+import re
 import sys
+import threading
 import datetime
+import time
+from collections import deque
+import numpy as np
+
+from filters import Pipeline
+from ioc_logging import setup_logging
+from profiler import profiler_pvs
 
 
 async def main():
@@ -24,6 +35,10 @@ async def main():
         force=True,
     )
     ioc, settings = load_settings()
+    # from here on, log records go through a queue to a background thread; after the screen log is
+    # rotated the loop below prints the record list again, as tools read PV names from that log
+    rotated = threading.Event()
+    setup_logging(ioc, settings, on_rotate=rotated.set)
 
     os.environ['EPICS_CA_ADDR_LIST'] = settings['general']['epics_addr_list']
     os.environ['EPICS_CA_AUTO_ADDR_LIST'] = 'NO'
@@ -35,10 +50,15 @@ async def main():
     d = DeviceIOC(device_name, ioc, settings)
     builder.LoadDatabase()
     softioc.iocInit(dispatcher)
+    apply_scheduling(settings[ioc])   # after iocInit, so the EPICS threads it started are covered too
 
     async def loop():
+        await d.connect()   # records are already served, INVALID until the first successful read
         while True:
             await d.loop()
+            if rotated.is_set():
+                rotated.clear()
+                softioc.dbl()
 
     dispatcher(loop)  # put functions to loop in here
     softioc.interactive_ioc(globals())
@@ -62,26 +82,259 @@ class DeviceIOC():
         ioc_settings = settings[ioc]
         records = ioc_settings.get('records', {}) # sets records from settings file, if they exist
 
-        # Create device instance
+        # Create device instance; connect() runs later in the background, see connect()
         self.device = self.module.Device(device_name, ioc_settings)
-        self.device.connect()
+        self.retry = ioc_settings.get('connect_retry', 5)
+        self.pv_connected = builder.boolIn(f"MAN:{ioc}_connected", ZNAM='Disconnected', ONAM='Connected',
+                                           initial_value=0)
 
         # Create timestamp PV
         self.pv_time = builder.aIn(f"MAN:{ioc}_time")
         self.pv_time.set(datetime.datetime.now().timestamp())
 
+        # Scheduling latency: how late the loop wakes from its delay sleep, last and worst of recent cycles
+        self.pv_lat = builder.aIn(f"MAN:{ioc}_sched_lat", EGU='ms', PREC=3)
+        self.pv_lat_max = builder.aIn(f"MAN:{ioc}_sched_lat_max", EGU='ms', PREC=3)
+        self.lateness = deque(maxlen=100)
+
+        # Poll-cycle timing: duration of do_reads() plus publishing, and count of failed cycles
+        self.pv_cycle = builder.aIn(f"MAN:{ioc}_cycle", EGU='ms', PREC=3)
+        self.pv_fails = builder.longIn(f"MAN:{ioc}_fails", initial_value=0)
+
+        # On-demand stack sampler: write seconds to _profile, summary appears on _profile_top
+        self.profiler = profiler_pvs(f"MAN:{ioc}_profile", ioc, settings)
+
+        # Array channels: waveform records fed from preallocated buffers, with scalar summaries
+        self.arrays = {}
+        lengths = dict(getattr(self.device, 'array_channels', {}))
+        lengths.update(ioc_settings.get('arrays', {}))
+        if lengths:
+            self.device.arrays = {}
+            self.device.array_counts = {}
+            for name, length in lengths.items():
+                self.arrays[name] = ArrayChannel(name, length)
+                self.device.arrays[name] = self.arrays[name].buffer
+                self.device.array_counts[name] = 0
+
         # Apply record settings, if they exist for the PV
-        for name, entry in self.device.pvs.items():
-            if name in records:
-                for field, value in records[name].items():
-                    setattr(self.device.pvs[name], field, value)
+        filtered = {}
+        periods = {}
+        for pvs in [self.device.pvs] + [a.pvs for a in self.arrays.values()]:
+            for name, entry in pvs.items():
+                if name in records:
+                    for field, value in records[name].items():
+                        if field == 'filter':
+                            prec = records[name].get('PREC')
+                            filtered[name] = Pipeline(value, 10.0 ** -prec if prec is not None else None)
+                        elif field == 'rate':
+                            periods[name] = value
+                        else:
+                            setattr(pvs[name], field, value)
+        for group, entry in ioc_settings.get('rates', {}).items():   # per-group rates
+            for name in entry['records']:
+                periods[name] = entry['rate']
+        self.schedule = self.make_schedule(periods)
+
+        # Filtered records: the device's set() goes through the pipeline, raw value kept on {name}_RAW
+        for name, pipeline in filtered.items():
+            raw = builder.aIn(f'{name}_RAW', **{field: records[name][field]
+                                                for field in ('EGU', 'PREC') if field in records[name]})
+            self.device.pvs[name] = FilteredRecord(self.device.pvs[name], raw, pipeline)
+
+        if ioc_settings.get('snapshot', True):
+            self.add_snapshot_group(f"{device_name}:MAN:{ioc}_snapshot")
+
+    def add_snapshot_group(self, group):
+        """
+        pvAccess group (QSRV Q:group info tags) holding every record of this IOC as an NTScalar
+        field with value, alarm and timeStamp. Only the _time record, set after each successful
+        poll, triggers the group, so 'pvget -m <group>' sees one consistent snapshot per cycle.
+        """
+        pvs = dict(self.device.pvs)
+        for array in self.arrays.values():
+            pvs.update(array.pvs)
+        pvs.update({f'{name}_RAW': pv.raw for name, pv in pvs.items() if isinstance(pv, FilteredRecord)})
+        for name, pv in pvs.items():
+            field = re.sub(r'\W', '_', name)
+            if field[0].isdigit():
+                field = '_' + field
+            pv.add_info("Q:group", {group: {field: {"+channel": "VAL", "+type": "scalar", "+trigger": ""}}})
+        self.pv_time.add_info("Q:group", {group: {"+atomic": True,
+                                                  "time": {"+channel": "VAL", "+type": "scalar",
+                                                           "+trigger": "*"}}})
+
+    async def connect(self):
+        """
+        Connect to the device in an executor thread, so the IOC serves its records while a slow
+        or unreachable device times out. In records (and the _RAW records of filtered ones) are
+        INVALID until the device connects, then cleared, so records the device sets only once,
+        such as config readbacks, do not stay INVALID; do_reads() sets the rest from then on.
+        Failed attempts are retried after 'connect_retry' seconds, doubling up to a minute.
+        """
+        records = []
+        for pv in self.device.pvs.values():
+            if isinstance(pv, FilteredRecord):
+                records.append(pv.raw)
+                pv = pv.record
+            if hasattr(pv, 'set_alarm'):
+                records.append(pv)
+        for pv in records:
+            pv.set_alarm(alarm.INVALID_ALARM, alarm.UDF_ALARM)
+        loop = asyncio.get_running_loop()
+        retry = self.retry
+        while True:
+            try:
+                if await loop.run_in_executor(None, self.device.connect) is not False:
+                    break
+                logging.warning(f"Device connect failed, retrying in {retry} s.")
+            except Exception as e:
+                logging.warning(f"Device connect failed: {e}; retrying in {retry} s.")
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, max(self.retry, 60))
+        for pv in records:
+            pv.set_alarm(alarm.NO_ALARM, alarm.NO_ALARM)
+        self.pv_connected.set(1)
+        logging.info("Device connected.")
+
+    def make_schedule(self, periods):
+        """
+        Per-record polling periods ('rate:' in records, or groups under 'rates:'), as
+        {record: [period, next due time]}; records without one are polled every 'delay'.
+        Empty (a single rate) unless some record has its own rate and the device's
+        do_reads() accepts the set of due records.
+        """
+        if not periods:
+            return {}
+        if 'due' not in inspect.signature(self.device.do_reads).parameters:
+            logging.warning("Device do_reads() takes no 'due' argument; per-record rates ignored.")
+            return {}
+        unknown = set(periods) - set(self.device.pvs)
+        if unknown:
+            logging.warning(f"Rates given for unknown records: {', '.join(sorted(unknown))}")
+        now = time.monotonic()
+        return {name: [periods.get(name, self.delay), now] for name in self.device.pvs}
 
     async def loop(self):
-        """Read indicator PVS from controller channels.
+        """Read indicator PVS from controller channels. With per-record rates, each tick reads
+        only the records that are due, in one do_reads(due) call.
         """
-        await asyncio.sleep(self.delay)
-        if await self.device.do_reads():   # get new readings from device and set into PVs
+        if self.schedule:
+            wake = min(due for _, due in self.schedule.values())
+            await asyncio.sleep(max(0.0, wake - time.monotonic()))
+            now = time.monotonic()
+            late = (now - wake) * 1000
+            due = set()
+            for name, entry in self.schedule.items():
+                if entry[1] <= now:
+                    due.add(name)
+                    entry[1] += entry[0]
+                    if entry[1] <= now:          # fell behind: skip missed slots rather than bunch them
+                        entry[1] = now + entry[0]
+        else:
+            t0 = time.monotonic()
+            await asyncio.sleep(self.delay)
+            late = (time.monotonic() - t0 - self.delay) * 1000
+        self.lateness.append(late)
+        self.pv_lat.set(late)
+        self.pv_lat_max.set(max(self.lateness))
+        t0 = time.monotonic()
+        reads = self.device.do_reads(due) if self.schedule else self.device.do_reads()
+        if await reads:   # get new readings from device and set into PVs
+            for name, array in self.arrays.items():
+                array.publish(self.device.array_counts[name])
             self.pv_time.set(datetime.datetime.now().timestamp())   # set time of last successful update
+        else:
+            self.pv_fails.set(self.pv_fails.get() + 1)
+        self.pv_cycle.set((time.monotonic() - t0) * 1000)
+
+
+def apply_scheduling(ioc_settings):
+    """
+    Apply the IOC's 'cpu_affinity' (list of cores), 'nice' and 'rt_priority' (SCHED_FIFO, 1-99)
+    settings to every thread of this process. Threads started later inherit them. Failures,
+    e.g. missing permission for negative nice or real-time priority, are logged, not fatal.
+    """
+    tasks = [int(t) for t in os.listdir('/proc/self/task')] if os.path.isdir('/proc/self/task') else [0]
+    cpus = ioc_settings.get('cpu_affinity')
+    nice = ioc_settings.get('nice')
+    rt = ioc_settings.get('rt_priority')
+    steps = []      # (setting, apply to one thread); each is tried on its own
+    if cpus is not None:
+        steps.append((f'cpu_affinity {cpus}', lambda tid: os.sched_setaffinity(tid, cpus)))
+    if nice is not None:
+        steps.append((f'nice {nice}', lambda tid: os.setpriority(os.PRIO_PROCESS, tid, nice)))
+    if rt is not None:
+        steps.append((f'rt_priority {rt}', lambda tid: os.sched_setscheduler(tid, os.SCHED_FIFO,
+                                                                             os.sched_param(rt))))
+    errors = {}     # (setting, error) -> threads it failed on
+    for tid in tasks:
+        for setting, apply in steps:
+            try:
+                apply(tid)
+            except (OSError, AttributeError) as e:
+                errors.setdefault((setting, str(e)), []).append(tid)
+    for (setting, e), tids in errors.items():
+        logging.warning(f"Could not apply {setting} to {len(tids)} of {len(tasks)} threads: {e}")
+    if cpus is not None or nice is not None or rt is not None:
+        logging.info(f"Scheduling: affinity {sorted(os.sched_getaffinity(0))}, "
+                     f"nice {os.getpriority(os.PRIO_PROCESS, 0)}, "
+                     f"policy {'SCHED_FIFO ' + str(rt) if rt is not None else 'default'}")
+
+
+class FilteredRecord():
+    """Stands in for a record in device.pvs: set() publishes the raw value on the
+    _RAW record and the filtered value on the record itself. Samples that are
+    INVALID or not finite are passed through without entering the filter."""
+
+    def __init__(self, record, raw, pipeline):
+        self.record = record
+        self.raw = raw
+        self.pipeline = pipeline
+
+    def set(self, value, *args, **kwargs):
+        self.raw.set(value, *args, **kwargs)
+        if kwargs.get('severity', alarm.NO_ALARM) < alarm.INVALID_ALARM:
+            try:
+                x = float(value)
+            except (TypeError, ValueError):
+                x = math.nan
+            if math.isfinite(x):
+                value = self.pipeline.update(x)
+        self.record.set(value, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.record, name)
+
+
+class ArrayChannel():
+    """Waveform record for a multi-sample channel, plus MEAN, STD, MIN and MAX records.
+
+    The device fills buffer[:n] in place in do_reads() and sets its
+    array_counts[name] = n; publish() then hands the record a view of the
+    filled part (softioc keeps its own copy) and derives the summaries from
+    the same buffer, using a preallocated scratch array, so no per-cycle
+    lists or arrays are built.
+    """
+
+    def __init__(self, name, length):
+        self.name = name
+        self.buffer = np.zeros(length)
+        self.scratch = np.empty(length)
+        self.pvs = {name: builder.WaveformIn(name, length=length, datatype=float)}
+        for stat in ('MEAN', 'STD', 'MIN', 'MAX'):
+            self.pvs[f'{name}_{stat}'] = builder.aIn(f'{name}_{stat}')
+
+    def publish(self, count):
+        view = self.buffer[:count]
+        self.pvs[self.name].set(view)
+        if not count:
+            return
+        mean = view.sum() / count
+        deviation = np.subtract(view, mean, out=self.scratch[:count])
+        self.pvs[f'{self.name}_MEAN'].set(mean)
+        self.pvs[f'{self.name}_STD'].set(np.sqrt(np.dot(deviation, deviation) / count))
+        self.pvs[f'{self.name}_MIN'].set(view.min())
+        self.pvs[f'{self.name}_MAX'].set(view.max())
 
 def load_settings():
     """Load device settings from YAML settings file.
@@ -0,0 +1,146 @@
+"""
+Node agent: lets ioc_manager run IOCs on this host. Run one per host from the
+project folder (same settings.yaml), and list it under 'nodes' in settings:
+
+  general:
+    nodes:
+      daq2: 'http://daq2:5080'
+    agent_token: 'secret'     # optional, sent by the manager as X-Agent-Token
+  some_ioc:
+    host: daq2                # or 'auto' for the least loaded node; default is the manager's host
+
+Endpoints (JSON):
+    GET  /status            IOCs this agent runs whose screen session is up
+    GET  /resources         cpus, load average, memory and IOC count
+    POST /start/<ioc>       start in screen as ioc_manager does; returns its PV names
+    POST /stop/<ioc>
+
+The agent listens on 127.0.0.1 unless given --bind. Listening on another
+address lets anyone who can reach it start and stop IOCs, so it then refuses
+to run without an agent_token.
+
+Several agents can share one host for testing (python node_agent.py --port 5081);
+each reports only the IOCs it started.
+"""
+import argparse
+import hmac
+import json
+import os
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psutil
+import yaml
+
+from screens import launch_ioc, screen_sessions
+
+
+class Agent():
+    """IOCs started through this agent, remembered across agent restarts."""
+
+    def __init__(self, settings, port):
+        self.settings = settings
+        self.state = os.path.join(settings['general']['log_dir'], f'.node_agent_{port}.json')
+        self.lock = threading.Lock()
+        try:
+            with open(self.state) as f:
+                self.iocs = set(json.load(f))
+        except (OSError, ValueError):
+            self.iocs = set()
+
+    def save(self):
+        with open(self.state, 'w') as f:
+            json.dump(sorted(self.iocs), f)
+
+    def status(self):
+        sessions = screen_sessions()
+        with self.lock:
+            iocs = set(self.iocs)
+        return {'iocs': {name: sessions[name] for name in iocs if name in sessions}}
+
+    def resources(self):
+        mem = psutil.virtual_memory()
+        return {'cpus': psutil.cpu_count(), 'load': os.getloadavg(), 'cpu_percent': psutil.cpu_percent(),
+                'mem_percent': mem.percent, 'iocs': len(self.status()['iocs'])}
+
+    def start(self, name):
+        if name not in self.settings or name == 'general':
+            raise KeyError(name)
+        if name in screen_sessions():
+            subprocess.run(["screen", "-XS", name, "kill"])
+        _, pvs = launch_ioc(self.settings, name)
+        with self.lock:
+            self.iocs.add(name)
+            self.save()
+        return {'ioc': name, 'pvs': pvs}
+
+    def stop(self, name):
+        if name in screen_sessions():
+            subprocess.run(["screen", "-XS", name, "kill"])
+        with self.lock:
+            self.iocs.discard(name)
+            self.save()
+        return {'ioc': name}
+
+
+class Handler(BaseHTTPRequestHandler):
+    agent = None
+    token = None
+
+    def reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def authorized(self):
+        if self.token and not hmac.compare_digest(self.headers.get('X-Agent-Token', '').encode(),
+                                                  self.token.encode()):
+            self.reply(403, {'error': 'bad token'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path == '/status':
+            self.reply(200, self.agent.status())
+        elif self.path == '/resources':
+            self.reply(200, self.agent.resources())
+        else:
+            self.reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] not in ('start', 'stop'):
+            self.reply(404, {'error': 'not found'})
+            return
+        try:
+            self.reply(200, getattr(self.agent, parts[0])(parts[1]))
+        except KeyError:
+            self.reply(404, {'error': f'unknown IOC {parts[1]}'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Node agent for ioc_manager')
+    parser.add_argument('-s', default='.', help='Settings file folder, default is here.')
+    parser.add_argument('--bind', default='127.0.0.1', help='Address to listen on; non-local needs agent_token.')
+    parser.add_argument('--port', type=int, default=5080)
+    args = parser.parse_args()
+
+    with open(f'{args.s}/settings.yaml') as f:
+        settings = yaml.load(f, Loader=yaml.FullLoader)
+    Handler.token = settings['general'].get('agent_token')
+    if not Handler.token and args.bind not in ('127.0.0.1', 'localhost', '::1'):
+        parser.error(f"refusing to listen on {args.bind} without 'agent_token' in general settings")
+    Handler.agent = Agent(settings, args.port)
+    ThreadingHTTPServer((args.bind, args.port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
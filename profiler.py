@@ -0,0 +1,132 @@
+"""
+On-demand statistical profiler for a running IOC. Writing N to the profile PV
+samples the Python stack of every thread of the process, from a background
+thread, for N seconds. The result goes to the log directory in collapsed
+stack format, one 'thread;outer;...;inner count' line per distinct stack, as
+read by flamegraph.pl, speedscope and inferno:
+
+    <log_dir>/<name>_profile_<YYYYmmdd_HHMMSS>.collapsed
+
+and the functions with the most samples at the top of the stack are
+published on the _top string PV. Threads waiting in select(), queue or lock
+waits count as idle and are left out of the summary, but kept in the file.
+
+    master_ioc:   {prefix}:MAN:{ioc}_profile, {prefix}:MAN:{ioc}_profile_top
+    ioc_manager:  {prefix}:MAN:profile, {prefix}:MAN:profile_top
+
+Settings (general): profile_interval (default 0.01 s between samples).
+"""
+import collections
+import datetime
+import logging
+import os
+import sys
+import threading
+import time
+
+from softioc import builder
+
+IDLE = {('selectors.py', 'select'), ('threading.py', 'wait'), ('queue.py', 'get'),
+        ('socketserver.py', 'serve_forever'), ('asyncio_dispatcher.py', 'run_forever')}
+TOP_LENGTH = 1024
+
+
+class Profiler():
+    """Samples sys._current_frames() every 'interval' seconds for a given duration."""
+
+    def __init__(self, name, log_dir, interval=0.01):
+        self.name = name
+        self.log_dir = log_dir
+        self.interval = interval
+        self.thread = None
+        self.labels = {}      # code object -> frame label, so each code object is formatted once
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds, done=None):
+        """Start sampling in the background; done(path, summary) is called at the end. False if already running."""
+        if self.running():
+            return False
+        self.thread = threading.Thread(target=self.run, args=(seconds, done), name='profiler', daemon=True)
+        self.thread.start()
+        return True
+
+    def label(self, code):
+        text = self.labels.get(code)
+        if text is None:
+            text = self.labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+        return text
+
+    def sample(self, stacks, leaves, own):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for tid, frame in sys._current_frames().items():
+            if tid == own:
+                continue
+            leaf = frame.f_code
+            stack = []
+            while frame is not None:
+                stack.append(self.label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(tid, f'thread-{tid}').replace(';', ':'))
+            stacks[';'.join(reversed(stack))] += 1
+            if (os.path.basename(leaf.co_filename), leaf.co_name) not in IDLE:
+                leaves[self.label(leaf)] += 1
+
+    def run(self, seconds, done):
+        stacks = collections.Counter()
+        leaves = collections.Counter()
+        own = threading.get_ident()
+        count = 0
+        started = time.monotonic()
+        next_sample = started
+        while time.monotonic() - started < seconds:
+            self.sample(stacks, leaves, own)
+            count += 1
+            next_sample += self.interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(self.log_dir, f'{self.name}_profile_{stamp}.collapsed')
+        try:
+            os.makedirs(self.log_dir, exist_ok=True)
+            with open(path, 'w') as f:
+                for stack, n in stacks.most_common():
+                    f.write(f'{stack} {n}\n')
+        except OSError as e:
+            logging.error(f"Could not write profile {path}: {e}")
+            path = None
+        summary = self.summary(leaves, count)
+        logging.info(f"Profile of {seconds} s, {count} samples, written to {path}: {summary}")
+        if done:
+            done(path, summary)
+
+    @staticmethod
+    def summary(leaves, count, top=8):
+        """'pct% function (file:line)' for the busiest non-idle functions: the share of sample
+        times a thread was running in it (summed over threads, so a total can exceed 100%)."""
+        if not count:
+            return 'no samples'
+        parts = [f'{count} samples']
+        parts += [f'{100 * n / count:.1f}% {label}' for label, n in leaves.most_common(top)]
+        return '; '.join(parts)
+
+
+def profiler_pvs(record, name, settings):
+    """
+    Make the control record (write seconds to sample, reads 0 when idle) and the
+    _top summary record, and return the Profiler behind them.
+    """
+    general = settings['general']
+    profiler = Profiler(name, general.get('log_dir', 'logs'), general.get('profile_interval', 0.01))
+    top = builder.longStringIn(f'{record}_top', length=TOP_LENGTH)
+
+    def done(path, summary):
+        top.set(summary[:TOP_LENGTH - 1])
+        control.set(0, process=False)
+
+    def update(seconds):
+        if seconds > 0 and not profiler.start(seconds, done):
+            logging.warning("Profiler already running; request ignored.")
+
+    control = builder.longOut(record, initial_value=0, DRVL=0, DRVH=3600, EGU='s', on_update=update)
+    return profiler
@@ -0,0 +1,360 @@
+"""
+Local PV archiver. Runs next to ioc_manager, monitors every PV of the running
+IOCs and keeps their history on disk.
+
+Storage is append-only and columnar, one directory per PV and one chunk per
+UTC day:
+
+    <archive_dir>/<PV>/<YYYYMMDD>.t    float64 timestamps (non-decreasing)
+    <archive_dir>/<PV>/<YYYYMMDD>.v    float64 values
+    <archive_dir>/<PV>/<YYYYMMDD>.s    uint8 severities
+
+The day in the chunk name is the coarse time index; within a chunk the
+timestamps are sorted, so a range query memory-maps the chunks it needs and
+binary searches them instead of reading whole files. Updates are batched in
+memory and flushed every 'archive_flush' seconds from a worker thread.
+
+    python pv_archiver.py run                          # service (see start_archiver.sh)
+    python pv_archiver.py list
+    python pv_archiver.py query TGT:MEOP:Test_TI --start -2h [--end ...] [--format csv|json]
+
+Settings (general): archive_dir (default 'archive'), archive_flush (default 5 s),
+archive_rescan (default 30 s, how often the PV inventory is refreshed).
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import json
+import logging
+import os
+import re
+import sys
+import time
+from array import array
+
+import numpy as np
+import yaml
+
+from screens import screen_sessions
+
+COLUMNS = (('t', 'd', np.float64), ('v', 'd', np.float64), ('s', 'B', np.uint8))
+
+
+def load_settings(folder='.'):
+    with open(os.path.join(folder, 'settings.yaml')) as f:
+        return yaml.load(f, Loader=yaml.FullLoader)
+
+
+def archive_dir(settings):
+    return settings['general'].get('archive_dir', 'archive')
+
+
+def day_of(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y%m%d')
+
+
+def pv_inventory(settings, scanned=None):
+    """
+    PV names of every running IOC, from the record lists dumped in their logs.
+    scanned ({ioc: [log offset, pvs found]}) carries over between calls so only
+    log lines written since the last call are read; a log that shrank (rotated
+    or restarted) is read again from the start, keeping the PVs already found.
+    """
+    prefix = settings['general']['prefix']
+    log_dir = settings['general']['log_dir']
+    pattern = re.compile(rf'({re.escape(prefix)}[^\s]+)')
+    scanned = {} if scanned is None else scanned
+    running = screen_sessions()
+    pvs = []
+    for name in settings:
+        if name == 'general' or name not in running:
+            continue
+        state = scanned.setdefault(name, [0, {}])
+        try:
+            with open(os.path.join(log_dir, name), 'rb') as f:
+                if os.fstat(f.fileno()).st_size < state[0]:
+                    state[0] = 0
+                f.seek(state[0])
+                text = f.read()
+        except OSError:
+            continue
+        complete = text.rfind(b'\n') + 1          # leave a partly written line for next time
+        state[0] += complete
+        state[1].update(dict.fromkeys(pattern.findall(text[:complete].decode(errors='replace'))))
+        pvs.extend(state[1])
+    return list(dict.fromkeys(pvs))
+
+
+class ArchiveWriter():
+    """
+    In-memory per-PV batches, appended to the day chunks on flush(). Chunks stay
+    sorted: a sample older than the last one taken for its PV is dropped, never
+    re-stamped, and counted in a warning. add() runs on the event loop and does
+    no file I/O; what is already on disk is checked by flush(), in its thread.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.pending = {}           # pv -> (array t, array v, array s)
+        self.last = {}              # pv -> last timestamp taken, to keep chunks sorted
+        self.on_disk = {}           # pv -> last timestamp on disk, read on the first flush
+        self.dropped = {}           # pv -> out-of-order samples dropped since the last take()
+        self.aligned = set()        # chunk paths (without suffix) checked since start
+
+    def add(self, pv, timestamp, value, severity):
+        if timestamp < self.last.get(pv, 0.0):
+            self.dropped[pv] = self.dropped.get(pv, 0) + 1
+            return
+        batch = self.pending.get(pv)
+        if batch is None:
+            batch = self.pending[pv] = tuple(array(code) for _, code, _ in COLUMNS)
+        self.last[pv] = timestamp
+        batch[0].append(timestamp)
+        batch[1].append(value)
+        batch[2].append(min(int(severity), 255))
+
+    def last_written(self, pv):
+        """Last timestamp on disk for pv (0 if none), so a restarted archiver keeps chunks sorted."""
+        folder = os.path.join(self.root, pv)
+        try:
+            latest = max(f for f in os.listdir(folder) if f.endswith('.t'))
+            self.align(os.path.join(folder, latest[:-2]))      # no timestamp from a half-written row
+            with open(os.path.join(folder, latest), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell() // 8 * 8
+                if size == 0:
+                    return 0.0
+                f.seek(size - 8)
+                return float(np.frombuffer(f.read(8), dtype=np.float64)[0])
+        except (OSError, ValueError):
+            return 0.0
+
+    def align(self, base):
+        """
+        Cut the columns of chunk base back to the rows present in all of them,
+        dropping whatever an interrupted flush left in only some, so the next
+        append starts on the same row in every column. Done once per chunk.
+        """
+        if base in self.aligned:
+            return
+        self.aligned.add(base)
+        paths = [(f'{base}.{suffix}', np.dtype(dtype).itemsize) for suffix, _, dtype in COLUMNS]
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0 for path, _ in paths]
+        rows = min(size // width for size, (_, width) in zip(sizes, paths))
+        for size, (path, width) in zip(sizes, paths):
+            if size > rows * width:
+                logging.warning(f'Truncating {path} to {rows} rows after an interrupted flush')
+                os.truncate(path, rows * width)
+
+    def take(self):
+        """Swap out the pending batches, for flushing outside the event loop."""
+        pending, self.pending = self.pending, {}
+        for pv, n in self.dropped.items():
+            logging.warning(f'Dropped {n} out-of-order samples of {pv}')
+        self.dropped = {}
+        return pending
+
+    def flush(self, pending):
+        """Append batches to their chunk files, splitting at day boundaries."""
+        for pv, (t, v, s) in pending.items():
+            folder = os.path.join(self.root, pv)
+            os.makedirs(folder, exist_ok=True)
+            t = np.frombuffer(t, dtype=np.float64)
+            if pv not in self.on_disk:
+                self.on_disk[pv] = self.last_written(pv)
+            stale = int(np.searchsorted(t, self.on_disk[pv], 'left'))    # from before a restart
+            if stale:
+                logging.warning(f'Dropped {stale} samples of {pv} older than its archive')
+                t, v, s = t[stale:], v[stale:], s[stale:]
+            if not len(t):
+                continue
+            self.on_disk[pv] = t[-1]
+            days = [day_of(x) for x in (t[0], t[-1])]
+            if days[0] == days[1]:
+                cuts = [(days[0], 0, len(t))]
+            else:
+                labels = np.array([day_of(x) for x in t])
+                edges = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+                bounds = [0, *edges, len(t)]
+                cuts = [(labels[a], a, b) for a, b in zip(bounds, bounds[1:])]
+            for day, a, b in cuts:
+                self.align(os.path.join(folder, day))
+                for (suffix, _, dtype), column in zip(COLUMNS, (t, v, s)):
+                    with open(os.path.join(folder, f'{day}.{suffix}'), 'ab') as f:
+                        f.write(np.asarray(column, dtype=dtype)[a:b].tobytes())
+
+
+class ArchiveReader():
+    """Range queries over the chunk files."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def pvs(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, d)))
+
+    def days(self, pv):
+        folder = os.path.join(self.root, pv)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(f[:-2] for f in os.listdir(folder) if f.endswith('.t'))
+
+    def range(self, pv, start=None, end=None):
+        """(timestamps, values, severities) arrays for start <= t < end (epoch seconds)."""
+        first = day_of(start) if start is not None else ''
+        last = day_of(end) if end is not None else '99999999'
+        parts = [[], [], []]
+        for day in self.days(pv):
+            if not first <= day <= last:
+                continue
+            base = os.path.join(self.root, pv, day)
+            t = self._map(base + '.t', np.float64)
+            # a flush may be in progress: use only rows present in every column
+            n = min(len(t), os.path.getsize(base + '.v') // 8, os.path.getsize(base + '.s'))
+            t = t[:n]
+            a = 0 if start is None else int(np.searchsorted(t, start, 'left'))
+            b = n if end is None else int(np.searchsorted(t, end, 'left'))
+            if a >= b:
+                continue
+            parts[0].append(np.array(t[a:b]))
+            parts[1].append(np.array(self._map(base + '.v', np.float64)[a:b]))
+            parts[2].append(np.array(self._map(base + '.s', np.uint8)[a:b]))
+        return tuple(np.concatenate(p) if p else np.empty(0, dtype)
+                     for p, (_, _, dtype) in zip(parts, COLUMNS))
+
+    def iter_range(self, pv, start=None, end=None, block=4096):
+        """Yield (timestamp, value, severity) for start <= t < end, reading block rows at a time."""
+        first = day_of(start) if start is not None else ''
+        last = day_of(end) if end is not None else '99999999'
+        for day in self.days(pv):
+            if not first <= day <= last:
+                continue
+            base = os.path.join(self.root, pv, day)
+            t = self._map(base + '.t', np.float64)
+            n = min(len(t), os.path.getsize(base + '.v') // 8, os.path.getsize(base + '.s'))
+            a = 0 if start is None else int(np.searchsorted(t[:n], start, 'left'))
+            b = n if end is None else int(np.searchsorted(t[:n], end, 'left'))
+            v = self._map(base + '.v', np.float64)
+            s = self._map(base + '.s', np.uint8)
+            for i in range(a, b, block):
+                j = min(i + block, b)
+                yield from zip(t[i:j].tolist(), v[i:j].tolist(), s[i:j].tolist())
+
+    @staticmethod
+    def _map(path, dtype):
+        rows = os.path.getsize(path) // np.dtype(dtype).itemsize     # ignore a half-written row
+        if rows == 0:
+            return np.empty(0, dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+
+class Archiver():
+    """Monitor the PV inventory and feed the writer."""
+
+    def __init__(self, settings):
+        import aioca
+        self.aioca = aioca
+        self.settings = settings
+        self.flush_period = settings['general'].get('archive_flush', 5)
+        self.rescan_period = settings['general'].get('archive_rescan', 30)
+        self.writer = ArchiveWriter(archive_dir(settings))
+        self.subs = {}
+        self.skipped = set()
+        self.scanned = {}           # ioc -> [log offset, pvs], see pv_inventory()
+
+    def on_update(self, value, pv):
+        if not value.ok:
+            return
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            if pv not in self.skipped:
+                self.skipped.add(pv)
+                logging.info(f'Not archiving non-numeric PV {pv}')
+            return
+        self.writer.add(pv, value.timestamp, number, value.severity)
+
+    def rescan(self):
+        for pv in pv_inventory(self.settings, self.scanned):
+            if pv not in self.subs:
+                self.subs[pv] = self.aioca.camonitor(pv, lambda v, pv=pv: self.on_update(v, pv),
+                                                     format=self.aioca.FORMAT_TIME)
+        logging.info(f'Archiving {len(self.subs)} PVs')
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_scan = 0
+        while True:
+            if time.monotonic() >= next_scan:
+                self.rescan()
+                next_scan = time.monotonic() + self.rescan_period
+            await asyncio.sleep(self.flush_period)
+            pending = self.writer.take()
+            if pending:
+                await loop.run_in_executor(None, self.writer.flush, pending)
+
+
+def parse_time(text):
+    """Epoch seconds from 'now', '-30m'/'-2h'/'-1d', an ISO date/time or a number."""
+    if text is None:
+        return None
+    if text == 'now':
+        return time.time()
+    m = re.fullmatch(r'-(\d+(?:\.\d+)?)([smhd])', text)
+    if m:
+        return time.time() - float(m.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[m.group(2)]
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def cmd_run(args):
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    settings = load_settings(args.s)
+    os.environ['EPICS_CA_ADDR_LIST'] = settings['general']['epics_addr_list']
+    os.environ['EPICS_CA_AUTO_ADDR_LIST'] = 'NO'
+    asyncio.run(Archiver(settings).run())
+
+
+def cmd_list(args):
+    reader = ArchiveReader(archive_dir(load_settings(args.s)))
+    for pv in reader.pvs():
+        days = reader.days(pv)
+        print(f'{pv}  {days[0]}..{days[-1]}' if days else pv)
+
+
+def cmd_query(args):
+    reader = ArchiveReader(archive_dir(load_settings(args.s)))
+    t, v, s = reader.range(args.pv, parse_time(args.start), parse_time(args.end))
+    if args.format == 'json':
+        print(json.dumps({'pv': args.pv, 't': t.tolist(), 'v': v.tolist(), 's': s.tolist()}))
+        return
+    w = csv.writer(sys.stdout)
+    w.writerow(['time', 'value', 'severity'])
+    for row in zip(t.tolist(), v.tolist(), s.tolist()):
+        w.writerow(row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local PV archiver')
+    parser.add_argument('-s', default='.', help='Settings file folder, default is here.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('run', help='Archive the PVs of all running IOCs').set_defaults(func=cmd_run)
+    sub.add_parser('list', help='List archived PVs').set_defaults(func=cmd_list)
+    p = sub.add_parser('query', help="Print a PV's samples in a time range")
+    p.add_argument('pv')
+    p.add_argument('--start', help="e.g. -2h, 2024-05-01T12:00, epoch seconds")
+    p.add_argument('--end')
+    p.add_argument('--format', choices=('csv', 'json'), default='csv')
+    p.set_defaults(func=cmd_query)
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Screen session helpers shared by ioc_manager, node_agent, pv_archiver and
+tools/ioc_cli.py: listing sessions, and launching an IOC in one.
+"""
+import os
+import re
+import subprocess
+import time
+
+_SCREEN_LS_RE = re.compile(r'^\s+(\d+)\.(\S+)\s', re.MULTILINE)
+
+
+def screen_sessions():
+    """
+    Return {session_name: pid} for every screen session, from one `screen -ls`.
+
+    Screen(name).exists forks `screen -ls` on every call; callers checking
+    several IOCs take one snapshot and test membership in it instead.
+    """
+    try:
+        out = subprocess.run(['screen', '-ls'], capture_output=True, text=True, check=False).stdout
+    except OSError:
+        return {}
+    return {name: int(pid) for pid, name in _SCREEN_LS_RE.findall(out)}
+
+
+def launch_ioc(settings, name):
+    '''
+    Start screen to run ioc, then run ioc. Wait until started, then return (screen, pvs) with the PV
+    names the IOC listed in its log, or (screen, None) if it did not come up within 20 seconds.
+    Used by the manager for local IOCs and by node_agent for IOCs placed on other hosts.
+    '''
+    from screenutils import Screen     # imported here so ioc_cli and pv_archiver need not have it
+    log = f"{settings['general']['log_dir']}/{name}"
+    screen = Screen(name, True)
+    screen.send_commands('bash')
+    screen.send_commands(f'python master_ioc.py -i {name}')
+    screen.enable_logs(log)
+    screen.send_commands('softioc.dbl()')
+
+    elapsed = 0
+    pvs = []
+    while True:           # wait until ioc starts to get response
+        if os.path.exists(log) and os.path.getsize(log) > 10:
+            with open(log) as f:
+                for line in f:
+                    match = re.search(f"({settings['general']['prefix']}.+)"+r'\s', line)
+                    if match:
+                        pvs.append(match.group(1))
+            return screen, pvs
+        time.sleep(1)
+        elapsed += 1
+        if elapsed > 20:
+            print(f"Failed to start {name} ioc, died waiting on log file after {elapsed} seconds.")
+            return screen, None
@@ -0,0 +1,2 @@
+source venv/bin/activate
+screen -dmS "pv-archiver" bash -c "python pv_archiver.py run"
\ No newline at end of file
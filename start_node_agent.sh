@@ -0,0 +1,4 @@
+source venv/bin/activate
+# Listens on 127.0.0.1 by default. To take IOCs from a manager on another host, set agent_token
+# in settings.yaml and run with AGENT_BIND=0.0.0.0; the agent refuses a non-local bind without it.
+screen -dmS "node-agent" bash -c "python node_agent.py --bind ${AGENT_BIND:-127.0.0.1}"
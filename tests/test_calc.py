@@ -0,0 +1,88 @@
+import asyncio
+import math
+
+import pytest
+
+pytest.importorskip('softioc')
+pytest.importorskip('aioca')
+
+from softioc import alarm  # noqa: E402
+
+from logic_devices.calc import Device, Expression  # noqa: E402
+from logic_devices.calc import FUNCTIONS  # noqa: E402
+
+
+def evaluate(text, **names):
+    return float(Expression('t', text)(dict(FUNCTIONS, **names)))
+
+
+def test_arithmetic_and_functions():
+    assert evaluate('a * 2 + b ** 2 - c % 3', a=1.5, b=3, c=7) == 11
+    assert evaluate('sqrt(abs(x)) + log10(100)', x=-16) == 6
+    assert evaluate('clip(x, 0, 1) + where(x > 5, 10, 20)', x=7) == 11
+    assert evaluate('2 * pi') == pytest.approx(2 * math.pi)
+
+
+def test_min_max_take_any_number_of_arguments():
+    assert evaluate('min(a)', a=4) == 4
+    assert evaluate('max(a, b)', a=4, b=9) == 9
+    assert evaluate('min(a, b, c, 2)', a=4, b=9, c=3) == 2
+
+
+def test_deps_leave_out_functions():
+    assert Expression('t', 'max(a, b) + sqrt(c) * pi').deps == {'a', 'b', 'c'}
+
+
+@pytest.mark.parametrize('text', [
+    'a +',                      # syntax
+    '__import__("os")',         # unknown function
+    'a.real',                   # attribute access
+    '[a, b]',                   # list
+    'a if b else c',            # not in the allowed nodes
+    'sqrt(a, b)',               # arity
+    'clip(a, 0)',
+    'max()',
+])
+def test_rejected(text):
+    with pytest.raises(ValueError):
+        Expression('t', text)
+
+
+def make_device(tag, calcs, inputs):
+    return Device(f'CALC{tag}', {'inputs': inputs, 'calcs': {f'{tag}_{n}': e for n, e in calcs.items()}})
+
+
+def test_device_orders_calcs_and_shares_aliases():
+    dev = make_device('T1', {'Total': 'T1_Half * 2 + b', 'Half': 'a / 2'},
+                      {'a': 'TGT:X:A', 'b': 'TGT:X:A', 'c': 'TGT:X:C'})
+    assert dev.by_pv['TGT:X:A'] == ['a', 'b']
+    assert dev.order.index('T1_Half') < dev.order.index('T1_Total')
+    assert dev.dependents['a'] == ['T1_Half', 'T1_Total']
+    assert dev.dependents['c'] == []
+
+    dev.inputs.values['TGT:X:A'] = 3.0
+    dev.inputs.severity['TGT:X:A'] = alarm.NO_ALARM
+    dev.inputs.dirty.add('TGT:X:A')
+    dev.evaluate()
+    assert dev.pvs['T1_Half'].get() == 1.5
+    assert dev.pvs['T1_Total'].get() == 6.0
+
+
+def test_device_rejects_cycles_and_unknown_names():
+    with pytest.raises(ValueError, match='cycle'):
+        make_device('T2', {'A': 'T2_B + 1', 'B': 'T2_A + 1'}, {})
+    with pytest.raises(ValueError, match='unknown name'):
+        make_device('T3', {'A': 'nope + 1'}, {})
+
+
+def test_invalid_input_marks_only_its_calcs():
+    dev = make_device('T4', {'FromA': 'a + 1', 'FromB': 'b + 1'}, {'a': 'TGT:Y:A', 'b': 'TGT:Y:B'})
+    dev.inputs.started = True          # no subscriptions needed to drive evaluate()
+    for pv, severity in (('TGT:Y:A', alarm.NO_ALARM), ('TGT:Y:B', alarm.INVALID_ALARM)):
+        dev.inputs.values[pv] = 1.0
+        dev.inputs.severity[pv] = severity
+        dev.inputs.dirty.add(pv)
+    dev.evaluate()
+    assert dev.severity['T4_FromA'] == alarm.NO_ALARM
+    assert dev.severity['T4_FromB'] == alarm.INVALID_ALARM
+    assert asyncio.run(dev.do_reads()) is True
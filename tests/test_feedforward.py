@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('softioc')
+pytest.importorskip('aioca')
+
+from logic_devices.feedforward import Transforms  # noqa: E402
+
+
+def test_poly_linear_and_lookup():
+    t = Transforms([
+        {'pv': 'P', 'type': 'poly', 'coeffs': [1.0, 0.5, 0.01]},
+        {'pv': 'L', 'type': 'lookup', 'table': [[10.0, 25.0], [4.0, 10.0], [20.0, 60.0]]},
+        {'pv': 'G', 'type': 'linear', 'gain': 2.0, 'offset': 1.0},
+        {'pv': 'D'},                                # linear, gain 1
+    ])
+    y = t(np.array([10.0, 7.0, 3.0, -4.0]))
+    assert y == pytest.approx([1 + 5 + 1, 17.5, 7.0, -4.0])
+
+
+def test_lookup_holds_at_the_ends_and_hits_breakpoints():
+    t = Transforms([
+        {'pv': 'A', 'type': 'lookup', 'table': [[0, 0], [1, 10]]},
+        {'pv': 'B', 'type': 'lookup', 'table': [[0, 5], [2, 1], [4, 3], [8, 3]]},     # tables of unequal length
+    ])
+    for x, expected in [((-1, -1), (0, 5)), ((0, 0), (0, 5)), ((0.5, 3), (5, 2)),
+                        ((1, 4), (10, 3)), ((2, 100), (10, 3))]:
+        assert t(np.array(x, dtype=float)) == pytest.approx(expected)
+
+
+def test_matches_per_source_evaluation():
+    rng = np.random.default_rng(0)
+    sources = [{'pv': f'P{i}', 'type': 'poly', 'coeffs': rng.normal(size=rng.integers(1, 5)).tolist()}
+               for i in range(5)]
+    sources += [{'pv': f'L{i}', 'type': 'lookup',
+                 'table': np.column_stack([np.sort(rng.uniform(-5, 5, 4)), rng.normal(size=4)]).tolist()}
+                for i in range(3)]
+    t = Transforms(sources)
+    for _ in range(20):
+        x = rng.uniform(-6, 6, len(sources))
+        expected = [np.polynomial.polynomial.polyval(x[i], s['coeffs']) if s['type'] == 'poly'
+                    else np.interp(x[i], *zip(*s['table'])) for i, s in enumerate(sources)]
+        assert t(x) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('source', [
+    {'pv': 'X', 'type': 'spline'},
+    {'pv': 'X', 'type': 'lookup', 'table': [[0, 1]]},
+    {'pv': 'X', 'type': 'lookup', 'table': [[0, 1], [2, 3], [2, 5]]},     # x0 == x1 would divide by zero
+])
+def test_bad_source(source):
+    with pytest.raises(ValueError):
+        Transforms([source])
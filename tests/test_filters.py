@@ -0,0 +1,80 @@
+import random
+import statistics
+
+import pytest
+
+from filters import EWMA, Mean, Median, Outlier, Pipeline
+
+
+def test_mean_matches_window_average():
+    random.seed(1)
+    data = [random.uniform(-5, 5) for _ in range(200)]
+    f = Mean(window=7)
+    for i, x in enumerate(data):
+        assert f.update(x) == pytest.approx(statistics.fmean(data[max(0, i - 6):i + 1]))
+
+
+def test_median_matches_window_median():
+    random.seed(2)
+    data = [random.randint(0, 20) for _ in range(200)]    # repeats exercise removal of equal values
+    f = Median(window=6)
+    for i, x in enumerate(data):
+        assert f.update(x) == statistics.median(data[max(0, i - 5):i + 1])
+
+
+def test_ewma():
+    f = EWMA(alpha=0.5)
+    assert [f.update(x) for x in (4, 0, 0)] == [4, 2, 1]
+
+
+def test_outlier_rejects_spike_and_passes_step():
+    f = Outlier(window=9, threshold=3)
+    noisy = [10 + 0.1 * (i % 3) for i in range(20)]
+    out = [f.update(x) for x in noisy]
+    assert out == noisy
+    assert f.update(1000) != 1000                 # a lone spike is replaced by the median
+    steps = [f.update(50) for _ in range(9)]
+    assert steps[-1] == 50                        # a real step gets through once it fills half the window
+
+
+def test_outlier_flat_signal_passes_small_change():
+    f = Outlier(window=9, threshold=3, floor=0.01)
+    for _ in range(20):
+        assert f.update(5.0) == 5.0
+    assert f.update(5.02) == 5.02                 # within threshold * floor of the median
+
+
+def test_outlier_flat_signal_rejects_spike():
+    f = Outlier(window=9, threshold=3, floor=0.01)
+    for _ in range(20):
+        f.update(5.0)
+    assert f.update(1000.0) == 5.0
+
+
+def test_outlier_without_floor_passes_everything_on_flat_signal():
+    f = Outlier(window=9, threshold=3)
+    for _ in range(20):
+        f.update(5.0)
+    assert f.update(1000.0) == 1000.0
+
+
+def test_outlier_floor_from_resolution():
+    p = Pipeline({'type': 'outlier', 'window': 9}, resolution=0.5)
+    assert p.stages[0].floor == 0.5
+    p = Pipeline({'type': 'outlier', 'window': 9, 'floor': 2}, resolution=0.5)
+    assert p.stages[0].floor == 2
+
+
+def test_pipeline_applies_stages_in_order():
+    p = Pipeline([{'type': 'median', 'window': 3}, {'type': 'mean', 'window': 2}])
+    assert [p.update(x) for x in (1, 9, 3)] == [1, 3, 4]
+
+
+@pytest.mark.parametrize('config', [
+    {'type': 'nope'},
+    {'type': 'mean', 'window': 0},
+    {'type': 'ewma', 'alpha': 0},
+])
+def test_bad_config(config):
+    with pytest.raises(ValueError):
+        Pipeline(config)
@@ -0,0 +1,74 @@
+import random
+
+from ioc_cli import LogIndex
+
+WORDS = ['heater', 'Heater_CI', 'alarm', 'MAJOR', 'TGT:MEOP:Test_TI', 'connect', 'timeout', 'ok', 'x=3.5']
+
+
+def scan(path, query, since_line=0):
+    """Plain case-insensitive scan of the complete lines."""
+    with open(path, 'rb') as f:
+        lines = f.read().split(b'\n')[:-1]
+    needle = query.lower().encode()
+    return [(n, line.decode()) for n, line in enumerate(lines)
+            if n >= since_line and needle in line.lower()]
+
+
+def write_log(path, lines, start=0):
+    random.seed(lines + start)
+    with open(path, 'a') as f:
+        for i in range(start, start + lines):
+            words = random.choices(WORDS, k=random.randint(1, 5))
+            f.write(f'2024-05-01 08:{i // 60 % 60:02d}:{i % 60:02d} INFO {" ".join(words)}\n')
+
+
+QUERIES = ['heater', 'HEATER_ci', 'eat', 'alarm major', 'Test_TI', 'meop:test', 'x=3', '=', 'connect timeout', 'nothing']
+
+
+def test_search_matches_scan(tmp_path):
+    log = tmp_path / 'ioc'
+    write_log(log, 300)
+    index = LogIndex(str(log))
+    index.update()
+    for query in QUERIES:
+        assert index.search(query) == scan(log, query), query
+
+
+def test_search_after_save_reload_and_append(tmp_path):
+    log = tmp_path / 'ioc'
+    write_log(log, 200)
+    index = LogIndex(str(log))
+    index.update()
+    index.save()
+    write_log(log, 100, start=200)
+    with open(log, 'a') as f:
+        f.write('2024-05-01 09:00:00 partial heater')     # not indexed until its newline arrives
+    reloaded = LogIndex(str(log))
+    assert len(reloaded) == 200
+    assert reloaded.update()
+    reloaded.save()
+    again = LogIndex(str(log))
+    assert len(again) == 300
+    for query in QUERIES:
+        assert again.search(query) == scan(log, query)      # scan() leaves out the partial line too
+
+
+def test_search_since(tmp_path):
+    log = tmp_path / 'ioc'
+    write_log(log, 300)
+    index = LogIndex(str(log))
+    index.update()
+    since = index.times[120]
+    first = index.line_for_time(since)
+    assert index.search('heater', since=since) == scan(log, 'heater', first)
+
+
+def test_index_rebuilt_when_log_shrinks(tmp_path):
+    log = tmp_path / 'ioc'
+    write_log(log, 50)
+    index = LogIndex(str(log))
+    index.update()
+    log.write_text('2024-05-01 10:00:00 fresh start\n')
+    assert index.update()
+    assert len(index) == 1
+    assert index.search('fresh') == [(0, '2024-05-01 10:00:00 fresh start')]
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('softioc')
+pytest.importorskip('aioca')
+
+from master_ioc import DeviceIOC, FilteredRecord  # noqa: E402
+
+
+class RatedDevice():
+    pvs = {'Fast_TI': None, 'Slow_TI': None, 'Other_TI': None}
+
+    async def do_reads(self, due=None):
+        return True
+
+
+class PlainDevice(RatedDevice):
+    async def do_reads(self):
+        return True
+
+
+def schedule(device, periods, delay=1.0):
+    return DeviceIOC.make_schedule(SimpleNamespace(device=device, delay=delay), periods)
+
+
+def test_per_record_periods_default_to_delay():
+    result = schedule(RatedDevice(), {'Fast_TI': 0.1, 'Slow_TI': 10})
+    assert {name: period for name, (period, _) in result.items()} == \
+        {'Fast_TI': 0.1, 'Slow_TI': 10, 'Other_TI': 1.0}
+    assert len({due for _, due in result.values()}) == 1       # everything is due at the start
+
+
+def test_single_rate_without_periods():
+    assert schedule(RatedDevice(), {}) == {}
+
+
+def test_ignored_when_do_reads_takes_no_due(caplog):
+    assert schedule(PlainDevice(), {'Fast_TI': 0.1}) == {}
+    assert "no 'due' argument" in caplog.text
+
+
+def test_unknown_records_are_reported(caplog):
+    result = schedule(RatedDevice(), {'Missing_TI': 5})
+    assert 'Missing_TI' not in result
+    assert 'Missing_TI' in caplog.text
+
+
+def test_filtered_record_in_snapshot_group():
+    settings = {
+        'general': {'prefix': 'TGT:TEST', 'log_dir': 'logs'},
+        'snaptest': {'module': 'logic_devices.sim', 'delay': 1, 'channels': ['Snap_TI'],
+                     'records': {'Snap_TI': {'PREC': 2, 'filter': {'type': 'mean', 'window': 2}}}},
+    }
+    ioc = DeviceIOC('TGT:TEST', 'snaptest', settings)       # snapshot group is on by default
+    record = ioc.device.pvs['Snap_TI']
+    assert isinstance(record, FilteredRecord)
+    record.set(1.0)
+    record.set(3.0)
+    assert record.raw.get() == 3.0
+    assert record.get() == 2.0
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+
+from pv_archiver import ArchiveReader, ArchiveWriter, day_of, pv_inventory
+
+PV = 'TGT:MEOP:Test_TI'
+DAY = 86400.0
+T0 = 1714521600.0 + 3600      # 2024-05-01 01:00 UTC
+
+
+def write(root, samples):
+    writer = ArchiveWriter(str(root))
+    for t, v, s in samples:
+        writer.add(PV, t, v, s)
+    writer.flush(writer.take())
+    return writer
+
+
+def test_round_trip_across_days(tmp_path):
+    samples = [(T0 + i * 1800.0, float(i), i % 3) for i in range(100)]     # about two days
+    write(tmp_path, samples)
+    reader = ArchiveReader(str(tmp_path))
+    assert reader.pvs() == [PV]
+    assert len(reader.days(PV)) == 3
+    t, v, s = reader.range(PV)
+    assert list(zip(t.tolist(), v.tolist(), s.tolist())) == samples
+    assert list(reader.iter_range(PV, block=7)) == samples
+
+
+def test_range_and_iter_range_agree(tmp_path):
+    samples = [(T0 + i * 600.0, float(i), 0) for i in range(500)]
+    write(tmp_path, samples[:250])
+    write(tmp_path, samples[250:])                # a second writer appends to the same chunks
+    reader = ArchiveReader(str(tmp_path))
+    for start, end in ((None, None), (T0 + 1000, T0 + DAY), (T0 + DAY - 1, T0 + 2 * DAY + 5)):
+        expected = [x for x in samples if (start is None or x[0] >= start) and (end is None or x[0] < end)]
+        t, v, s = reader.range(PV, start, end)
+        assert list(zip(t.tolist(), v.tolist(), s.tolist())) == expected
+        assert list(reader.iter_range(PV, start, end, block=16)) == expected
+
+
+def test_out_of_order_samples_dropped(tmp_path, caplog):
+    write(tmp_path, [(T0 + 10, 1.0, 0), (T0 + 8, 9.0, 0), (T0 + 10, 2.0, 0)])
+    write(tmp_path, [(T0 + 5, 3.0, 0), (T0 + 20, 4.0, 0)])     # restarted archiver, clock went back
+    t, v, _ = ArchiveReader(str(tmp_path)).range(PV)
+    assert t.tolist() == [T0 + 10, T0 + 10, T0 + 20]
+    assert v.tolist() == [1.0, 2.0, 4.0]
+    assert f'Dropped 1 out-of-order samples of {PV}' in caplog.text
+    assert f'Dropped 1 samples of {PV} older than its archive' in caplog.text
+
+
+def test_interrupted_flush_is_realigned(tmp_path):
+    write(tmp_path, [(T0 + i, float(i), 0) for i in range(5)])
+    base = os.path.join(tmp_path, PV, day_of(T0))
+    with open(base + '.t', 'ab') as f:            # flush stopped after the timestamp column
+        f.write(np.float64(T0 + 5).tobytes())
+    write(tmp_path, [(T0 + 6, 6.0, 1)])
+    t, v, s = ArchiveReader(str(tmp_path)).range(PV)
+    assert t.tolist() == [T0 + i for i in (0, 1, 2, 3, 4, 6)]
+    assert v.tolist() == [0.0, 1.0, 2.0, 3.0, 4.0, 6.0]
+    assert s.tolist() == [0, 0, 0, 0, 0, 1]
+
+
+def test_pv_inventory_reads_only_new_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr('pv_archiver.screen_sessions', lambda: {'one': 1})
+    settings = {'general': {'prefix': 'TGT:MEOP', 'log_dir': str(tmp_path)}, 'one': {}, 'two': {}}
+    log = tmp_path / 'one'
+    log.write_text('TGT:MEOP:A\nTGT:MEOP:B\nTGT:MEO')
+    scanned = {}
+    assert pv_inventory(settings, scanned) == ['TGT:MEOP:A', 'TGT:MEOP:B']
+    with open(log, 'a') as f:
+        f.write('P:C\n')
+    assert pv_inventory(settings, scanned) == ['TGT:MEOP:A', 'TGT:MEOP:B', 'TGT:MEOP:C']
+    assert scanned['one'][0] == log.stat().st_size
+    log.write_text('TGT:MEOP:D\n')                # rotated: read again from the start
+    assert pv_inventory(settings, scanned)[-1] == 'TGT:MEOP:D'
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from ioc_cli import TrendBuffer
+
+
+def brute_buckets(values, first, width):
+    """(min, max) of whole 2^L-sample buckets of values[first:], finest L giving at most width."""
+    size = 2
+    while True:
+        start, end = -(-first // size), (len(values) - 1) // size
+        if end - start + 1 <= width:
+            return [(min(values[b * size:(b + 1) * size]), max(values[b * size:(b + 1) * size]))
+                    for b in range(start, end + 1)]
+        size *= 2
+
+
+@pytest.mark.parametrize('count', [5, 40, 100, 333, 1000])
+def test_trend_decimate_matches_brute_force(count):
+    random.seed(count)
+    buf = TrendBuffer(capacity=100)
+    values = [random.uniform(-1, 1) for _ in range(count)]
+    for i, v in enumerate(values):
+        buf.append(float(i), v)
+    live = values[-100:]
+    for width in (1, 3, 10, 60, 100, 200):
+        if len(live) <= width:
+            assert buf.decimate(width) == [(v, v) for v in live]
+        else:
+            assert buf.decimate(width) == brute_buckets(values, count - len(live), width)
+
+
+def test_trend_ignores_repeated_timestamps():
+    buf = TrendBuffer(capacity=10)
+    buf.append(1.0, 1.0)
+    buf.append(1.0, 2.0)
+    buf.append(2.0, 3.0)
+    assert buf.count == 2
+    assert buf.span() == (1.0, 2.0)
+    assert buf.decimate(10) == [(1.0, 1.0), (3.0, 3.0)]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Self-contained IOC benchmark suite.
+
+Brings up a local master_ioc running the simulated device (logic_devices.sim)
+on a private CA port, so no hardware and no plant IOCs are involved, runs the
+selected scenarios and writes p50/p90/p99/max results as JSON.
+
+    python tools/bench.py run [--scenarios latency,fanout,poll,restart] [-o results.json]
+    python tools/bench.py compare baseline.json results.json [--threshold 0.2]
+
+Scenarios:
+    latency   caput on Sim_VC -> monitor update of its readback Sim_VC_RBV
+    fanout    --subscribers monitors on each of --inputs PVs; delivery delay
+              relative to the IOC-side timestamp
+    poll      one batched caget of all --inputs PVs, repeated --iterations times
+    restart   kill and respawn the IOC until its PVs answer again
+
+compare exits with status 1 if any p50/p90/p99 got worse by more than --threshold.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchlib import (DEFAULT_PORT, LocalIOC, compare_results, isolate_ca, run_metadata,
+                      sim_settings, summarize, wait_for_pvs, write_results)
+
+IOC_NAME  = 'bench_sim'
+SCENARIOS = ('latency', 'fanout', 'poll', 'restart')
+
+
+async def scenario_latency(ioc, args):
+    import aioca
+    pv, rbv = ioc.pv('Sim_VC'), ioc.pv('Sim_VC_RBV')
+    pending = {}
+    latencies, timeouts = [], 0
+    arrived = asyncio.Event()
+
+    def on_update(value):
+        t0 = pending.pop(float(value), None)
+        if t0 is not None:
+            latencies.append((time.perf_counter() - t0) * 1000)
+            arrived.set()
+
+    sub = aioca.camonitor(rbv, on_update)
+    await asyncio.sleep(0.5)                 # let the initial update go by
+    for i in range(args.iterations):
+        value = i + 0.5                      # unique, so late echoes cannot be misattributed
+        arrived.clear()
+        pending[value] = time.perf_counter()
+        await aioca.caput(pv, value)
+        try:
+            await asyncio.wait_for(arrived.wait(), 2.0)
+        except asyncio.TimeoutError:
+            pending.pop(value, None)
+            timeouts += 1
+    sub.close()
+    return summarize(latencies, timeouts=timeouts)
+
+
+async def scenario_fanout(ioc, args):
+    import aioca
+    pvs = [ioc.pv(f'Sim{n}_TI') for n in range(1, args.inputs + 1)]
+    delays = []
+
+    def on_update(value):
+        delays.append((time.time() - value.timestamp) * 1000)
+
+    subs = [aioca.camonitor(pvs, lambda v, _i: on_update(v), format=aioca.FORMAT_TIME)
+            for _ in range(args.subscribers)]
+    await asyncio.sleep(1.0)
+    delays.clear()                           # drop the initial connect updates
+    await asyncio.sleep(args.duration)
+    received = len(delays)
+    for group in subs:
+        for sub in group:
+            sub.close()
+    return summarize(delays, subscriptions=args.subscribers * len(pvs),
+                     updates_per_s=received / args.duration)
+
+
+async def scenario_poll(ioc, args):
+    import aioca
+    pvs = [ioc.pv(f'Sim{n}_TI') for n in range(1, args.inputs + 1)]
+    rounds, failures = [], 0
+    for _ in range(args.iterations):
+        t0 = time.perf_counter()
+        results = await aioca.caget(pvs, timeout=2.0, throw=False)
+        rounds.append((time.perf_counter() - t0) * 1000)
+        failures += sum(isinstance(r, aioca.CANothing) for r in results)
+    return summarize(rounds, pvs=len(pvs), failures=failures)
+
+
+async def scenario_restart(ioc, args):
+    times = []
+    for _ in range(args.restarts):
+        ioc.kill(IOC_NAME)
+        t0 = time.perf_counter()
+        ioc.spawn(IOC_NAME)
+        await wait_for_pvs([ioc.time_pv(IOC_NAME), ioc.pv('Sim_VC')], timeout=60)
+        times.append((time.perf_counter() - t0) * 1000)
+    return summarize(times)
+
+
+RUNNERS = {
+    'latency': scenario_latency,
+    'fanout': scenario_fanout,
+    'poll': scenario_poll,
+    'restart': scenario_restart,
+}
+
+
+async def run_all(ioc, args, scenarios):
+    await wait_for_pvs([ioc.time_pv(IOC_NAME)], timeout=60)
+    results = {}
+    for name in scenarios:
+        print(f'running {name}…', file=sys.stderr)
+        results[name] = await RUNNERS[name](ioc, args)
+    return results
+
+
+def cmd_run(args):
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = [s for s in scenarios if s not in RUNNERS]
+    if unknown:
+        sys.exit(f'unknown scenario: {", ".join(unknown)}')
+    isolate_ca(args.port)
+    settings = sim_settings(inputs=args.inputs, delay=args.delay)
+    with LocalIOC({IOC_NAME: settings}) as ioc:
+        loop = asyncio.new_event_loop()     # kept open: aioca's threads outlive a closed loop badly
+        asyncio.set_event_loop(loop)
+        results = loop.run_until_complete(run_all(ioc, args, scenarios))
+    params = {k: v for k, v in vars(args).items() if k not in ('func', 'out')}
+    write_results(args.out, {'meta': run_metadata(**params), 'results': results})
+    return 0
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare_results(baseline, current, args.threshold)
+    print(f'{"SCENARIO":<12}{"STAT":<6}{"BASE":>12}{"NEW":>12}{"RATIO":>8}')
+    for name, stat, b, n, ratio, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f'{name:<12}{stat:<6}{b:>12.3f}{n:>12.3f}{ratio:>8.2f}{flag}')
+    return int(any(r[-1] for r in rows))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('run', help='Run scenarios against a local simulated IOC')
+    p.add_argument('--scenarios', default=','.join(SCENARIOS))
+    p.add_argument('-o', '--out', default='-', help='Result file (default stdout)')
+    p.add_argument('--port', type=int, default=DEFAULT_PORT, help='Private CA server port')
+    p.add_argument('--iterations', type=int, default=200)
+    p.add_argument('--inputs', type=int, default=50, help='Simulated input PVs')
+    p.add_argument('--delay', type=float, default=0.1, help='Simulated IOC poll period (s)')
+    p.add_argument('--subscribers', type=int, default=4, help='Monitors per PV for fanout')
+    p.add_argument('--duration', type=float, default=10.0, help='Seconds to sample fanout')
+    p.add_argument('--restarts', type=int, default=5)
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser('compare', help='Flag regressions against a stored baseline')
+    p.add_argument('baseline')
+    p.add_argument('current')
+    p.add_argument('--threshold', type=float, default=0.2,
+                   help='Allowed relative change before flagging (default 0.2 = 20%%)')
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Shared helpers for the benchmark tools: a throwaway master_ioc on an
+isolated CA port, latency statistics and JSON result files.
+
+    from benchlib import LocalIOC, summarize
+
+    with LocalIOC({'sim': {...device settings...}}) as ioc:
+        ... aioca calls against ioc.pv('Sim_VC') ...
+"""
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+import yaml
+
+PROJECT_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+BENCH_PREFIX = 'BENCH'
+DEFAULT_PORT = 15064         # away from the standard 5064/5065 so benchmarks never see plant IOCs
+
+
+def isolate_ca(port=DEFAULT_PORT):
+    """
+    Point this process (and anything it spawns) at a private CA/PVA port on
+    localhost. Must run before aioca/softioc create their CA context.
+    """
+    os.environ.update({
+        'EPICS_CA_ADDR_LIST': '127.0.0.1',
+        'EPICS_CA_AUTO_ADDR_LIST': 'NO',
+        'EPICS_CA_SERVER_PORT': str(port),
+        'EPICS_CAS_SERVER_PORT': str(port),
+        'EPICS_CA_REPEATER_PORT': str(port + 1),
+        'EPICS_CAS_INTF_ADDR_LIST': '127.0.0.1',
+        'EPICS_PVA_SERVER_PORT': str(port + 2),
+        'EPICS_PVAS_SERVER_PORT': str(port + 2),
+        'EPICS_PVA_BROADCAST_PORT': str(port + 3),
+        'EPICS_PVAS_BROADCAST_PORT': str(port + 3),
+        'EPICS_PVA_ADDR_LIST': '127.0.0.1',
+        'EPICS_PVA_AUTO_ADDR_LIST': 'NO',
+    })
+
+
+def sim_settings(inputs=8, outputs=('Sim_VC',), delay=0.1, **extra):
+    """Settings entry for a logic_devices.sim IOC with Sim{n}_TI inputs."""
+    entry = {
+        'module': 'logic_devices.sim',
+        'autostart': False,
+        'delay': delay,
+        'channels': [f'Sim{n}_TI' for n in range(1, inputs + 1)],
+        'outputs': list(outputs),
+    }
+    entry.update(extra)
+    return entry
+
+
+class LocalIOC:
+    """
+    Run one or more master_ioc processes from a temporary settings folder.
+
+    iocs is {ioc_name: settings entry}; all are started by start() (or on
+    entering the context) and killed on stop(). CA must already be isolated
+    with isolate_ca() so the children inherit the private port.
+    """
+
+    def __init__(self, iocs, prefix=BENCH_PREFIX, general=None):
+        self.iocs = dict(iocs)
+        self.prefix = prefix
+        self.folder = tempfile.mkdtemp(prefix='meop-bench-')
+        self.log_dir = os.path.join(self.folder, 'logs')
+        os.makedirs(self.log_dir)
+        settings = {'general': {'prefix': prefix,
+                                'log_dir': self.log_dir,
+                                'epics_addr_list': '127.0.0.1',
+                                'delay': 0.5}}
+        settings['general'].update(general or {})
+        settings.update(self.iocs)
+        with open(os.path.join(self.folder, 'settings.yaml'), 'w') as f:
+            yaml.safe_dump(settings, f)
+        self.procs = {}
+        self.logs = {}      # ioc -> open log file of its process
+
+    def pv(self, name):
+        return f'{self.prefix}:{name}'
+
+    def time_pv(self, ioc):
+        return f'{self.prefix}:MAN:{ioc}_time'
+
+    def spawn(self, ioc):
+        """Start one IOC process. stdin stays open so interactive_ioc does not exit."""
+        if ioc in self.logs:
+            self.logs.pop(ioc).close()
+        log = self.logs[ioc] = open(os.path.join(self.log_dir, ioc), 'w')
+        self.procs[ioc] = subprocess.Popen(
+            [sys.executable, os.path.join(PROJECT_ROOT, 'master_ioc.py'), '-s', self.folder, '-i', ioc],
+            cwd=PROJECT_ROOT, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+        return self.procs[ioc]
+
+    def kill(self, ioc):
+        proc = self.procs.pop(ioc, None)
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        log = self.logs.pop(ioc, None)
+        if log is not None:
+            log.close()
+
+    def start(self):
+        for ioc in self.iocs:
+            self.spawn(ioc)
+        return self
+
+    def stop(self):
+        for ioc in list(self.procs):
+            self.kill(ioc)
+
+    def cleanup(self):
+        self.stop()
+        for ioc in list(self.logs):
+            self.logs.pop(ioc).close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+async def wait_for_pvs(pvs, timeout=30.0):
+    """Wait until every PV answers a caget. Returns seconds waited; raises TimeoutError."""
+    import aioca
+    t0 = time.perf_counter()
+    while True:
+        results = await aioca.caget(list(pvs), timeout=1.0, throw=False)
+        if all(not isinstance(r, aioca.CANothing) for r in results):
+            return time.perf_counter() - t0
+        if time.perf_counter() - t0 > timeout:
+            raise TimeoutError(f'PVs did not connect within {timeout} s')
+
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of already sorted samples, q in 0..100."""
+    if not sorted_samples:
+        return None
+    k = math.ceil(q / 100 * len(sorted_samples)) - 1
+    return sorted_samples[max(0, min(len(sorted_samples) - 1, k))]
+
+
+def summarize(samples, unit='ms', **extra):
+    """p50/p90/p99/max/mean/n of a list of samples, as stored in result files."""
+    s = sorted(samples)
+    out = {'unit': unit, 'n': len(s),
+           'p50': percentile(s, 50), 'p90': percentile(s, 90), 'p99': percentile(s, 99),
+           'max': s[-1] if s else None,
+           'mean': sum(s) / len(s) if s else None}
+    out.update(extra)
+    return out
+
+
+class Histogram:
+    """
+    HDR-style latency histogram: log-spaced buckets with a fixed relative
+    error (10**-digits), so memory is constant and a 60 s outlier costs the
+    same as a 1 ms sample. Values outside [lowest, highest] are clamped.
+    """
+
+    def __init__(self, lowest=0.01, highest=600000.0, digits=2):
+        self.lowest = lowest
+        self.highest = highest
+        self.growth = 1 + 10 ** -digits
+        self._log_growth = math.log(self.growth)
+        self.counts = array('Q', bytes(8 * (self._index(highest) + 1)))
+        self.total = 0
+        self.max = 0.0
+
+    def _index(self, value):
+        if value <= self.lowest:
+            return 0
+        return int(math.log(value / self.lowest) / self._log_growth)
+
+    def record(self, value, count=1):
+        value = min(value, self.highest)
+        self.counts[self._index(value)] += count
+        self.total += count
+        self.max = max(self.max, value)
+
+    def value_at(self, q):
+        """Upper edge of the bucket holding the q-th percentile (q in 0..100)."""
+        if not self.total:
+            return None
+        target = max(1, math.ceil(q / 100 * self.total))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(self.lowest * self.growth ** (i + 1), self.max)
+        return self.max
+
+    def summary(self, unit='ms', **extra):
+        out = {'unit': unit, 'n': self.total,
+               'p50': self.value_at(50), 'p90': self.value_at(90), 'p99': self.value_at(99),
+               'p99.9': self.value_at(99.9), 'max': self.max if self.total else None}
+        out.update(extra)
+        return out
+
+
+def run_metadata(**params):
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'params': params}
+
+
+def write_results(path, results):
+    text = json.dumps(results, indent=2)
+    if path in (None, '-'):
+        print(text)
+    else:
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+
+
+def compare_results(baseline, current, threshold=0.2, stats=('p50', 'p90', 'p99')):
+    """
+    Compare two result files' 'results' sections.
+
+    Returns rows of (scenario, stat, base, new, ratio, regressed). Latency-like
+    stats regress when they grow by more than threshold; entries carrying
+    'higher_is_better' (throughput) regress when they shrink by more than it.
+    """
+    rows = []
+    for name, base in baseline.get('results', {}).items():
+        new = current.get('results', {}).get(name)
+        if not new:
+            continue
+        better_high = base.get('higher_is_better', False)
+        for stat in stats:
+            b, n = base.get(stat), new.get(stat)
+            if b is None or n is None or b == 0:
+                continue
+            ratio = n / b
+            regressed = ratio < 1 - threshold if better_high else ratio > 1 + threshold
+            rows.append((name, stat, b, n, ratio, regressed))
+    return rows
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Multi-client monitor fan-out load generator.
+
+Starts N client processes, each with its own CA context (like N separate
+Phoebus displays or archivers), each monitoring the same M PVs. For every
+step of the client count it records:
+
+    delay      update arrival time minus the IOC-side timestamp (ms)
+    missed     updates dropped or merged, from a sequence PV (see below)
+    ioc_cpu    CPU time the IOC process used per wall second
+
+Against a local simulated IOC on a private CA port (no hardware):
+
+    python tools/fanout_load.py --local --inputs 50 --clients 1,2,4,8,16,32
+
+Locally the sequence is the sim's Sim_Counter, which steps by one per
+cycle, so every gap is a missed update. Against running IOCs (PVs taken
+from their logs) each IOC's _time PV is the sequence: its poll period
+varies with read time, so instead of inferring misses from gaps, one extra
+unloaded reference client collects the distinct _time values each IOC
+published, and a client missed every one of those it never received.
+
+    python tools/fanout_load.py --iocs hfc300 lm500 --clients 1,4,16
+
+Steps run with increasing client counts; the last one before the first
+step whose p99 delay exceeds --max-delay ms or that missed updates is
+reported as the sustainable subscriber count.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import yaml
+
+from benchlib import (DEFAULT_PORT, PROJECT_ROOT, LocalIOC, isolate_ca, run_metadata,
+                      sim_settings, summarize, wait_for_pvs, write_results)
+
+SETTINGS_FILE = os.path.join(PROJECT_ROOT, 'settings.yaml')
+LOCAL_IOC     = 'fanout_sim'
+
+
+SEQ_MARGIN = 1.0     # seconds at each end of the window left out of _time comparisons
+
+
+def client_worker(pvs, seq_pvs, counter, start_at, stop_at, results, reference=False):
+    """
+    One CA client: monitor pvs from start_at to stop_at (epoch seconds) and
+    put {delays, updates, missed, seq_updates, seq_values} on the results queue.
+    With counter, seq_pvs is one PV stepping by 1 per cycle and missed counts
+    its gaps. Otherwise seq_pvs are _time PVs and seq_values holds, per PV, the
+    values received that fall inside the window; run_step() works out missed.
+    """
+    import aioca
+
+    delays, missed = [], [0]
+    last_seq = [None]
+    seq_updates = [0]
+    seq_values = {pv: set() for pv in seq_pvs}
+
+    def on_value(value, _index):
+        now = time.time()
+        if start_at <= now < stop_at:
+            delays.append((now - value.timestamp) * 1000)
+
+    def on_counter(value):
+        now = time.time()
+        if not start_at <= now < stop_at:
+            last_seq[0] = float(value)
+            return
+        seq_updates[0] += 1
+        if last_seq[0] is not None:
+            missed[0] += max(0, round(float(value) - last_seq[0]) - 1)
+        last_seq[0] = float(value)
+
+    def on_time(value, index):
+        if start_at + SEQ_MARGIN <= float(value) < stop_at - SEQ_MARGIN:
+            seq_updates[0] += 1
+            seq_values[seq_pvs[index]].add(float(value))
+
+    async def run():
+        subs = aioca.camonitor(pvs, on_value, format=aioca.FORMAT_TIME) if pvs else []
+        if counter:
+            seq = [aioca.camonitor(seq_pvs[0], on_counter)]
+        else:
+            seq = aioca.camonitor(seq_pvs, on_time)
+        await asyncio.sleep(max(0.0, stop_at + SEQ_MARGIN - time.time()))
+        for sub in subs + seq:
+            sub.close()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(run())
+    results.put({'reference': reference, 'delays': delays, 'updates': len(delays),
+                 'missed': missed[0], 'seq_updates': seq_updates[0],
+                 'seq_values': {pv: sorted(v) for pv, v in seq_values.items()}})
+
+
+def find_ioc_pid(name):
+    """PID of the 'master_ioc.py -i <name>' process, from a /proc scan."""
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                argv = f.read().split(b'\0')
+        except OSError:
+            continue
+        if any(a.endswith(b'master_ioc.py') for a in argv) and b'-i' in argv:
+            i = argv.index(b'-i')
+            if i + 1 < len(argv) and argv[i + 1].decode(errors='replace') == name:
+                return int(entry)
+    return None
+
+
+def cpu_seconds(pids):
+    """Total user+system CPU seconds of the given processes (missing ones count 0)."""
+    import psutil
+    total = 0.0
+    for pid in pids:
+        try:
+            t = psutil.Process(pid).cpu_times()
+            total += t.user + t.system
+        except (psutil.Error, TypeError):
+            pass
+    return total
+
+
+def live_targets(names):
+    """(pvs, sequence pvs, pids) for running IOCs named in settings.yaml: one _time PV per IOC."""
+    with open(SETTINGS_FILE) as f:
+        settings = yaml.safe_load(f)
+    prefix  = settings['general']['prefix']
+    log_dir = settings['general']['log_dir']
+    if not os.path.isabs(log_dir):
+        log_dir = os.path.join(PROJECT_ROOT, log_dir)
+    os.environ['EPICS_CA_ADDR_LIST'] = settings['general']['epics_addr_list']
+    os.environ['EPICS_CA_AUTO_ADDR_LIST'] = 'NO'
+    pvs, pids = [], []
+    for name in names:
+        if name not in settings or name == 'general':
+            sys.exit(f'unknown IOC: {name}')
+        try:
+            with open(os.path.join(log_dir, name), errors='replace') as f:
+                found = re.findall(rf'({re.escape(prefix)}[^\s]+)', f.read())
+        except OSError:
+            found = []
+        pvs.extend(p for p in dict.fromkeys(found) if not p.endswith('_time') and p not in pvs)
+        pids.append(find_ioc_pid(name))
+    return pvs, [f'{prefix}:MAN:{name}_time' for name in names], pids
+
+
+def run_step(n_clients, pvs, seq_pvs, counter, pids, args):
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    start_at = time.time() + args.warmup
+    stop_at = start_at + args.duration
+    procs = [ctx.Process(target=client_worker,
+                         args=(pvs, seq_pvs, counter, start_at, stop_at, results))
+             for _ in range(n_clients)]
+    if not counter:     # unloaded client that records every _time value published
+        procs.append(ctx.Process(target=client_worker,
+                                 args=([], seq_pvs, counter, start_at, stop_at, results, True)))
+    for p in procs:
+        p.start()
+    time.sleep(max(0.0, start_at - time.time()))
+    cpu0 = cpu_seconds(pids)
+    time.sleep(max(0.0, stop_at - time.time()))
+    cpu1 = cpu_seconds(pids)
+    collected = [results.get(timeout=args.duration + 30) for _ in procs]
+    for p in procs:
+        p.join()
+
+    clients = [c for c in collected if not c['reference']]
+    if counter:
+        missed = sum(c['missed'] for c in clients)
+    else:
+        reference = next(c for c in collected if c['reference'])['seq_values']
+        missed = sum(len(set(published) - set(c['seq_values'][pv]))
+                     for c in clients for pv, published in reference.items())
+    delays = [d for c in clients for d in c['delays']]
+    return summarize(delays,
+                     clients=n_clients,
+                     subscriptions=n_clients * len(pvs),
+                     updates=sum(c['updates'] for c in clients),
+                     missed=missed,
+                     sequence_updates=sum(c['seq_updates'] for c in clients),
+                     ioc_cpu=(cpu1 - cpu0) / args.duration)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--local', action='store_true', help='Use a local simulated IOC')
+    target.add_argument('--iocs', nargs='+', help='Running IOCs from settings.yaml')
+    parser.add_argument('--clients', default='1,2,4,8,16', help='Comma-separated client counts')
+    parser.add_argument('--inputs', type=int, default=20, help='Simulated input PVs (--local)')
+    parser.add_argument('--delay', type=float, default=0.1, help='Simulated poll period (--local)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds measured per step')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to connect before measuring')
+    parser.add_argument('--max-delay', type=float, default=100.0,
+                        help='p99 delay (ms) above which the IOC is not keeping up')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Private CA port (--local)')
+    parser.add_argument('-o', '--out', default='-', help='Result file (default stdout)')
+    args = parser.parse_args(argv)
+    counts = [int(c) for c in args.clients.split(',') if c]
+
+    local = None
+    if args.local:
+        isolate_ca(args.port)
+        local = LocalIOC({LOCAL_IOC: sim_settings(inputs=args.inputs, outputs=(), delay=args.delay)})
+        local.start()
+        pvs = [local.pv(f'Sim{n}_TI') for n in range(1, args.inputs + 1)]
+        seq_pvs, counter = [local.pv('Sim_Counter')], True
+        pids = [local.procs[LOCAL_IOC].pid]
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(wait_for_pvs(seq_pvs, timeout=60))
+    else:
+        counter = False
+        pvs, seq_pvs, pids = live_targets(args.iocs)
+        if not pvs:
+            sys.exit('no PVs found in the IOC logs; are the IOCs running?')
+
+    steps, sustained, failed = [], None, False
+    try:
+        for n in counts:
+            print(f'{n} client(s) x {len(pvs)} PVs…', file=sys.stderr)
+            step = run_step(n, pvs, seq_pvs, counter, pids, args)
+            steps.append(step)
+            ok = step['missed'] == 0 and step['p99'] is not None and step['p99'] <= args.max_delay
+            failed = failed or not ok       # a later lucky step does not count
+            if not failed:
+                sustained = n
+    finally:
+        if local is not None:
+            local.cleanup()
+
+    params = {k: v for k, v in vars(args).items() if k != 'out'}
+    write_results(args.out, {'meta': run_metadata(**params),
+                             'results': {f'clients_{s["clients"]}': s for s in steps},
+                             'sustained_clients': sustained})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,14 @@ IOC Commander — interactive curses TUI for Epics IOC screen sessions.
 
     python tools/ioc_cli.py
 
+Headless commands (for cron checks and scripts, JSON by default or --format csv):
+
+    python tools/ioc_cli.py status  [IOC ...]
+    python tools/ioc_cli.py pvs     [IOC ...]            (default: running IOCs)
+    python tools/ioc_cli.py get     PV [PV ...]          (bare names get the prefix)
+    python tools/ioc_cli.py put     PV=VALUE [PV=VALUE ...]
+    python tools/ioc_cli.py start   IOC [IOC ...] | --all   (also stop, restart)
+
 Keys (main view):
     ↑ / ↓       Select IOC
     Enter       View PVs for selected IOC
@@ -12,6 +20,7 @@ Keys (main view):
     x           Stop  selected IOC
     r           Restart selected IOC
     l           View log for selected IOC
+    /           Search IOC logs, e.g. "timeout in:hfc300 since:03:00"
     a           Attach to screen session (returns on detach)
     S           Start ALL autostart IOCs
     X           Stop  ALL IOCs
@@ -24,37 +33,65 @@ Keys (main view):
 Keys (log / PV view):
     ↑ / ↓       Scroll / select PV
     Enter       Set selected PV value (PV views only)
+    /           Filter PVs by name, IOC or DESC; ~text for fuzzy (PV views)
+    A           Only alarming PVs (PV views)
+    t           Trend plot of selected PV (PV views)
     f           Force refresh (PV view)
     q / Esc     Back to main view
 """
 
+import argparse
 import asyncio
-import curses
+import bisect
+import csv
+import datetime
+import json
 import os
 import re
 import subprocess
 import sys
 import time
+from array import array
 
-import aioca
 import yaml
-from screenutils import Screen
 
-# A single event loop shared for all aioca calls.  asyncio.run() closes the
-# loop after each call, which causes aioca's CA background threads to crash
-# on cleanup (call_soon_threadsafe on a closed loop).
-_loop = asyncio.new_event_loop()
-asyncio.set_event_loop(_loop)
+# curses and aioca are imported on first use (see main() and _ca()), so the
+# headless commands that need neither start without loading them.
+curses = None
+aioca  = None
+_loop  = None
+
+def _ca():
+    """Import aioca and create the event loop shared by all aioca calls.
+
+    A single loop is kept because asyncio.run() closes the loop after each
+    call, which causes aioca's CA background threads to crash on cleanup
+    (call_soon_threadsafe on a closed loop).
+    """
+    global aioca, _loop
+    if aioca is None:
+        import aioca as _aioca
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+        aioca = _aioca
+    return aioca
 
 # ── Paths ──────────────────────────────────────────────────────────────────────
 SETTINGS_FILE = os.path.normpath(
     os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'settings.yaml')
 )
 PROJECT_ROOT = os.path.dirname(SETTINGS_FILE)
+sys.path.insert(0, PROJECT_ROOT)
+
+from screens import screen_sessions     # noqa: E402  (needs PROJECT_ROOT on the path)
 
 REFRESH_SECS    = 2          # auto-refresh interval
 LOG_TAIL        = 200        # max lines kept in log view
+SEARCH_MAX_HITS = 2000       # stop collecting search results after this many
+INDEX_DIR       = '.index'   # log index files live in <log_dir>/.index/
 MANAGER_SCREEN  = 'ioc-manager'
+TREND_SAMPLES   = 1800       # samples kept per watched PV (1 h at REFRESH_SECS)
+TREND_COLS      = 12         # width of the sparkline column in PV views
 
 
 # ── Settings / log helpers ─────────────────────────────────────────────────────
@@ -65,11 +102,14 @@ def load_settings():
 def ioc_names(settings):
     return [k for k in settings if k != 'general']
 
-def log_path(settings, name):
+def logs_dir(settings):
     log_dir = settings['general']['log_dir']
     if not os.path.isabs(log_dir):
         log_dir = os.path.join(PROJECT_ROOT, log_dir)
-    return os.path.normpath(os.path.join(log_dir, name))
+    return os.path.normpath(log_dir)
+
+def log_path(settings, name):
+    return os.path.join(logs_dir(settings), name)
 
 def read_log_lines(path, n):
     """Return up to n lines from the end of a log file."""
@@ -92,12 +132,274 @@ def read_log_lines(path, n):
         return ['(unreadable)']
 
 
-# ── Screen / IOC actions ───────────────────────────────────────────────────────
-def ioc_running(name):
-    return Screen(name).exists
+# ── Log index / search ─────────────────────────────────────────────────────────
+_TOKEN_RE   = re.compile(rb'[a-z_][a-z0-9_]{2,}')
+_LOGTIME_RE = re.compile(rb'^\s*(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)')
+
+class LogIndex:
+    """
+    On-disk line/byte-offset, timestamp and token index for one log file.
+
+    offsets[i] is the byte offset of line i, times[i] the most recent log
+    timestamp seen at or before line i (0 if none yet), and tokens maps each
+    lowercased word to the line numbers containing it. update() only reads
+    bytes appended since the last call; a shrunken file is re-indexed.
+
+    The index is kept in <log_dir>/.index/<log>.index/ as plain files that
+    save() only appends to: offsets.u64 and times.f64 (raw arrays), tokens.jsonl
+    (one {token: [line, ...]} object per save) and meta.json, replaced last, with
+    the lengths the other files are valid up to.
+    """
+    VERSION = 2
+
+    def __init__(self, path):
+        self.path       = path
+        self.index_path = os.path.join(os.path.dirname(path), INDEX_DIR,
+                                       os.path.basename(path) + '.index')
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.size    = 0
+        self.offsets = array('Q')
+        self.times   = array('d')
+        self.tokens  = {}
+        self._sorted_tokens = None
+        self._saved  = None         # meta of what is on disk; None: rewrite from scratch
+        self._new_tokens = {}       # postings added since the last save
+
+    def _file(self, name):
+        return os.path.join(self.index_path, name)
+
+    def _load(self):
+        try:
+            with open(self._file('meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('version') != self.VERSION:
+                return
+            offsets, times = array('Q'), array('d')
+            with open(self._file('offsets.u64'), 'rb') as f:
+                offsets.frombytes(f.read(meta['lines'] * offsets.itemsize))
+            with open(self._file('times.f64'), 'rb') as f:
+                times.frombytes(f.read(meta['lines'] * times.itemsize))
+            tokens = {}
+            with open(self._file('tokens.jsonl'), 'rb') as f:
+                for line in f.read(meta['tokens_bytes']).splitlines():
+                    for tok, lines in json.loads(line).items():
+                        postings = tokens.get(tok.encode())
+                        if postings is None:
+                            postings = tokens[tok.encode()] = array('I')
+                        postings.extend(lines)
+        except (OSError, ValueError, KeyError):
+            return
+        if len(offsets) == len(times) == meta['lines']:
+            self.size, self.offsets, self.times, self.tokens = meta['size'], offsets, times, tokens
+            self._saved = meta
+
+    def save(self):
+        """Append what update() added since the last save, then commit it in meta.json."""
+        os.makedirs(self.index_path, exist_ok=True)
+        saved = self._saved or {'lines': 0, 'tokens_bytes': 0}
+        mode  = 'ab' if self._saved else 'wb'
+        first = saved['lines']
+        with open(self._file('offsets.u64'), mode) as f:
+            f.truncate(first * self.offsets.itemsize)   # drop anything past the last commit
+            f.write(self.offsets[first:].tobytes())
+        with open(self._file('times.f64'), mode) as f:
+            f.truncate(first * self.times.itemsize)
+            f.write(self.times[first:].tobytes())
+        tokens = self._new_tokens if self._saved else self.tokens
+        with open(self._file('tokens.jsonl'), mode) as f:
+            f.truncate(saved['tokens_bytes'])
+            if tokens:
+                f.write(json.dumps({tok.decode(): list(lines) for tok, lines in tokens.items()}).encode() + b'\n')
+            tokens_bytes = f.tell()
+        meta = {'version': self.VERSION, 'size': self.size, 'lines': len(self.offsets),
+                'tokens_bytes': tokens_bytes}
+        tmp = self._file('meta.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file('meta.json'))
+        self._saved = meta
+        self._new_tokens = {}
+
+    def update(self):
+        """Index complete lines appended since the last update. Returns True if anything changed."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        if size < self.size:                  # truncated or replaced: start over
+            self._reset()
+        if size == self.size:
+            return False
+
+        pos     = self.size
+        line_no = len(self.offsets)
+        last_t  = self.times[-1] if self.times else 0.0
+        last_ts = None
+        with open(self.path, 'rb') as f:
+            f.seek(pos)
+            for line in f:
+                if not line.endswith(b'\n'):    # partial line, pick it up next time
+                    break
+                m = _LOGTIME_RE.match(line)
+                if m and m.group(1) != last_ts:
+                    last_ts = m.group(1)
+                    try:    # kept non-decreasing so line_for_time() can bisect
+                        last_t = max(last_t, time.mktime(
+                            time.strptime(last_ts.decode(), '%Y-%m-%d %H:%M:%S')))
+                    except ValueError:
+                        pass
+                self.offsets.append(pos)
+                self.times.append(last_t)
+                for tok in set(_TOKEN_RE.findall(line.lower())):
+                    for table in (self.tokens, self._new_tokens):
+                        postings = table.get(tok)
+                        if postings is None:
+                            postings = table[tok] = array('I')
+                        postings.append(line_no)
+                pos     += len(line)
+                line_no += 1
+        changed = pos != self.size
+        self.size = pos
+        if changed:
+            self._sorted_tokens = None
+        return changed
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def line_for_time(self, t):
+        """First line number whose timestamp is >= t."""
+        return bisect.bisect_left(self.times, t)
+
+    def read_lines(self, first, count):
+        """Decode lines first .. first+count-1 using the stored offsets."""
+        first = max(0, first)
+        last  = min(len(self.offsets), first + count)
+        if first >= last:
+            return []
+        end = self.offsets[last] if last < len(self.offsets) else self.size
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offsets[first])
+                buf = f.read(end - self.offsets[first])
+        except OSError:
+            return []
+        return buf.decode('utf-8', errors='replace').splitlines()
+
+    def _candidates(self, term):
+        """Line numbers with a word containing term. A query word is always part of one
+        word of a matching line, so this is a superset of the lines holding term."""
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.tokens)
+        hits = set()
+        for tok in self._sorted_tokens:
+            if term in tok:
+                hits.update(self.tokens[tok])
+        return hits
+
+    def search(self, query, since=0.0, limit=SEARCH_MAX_HITS):
+        """
+        Return [(line_no, text)] for lines containing query (case-insensitive)
+        at or after time `since`. Words in the query narrow the candidates
+        through the token index, and each candidate is confirmed by a substring
+        check, so results match a plain scan; queries without a word are scanned.
+        """
+        needle = query.lower().encode()
+        start  = self.line_for_time(since) if since else 0
+        terms  = _TOKEN_RE.findall(needle)
+        if terms:
+            cands = self._candidates(terms[0])
+            for term in terms[1:]:
+                cands &= self._candidates(term)
+            cands = sorted(c for c in cands if c >= start)
+        else:
+            cands = range(start, len(self.offsets))
+
+        hits = []
+        try:
+            with open(self.path, 'rb') as f:
+                for n in cands:
+                    f.seek(self.offsets[n])
+                    line = f.readline()
+                    if needle in line.lower():
+                        hits.append((n, line.decode('utf-8', errors='replace').rstrip()))
+                        if len(hits) >= limit:
+                            break
+        except OSError:
+            pass
+        return hits
+
+
+_log_indexes: dict = {}   # {log path: LogIndex}
+
+def log_index(settings, name):
+    """Return the LogIndex for an IOC log, brought up to date and saved if it grew."""
+    path = log_path(settings, name)
+    idx  = _log_indexes.get(path)
+    if idx is None:
+        idx = _log_indexes[path] = LogIndex(path)
+    if idx.update():
+        try:
+            idx.save()
+        except OSError:
+            pass
+    return idx
 
-def start_ioc(settings, name):
-    if ioc_running(name):
+def parse_since(text):
+    """Parse 'HH:MM[:SS]' (most recent such time) or 'YYYY-MM-DD[ HH:MM[:SS]]' to epoch seconds."""
+    text = text.strip().replace('T', ' ')
+    now  = datetime.datetime.now()
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            t = datetime.datetime.strptime(text, fmt).time()
+        except ValueError:
+            continue
+        when = datetime.datetime.combine(now.date(), t)
+        if when > now:
+            when -= datetime.timedelta(days=1)
+        return when.timestamp()
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f'bad time: {text!r}')
+
+def parse_search(text, names):
+    """
+    Split a search line into (query, iocs, since).
+
+        timeout in:hfc300,pfeiffer-26x_1 since:03:00
+    """
+    iocs, since, words = list(names), 0.0, []
+    for word in text.split():
+        if word.startswith('in:'):
+            wanted  = [n for n in word[3:].split(',') if n]
+            unknown = [n for n in wanted if n not in names]
+            if unknown:
+                raise ValueError(f'unknown IOC: {", ".join(unknown)}')
+            iocs = wanted
+        elif word.startswith('since:'):
+            since = parse_since(word[6:])
+        else:
+            words.append(word)
+    return ' '.join(words), iocs, since
+
+
+# ── Screen / IOC actions ───────────────────────────────────────────────────────
+# Views take one screen_sessions() snapshot per refresh and pass it down to
+# ioc_running()/manager_running() and the start/stop actions.
+def ioc_running(name, sessions=None):
+    if sessions is None:
+        sessions = screen_sessions()
+    return name in sessions
+
+def start_ioc(settings, name, sessions=None):
+    from screenutils import Screen
+    if ioc_running(name, sessions):
         return f'{name}: already running'
     lp = log_path(settings, name)
     os.makedirs(os.path.dirname(lp), exist_ok=True)
@@ -109,21 +411,24 @@ def start_ioc(settings, name):
     screen.send_commands('softioc.dbl()')
     return f'{name}: started'
 
-def stop_ioc(name):
-    if not ioc_running(name):
+def stop_ioc(name, sessions=None):
+    if not ioc_running(name, sessions):
         return f'{name}: not running'
     subprocess.run(['screen', '-XS', name, 'kill'], check=False)
     return f'{name}: stopped'
 
-def restart_ioc(settings, name):
-    stop_ioc(name)
+def restart_ioc(settings, name, sessions=None):
+    stop_ioc(name, sessions)
     time.sleep(1)
-    return start_ioc(settings, name)
+    if sessions is not None:
+        sessions = {n: pid for n, pid in sessions.items() if n != name}
+    return start_ioc(settings, name, sessions)
 
-def manager_running():
-    return Screen(MANAGER_SCREEN).exists
+def manager_running(sessions=None):
+    return ioc_running(MANAGER_SCREEN, sessions)
 
 def start_manager():
+    from screenutils import Screen
     if manager_running():
         return 'manager: already running'
     subprocess.run(['screen', '-dmS', MANAGER_SCREEN, 'bash'], check=False)
@@ -240,15 +545,15 @@ def draw_help(win, keys):
 
 
 # ── Main list view ─────────────────────────────────────────────────────────────
-def draw_main(win, settings, names, selected, status_msg, prefix):
+def draw_main(win, settings, names, selected, status_msg, prefix, sessions):
     h, w = win.getmaxyx()
     win.erase()
 
-    mgr_label = 'MANAGER: running' if manager_running() else 'MANAGER: stopped'
-    _, w = win.getmaxyx()
-    title    = f' {prefix} IOC Monitor '
-    mgr_attr = (curses.color_pair(C_RUNNING) if manager_running()
-                else curses.color_pair(C_STOPPED))
+    mgr_up    = manager_running(sessions)
+    mgr_label = 'MANAGER: running' if mgr_up else 'MANAGER: stopped'
+    title     = f' {prefix} IOC Monitor '
+    mgr_attr  = (curses.color_pair(C_RUNNING) if mgr_up
+                 else curses.color_pair(C_STOPPED))
     draw_title(win, title)
     safe_addstr(win, 0, w - len(mgr_label) - 2, mgr_label,
                 curses.color_pair(C_TITLE) | curses.A_BOLD | mgr_attr)
@@ -278,7 +583,7 @@ def draw_main(win, settings, names, selected, status_msg, prefix):
         if row < 2 or row >= h - 2:
             continue
 
-        running   = ioc_running(name)
+        running   = ioc_running(name, sessions)
         autostart = settings[name].get('autostart', False)
 
         run_label  = 'running' if running  else 'stopped'
@@ -309,7 +614,7 @@ def draw_main(win, settings, names, selected, status_msg, prefix):
                         f'{auto_label:<{col_auto}}', auto_attr)
             safe_addstr(win, row, 1+col_name+col_st+col_auto, last_line)
 
-    draw_help(win, [('s','start'),('x','stop'),('l','logs'),('a','attach'),
+    draw_help(win, [('s','start'),('x','stop'),('l','logs'),('/','search'),('a','attach'),
                     ('p','all PVs'),('m','mgr start'),('M','mgr stop'),('?','help'),('q','quit')])
     draw_status(win, f'  {status_msg}   (auto-refresh {REFRESH_SECS}s)')
     win.refresh()
@@ -325,6 +630,7 @@ HELP_LINES = [
         ('x',            'Stop selected IOC'),
         ('r',            'Restart selected IOC'),
         ('l',            'View log for selected IOC'),
+        ('/',            'Search IOC logs (word  in:ioc1,ioc2  since:HH:MM)'),
         ('a',            'Attach to screen session (Ctrl+A D to detach)'),
         ('S',            'Start ALL autostart IOCs'),
         ('X',            'Stop ALL running IOCs'),
@@ -339,10 +645,19 @@ HELP_LINES = [
         ('PgUp / PgDn',  'Scroll one page'),
         ('l / q / Esc',  'Return to main view'),
     ]),
+    ('Search results', [
+        ('↑ / ↓',        'Select hit'),
+        ('Enter',        'Open log at the selected hit'),
+        ('/',            'Edit search'),
+        ('q / Esc',      'Return to main view'),
+    ]),
     ('PV view (single IOC)', [
         ('↑ / ↓',        'Move cursor / scroll'),
         ('Enter',        'Set selected PV value'),
         ('PgUp / PgDn',  'Scroll one page'),
+        ('t',            'Full-screen trend plot of selected PV'),
+        ('/',            'Filter by PV, IOC or DESC (~ prefix = fuzzy)'),
+        ('A',            'Toggle showing only alarming PVs'),
         ('f',            'Force immediate refresh'),
         ('d',            'Request dbl() from IOC (re-list PVs)'),
         ('q / Esc',       'Return to main view'),
@@ -351,6 +666,9 @@ HELP_LINES = [
         ('↑ / ↓',        'Move cursor / scroll (skips IOC headers)'),
         ('Enter',        'Set selected PV value'),
         ('PgUp / PgDn',  'Scroll one page'),
+        ('t',            'Full-screen trend plot of selected PV'),
+        ('/',            'Filter by PV, IOC or DESC (~ prefix = fuzzy)'),
+        ('A',            'Toggle showing only alarming PVs'),
         ('f',            'Force immediate refresh'),
         ('q / Esc',       'Return to main view'),
     ]),
@@ -410,29 +728,54 @@ def help_view(stdscr, prefix):
 
 
 # ── Log view ───────────────────────────────────────────────────────────────────
-def log_view(stdscr, settings, name, prefix):
-    """Full-screen scrollable log viewer for one IOC. Returns when user exits."""
+def log_view(stdscr, settings, name, prefix, goto=None, highlight=''):
+    """
+    Full-screen scrollable log viewer for one IOC. Returns when user exits.
+
+    Normally follows the last LOG_TAIL lines. With goto (a line number from
+    the log index) it pages through the whole file around that line instead,
+    marking lines that contain highlight.
+    """
     curses.curs_set(0)
     scroll = 0
     status = ''
+    index  = None
+    needle = highlight.lower()
+
+    if goto is not None:
+        index = log_index(settings, name)
+        h, _  = stdscr.getmaxyx()
+        scroll = max(0, goto - (h - 4) // 3)
 
     while True:
         h, w = stdscr.getmaxyx()
         stdscr.erase()
         draw_title(stdscr, f' {prefix} — Log: {name} ')
-
-        lines     = read_log_lines(log_path(settings, name), LOG_TAIL)
         view_rows = h - 4          # title + help + status
-        max_scroll = max(0, len(lines) - view_rows)
-        scroll     = min(scroll, max_scroll)
 
-        for i, line in enumerate(lines[scroll:scroll + view_rows]):
-            safe_addstr(stdscr, i + 1, 1, line[:w - 2])
+        if index is None:
+            lines      = read_log_lines(log_path(settings, name), LOG_TAIL)
+            total      = len(lines)
+            max_scroll = max(0, total - view_rows)
+            scroll     = min(scroll, max_scroll)
+            visible    = lines[scroll:scroll + view_rows]
+        else:
+            total      = len(index)
+            max_scroll = max(0, total - view_rows)
+            scroll     = min(scroll, max_scroll)
+            visible    = index.read_lines(scroll, view_rows)
 
-        draw_help(stdscr, [('↑↓','scroll'),('l/q/Esc','back')])
+        for i, line in enumerate(visible):
+            attr = 0
+            if index is not None and (scroll + i == goto or
+                                      (needle and needle in line.lower())):
+                attr = curses.color_pair(C_DIM) | curses.A_BOLD
+            safe_addstr(stdscr, i + 1, 1, line[:w - 2], attr)
+
+        draw_help(stdscr, [('↑↓','scroll'),('PgUp/Dn','page'),('l/q/Esc','back')])
         draw_status(stdscr, f'  {name}  lines {scroll+1}–'
-                             f'{min(scroll+view_rows, len(lines))}'
-                             f'/{len(lines)}  {status}')
+                             f'{min(scroll+view_rows, total)}'
+                             f'/{total}  {status}')
         stdscr.refresh()
 
         stdscr.timeout(REFRESH_SECS * 1000)
@@ -451,6 +794,93 @@ def log_view(stdscr, settings, name, prefix):
         # timeout (key == -1): just refresh
 
 
+# ── Log search view ────────────────────────────────────────────────────────────
+def search_view(stdscr, settings, names, prefix, initial=''):
+    """
+    Prompt for a search, run it against the indexed logs, list the hits and
+    open the log viewer at the selected one. Returns a status message.
+    """
+    confirmed, text = input_popup(stdscr, 'Search logs  (word  in:ioc1,ioc2  since:HH:MM)', initial)
+    stdscr.clear()
+    if not confirmed or not text.strip():
+        return 'Search cancelled'
+    try:
+        query, iocs, since = parse_search(text, names)
+    except ValueError as e:
+        return f'Search: {e}'
+    if not query:
+        return 'Search: nothing to look for'
+
+    draw_status(stdscr, f'  Indexing {len(iocs)} log(s)…')
+    stdscr.refresh()
+    t0   = time.monotonic()
+    hits = []                  # (ioc, line_no, epoch, text)
+    for n in iocs:
+        idx = log_index(settings, n)
+        for line_no, line in idx.search(query, since, SEARCH_MAX_HITS - len(hits)):
+            hits.append((n, line_no, idx.times[line_no], line))
+        if len(hits) >= SEARCH_MAX_HITS:
+            break
+    hits.sort(key=lambda hit: hit[2])
+    elapsed = (time.monotonic() - t0) * 1000
+    status  = (f'{len(hits)} hit(s) for "{query}" in {len(iocs)} log(s)  ({elapsed:.0f} ms)'
+               + ('  [truncated]' if len(hits) >= SEARCH_MAX_HITS else ''))
+
+    curses.curs_set(0)
+    cursor, scroll = 0, 0
+    col_ioc = max((len(n) for n in iocs), default=8) + 2
+    col_ts  = 20
+    while True:
+        h, w = stdscr.getmaxyx()
+        stdscr.erase()
+        draw_title(stdscr, f' {prefix} — Search: {text} ')
+        fill_row(stdscr, 1, curses.color_pair(C_HEADER) | curses.A_BOLD)
+        safe_addstr(stdscr, 1, 1, f'{"IOC":<{col_ioc}}{"TIME":<{col_ts}}LINE'[:w - 2],
+                    curses.color_pair(C_HEADER) | curses.A_BOLD)
+
+        view_rows = h - 4
+        if not hits:
+            safe_addstr(stdscr, 2, 2, 'No matches.', curses.color_pair(C_STOPPED))
+        for i, (n, line_no, t, line) in enumerate(hits[scroll:scroll + view_rows]):
+            row = i + 2
+            ts  = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t)) if t else '-'
+            out = f'{n:<{col_ioc}}{ts:<{col_ts}}{line}'
+            if scroll + i == cursor:
+                fill_row(stdscr, row, curses.color_pair(C_SELECTED) | curses.A_BOLD)
+                safe_addstr(stdscr, row, 1, out[:w - 2], curses.color_pair(C_SELECTED) | curses.A_BOLD)
+            else:
+                safe_addstr(stdscr, row, 1, f'{n:<{col_ioc}}', curses.color_pair(C_DIM))
+                safe_addstr(stdscr, row, 1 + col_ioc, f'{ts:<{col_ts}}')
+                safe_addstr(stdscr, row, 1 + col_ioc + col_ts, line)
+
+        draw_help(stdscr, [('↑↓','select'),('Enter','open in log'),('/','new search'),('q/Esc','back')])
+        draw_status(stdscr, f'  {status}')
+        stdscr.refresh()
+
+        stdscr.timeout(-1)
+        key = stdscr.getch()
+
+        if key in (ord('q'), 27):
+            return status
+        elif key == ord('/'):
+            return search_view(stdscr, settings, names, prefix, text)
+        elif key == curses.KEY_UP and hits:
+            cursor = max(0, cursor - 1)
+            scroll = min(scroll, cursor)
+        elif key == curses.KEY_DOWN and hits:
+            cursor = min(len(hits) - 1, cursor + 1)
+            scroll = max(scroll, cursor - (h - 5))
+        elif key == curses.KEY_PPAGE and hits:
+            cursor = max(0, cursor - (h - 4))
+            scroll = min(scroll, cursor)
+        elif key == curses.KEY_NPAGE and hits:
+            cursor = min(len(hits) - 1, cursor + (h - 4))
+            scroll = max(scroll, cursor - (h - 5))
+        elif key in (curses.KEY_ENTER, ord('\n'), ord('\r')) and hits:
+            n, line_no, _, _ = hits[cursor]
+            log_view(stdscr, settings, n, prefix, goto=line_no, highlight=query)
+
+
 # ── Curses suspend/resume helper ──────────────────────────────────────────────
 def suspended(stdscr, fn):
     """Run fn() with curses suspended, then restore the display."""
@@ -572,21 +1002,34 @@ def do_attach(stdscr, name):
 
 
 # ── PV helpers ────────────────────────────────────────────────────────────────
+_pv_name_scans: dict = {}   # {(path, prefix): [bytes scanned, seen set, ordered list]}
+
 def pv_names_from_log(path, prefix):
-    """Extract PV names from an IOC log file (same approach as ioc_manager)."""
+    """Extract PV names from an IOC log file (same approach as ioc_manager).
+
+    Only the bytes appended since the previous call are scanned; a log that
+    shrank (restarted IOC) is rescanned from the start.
+    """
     if not os.path.exists(path):
         return []
+    key  = (path, prefix)
+    scan = _pv_name_scans.get(key)
     try:
-        with open(path, errors='replace') as f:
-            content = f.read()
-        found = re.findall(rf'({re.escape(prefix)}[^\s]+)', content)
-        # Deduplicate while preserving order
-        seen, out = set(), []
-        for pv in found:
-            if pv not in seen:
-                seen.add(pv)
-                out.append(pv)
-        return out
+        size = os.path.getsize(path)
+        if scan is None or size < scan[0]:
+            scan = _pv_name_scans[key] = [0, set(), []]
+        if size > scan[0]:
+            with open(path, 'rb') as f:
+                f.seek(scan[0])
+                chunk = f.read(size - scan[0])
+            end = chunk.rfind(b'\n') + 1        # leave a partial last line for next time
+            text = chunk[:end].decode('utf-8', errors='replace')
+            for pv in re.findall(rf'({re.escape(prefix)}[^\s]+)', text):
+                if pv not in scan[1]:
+                    scan[1].add(pv)
+                    scan[2].append(pv)
+            scan[0] += end
+        return list(scan[2])
     except OSError:
         return []
 
@@ -598,6 +1041,7 @@ def fetch_pv_values(pv_names):
     """
     if not pv_names:
         return {}, {}
+    _ca()
 
     async def _fetch():
         results = await aioca.caget(
@@ -612,7 +1056,13 @@ def fetch_pv_values(pv_names):
                 if hasattr(val, '__len__') and not isinstance(val, str):
                     vals[name] = str(list(val))
                 else:
-                    vals[name] = str(val)
+                    prec = _pv_meta.get(name, {}).get('prec')
+                    if isinstance(val, float) and prec is not None:
+                        vals[name] = f'{val:.{prec}f}'
+                    else:
+                        vals[name] = str(val)
+                    if isinstance(val, (int, float)):
+                        record_trend(name, val.timestamp, float(val))
                 sevs[name] = int(getattr(val, 'severity', 0))
         return vals, sevs
 
@@ -630,326 +1080,645 @@ _WRITABLE_RTYPES = frozenset({
     'calcout', 'waveform', 'asyn',
 })
 
-_rtyp_cache: dict = {}   # {pv_name: str|None}  — None means unknown (treat as writable)
+# PV metadata, from one FORMAT_CTRL caget of VAL, RTYP and DESC per PV. Kept
+# on disk so reopening a view costs no CA traffic; an entry is refetched when
+# the owning IOC's screen session (pid) changes, i.e. after a restart.
+_META_FIELDS = (
+    ('egu',  'units'),
+    ('prec', 'precision'),
+    ('drvh', 'upper_ctrl_limit'),
+    ('drvl', 'lower_ctrl_limit'),
+    ('hihi', 'upper_alarm_limit'),
+    ('high', 'upper_warning_limit'),
+    ('low',  'lower_warning_limit'),
+    ('lolo', 'lower_alarm_limit'),
+)
 
-def fetch_missing_rtypes(pv_names):
-    """Fetch and cache .RTYP for any pv_names not already in _rtyp_cache."""
-    needed = [p for p in pv_names if p not in _rtyp_cache]
-    if not needed:
+_pv_meta: dict = {}       # {pv_name: {'ioc', 'session', 'rtyp', 'desc', 'egu', 'prec', ...}}
+_pv_meta_path = None
+_pv_meta_missing: dict = {}   # {pv_name: (session, retry time)} for PVs that did not answer
+META_RETRY = 60           # seconds before a PV that did not answer is asked again
+
+def load_pv_meta(settings):
+    """Load the persisted metadata cache from <log_dir>/.index/pv_meta.json."""
+    global _pv_meta_path
+    _pv_meta_path = os.path.join(logs_dir(settings), INDEX_DIR, 'pv_meta.json')
+    try:
+        with open(_pv_meta_path) as f:
+            _pv_meta.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+def save_pv_meta():
+    if _pv_meta_path is None:
         return
+    try:
+        os.makedirs(os.path.dirname(_pv_meta_path), exist_ok=True)
+        tmp = _pv_meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(_pv_meta, f)
+        os.replace(tmp, _pv_meta_path)
+    except OSError:
+        pass
+
+def ensure_pv_meta(ioc_pv_map, sessions):
+    """
+    Fetch metadata for PVs of running IOCs that have none, or whose IOC has
+    restarted since it was cached. Returns True if anything was fetched.
+    PVs that did not answer (e.g. stale names from an appended log) are not
+    asked again until their IOC restarts or META_RETRY seconds have passed.
+    """
+    now   = time.monotonic()
+    stale = [(n, pv) for n, pvs in ioc_pv_map.items() if n in sessions for pv in pvs
+             if _pv_meta.get(pv, {}).get('session') != sessions[n]
+             and not (pv in _pv_meta_missing and _pv_meta_missing[pv][0] == sessions[n]
+                      and _pv_meta_missing[pv][1] > now)]
+    if not stale:
+        return False
+    _ca()
+    names = [pv for _, pv in stale]
 
     async def _get():
-        results = await aioca.caget(
-            [p + '.RTYP' for p in needed], timeout=2.0, throw=False
-        )
-        for name, val in zip(needed, results):
-            if isinstance(val, aioca.CANothing):
-                _rtyp_cache[name] = None
-            else:
-                _rtyp_cache[name] = str(val).strip()
+        fields = names + [p + '.RTYP' for p in names] + [p + '.DESC' for p in names]
+        return await aioca.caget(fields, format=aioca.FORMAT_CTRL, timeout=2.0, throw=False)
 
     try:
-        _loop.run_until_complete(_get())
+        results = _loop.run_until_complete(_get())
     except Exception:
-        for name in needed:
-            _rtyp_cache[name] = None
+        return False
+    k = len(names)
+    for (n, pv), val, rtyp, desc in zip(stale, results, results[k:], results[2 * k:]):
+        if isinstance(val, aioca.CANothing):
+            _pv_meta_missing[pv] = (sessions[n], now + META_RETRY)
+            continue
+        _pv_meta_missing.pop(pv, None)
+        meta = {'ioc': n, 'session': sessions[n],
+                'rtyp': None if isinstance(rtyp, aioca.CANothing) else str(rtyp).strip(),
+                'desc': '' if isinstance(desc, aioca.CANothing) else str(desc).strip()}
+        for key, attr in _META_FIELDS:
+            meta[key] = getattr(val, attr, None)
+        if meta['egu'] is not None:
+            meta['egu'] = str(meta['egu']).strip()
+        _pv_meta[pv] = meta
+    save_pv_meta()
+    return True
+
+def pv_desc(pv_name):
+    return _pv_meta.get(pv_name, {}).get('desc') or ''
+
+def pv_range_label(pv_name):
+    """Short 'DESC  [DRVL..DRVH EGU]  alarms LOLO/LOW/HIGH/HIHI' label for the status bar."""
+    meta = _pv_meta.get(pv_name)
+    if not meta:
+        return ''
+    egu   = meta.get('egu') or ''
+    parts = [meta.get('desc') or '']
+    lo, hi = meta.get('drvl'), meta.get('drvh')
+    if lo is not None and hi is not None and lo < hi:
+        parts.append(f'[{lo:g}..{hi:g} {egu}]'.replace(' ]', ']'))
+    limits = [meta.get(k) for k in ('lolo', 'low', 'high', 'hihi')]
+    if all(isinstance(v, (int, float)) for v in limits) and any(limits):
+        parts.append('alarms ' + '/'.join(f'{v:g}' for v in limits))
+    return '  '.join(p for p in parts if p)
 
 def is_pv_writable(pv_name):
     """Return True if the PV's record type suggests it accepts external writes."""
-    rtyp = _rtyp_cache.get(pv_name)
+    rtyp = _pv_meta.get(pv_name, {}).get('rtyp')
     return rtyp is None or rtyp in _WRITABLE_RTYPES
 
 
-def caput_pv(pv_name, value_str):
-    """Write value_str to pv_name via caput. Returns a status string."""
-    async def _put():
+def parse_put_value(value_str):
+    """Interpret a typed value as int, then float, falling back to the string."""
+    try:
+        return int(value_str)
+    except ValueError:
         try:
-            val = int(value_str)
+            return float(value_str)
         except ValueError:
-            try:
-                val = float(value_str)
-            except ValueError:
-                val = value_str
-        await aioca.caput(pv_name, val, timeout=3.0)
+            return value_str
+
+def caput_pvs(values):
+    """Write {pv_name: value_str} in one batched caput. Returns {pv_name: error_str or None}."""
+    if not values:
+        return {}
+    _ca()
+    names = list(values)
+
+    async def _put():
+        return await aioca.caput(names, [parse_put_value(values[n]) for n in names],
+                                 timeout=3.0, throw=False)
 
     try:
-        _loop.run_until_complete(_put())
-        return f'Set {pv_name} = {value_str}'
+        results = _loop.run_until_complete(_put())
     except Exception as e:
-        return f'caput {pv_name} failed: {e}'
+        return {n: str(e) for n in names}
+    return {n: (str(r) if isinstance(r, aioca.CANothing) and not r.ok else None)
+            for n, r in zip(names, results)}
 
+def caput_pv(pv_name, value_str):
+    """Write value_str to pv_name via caput. Returns a status string."""
+    err = caput_pvs({pv_name: value_str})[pv_name]
+    if err is None:
+        return f'Set {pv_name} = {value_str}'
+    return f'caput {pv_name} failed: {err}'
 
-# ── PV view ────────────────────────────────────────────────────────────────────
-def pv_view(stdscr, settings, name, prefix):
-    """Full-screen view of all PVs for one IOC with live values."""
-    curses.curs_set(0)
-    scroll     = 0
-    cursor     = 0
-    pv_vals    = {}
-    pv_sevs    = {}
-    status     = 'Fetching…'
-    last_fetch = 0.0
 
-    lp      = log_path(settings, name)
-    pv_list = pv_names_from_log(lp, prefix)
+# ── Trend buffers ─────────────────────────────────────────────────────────────
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+class TrendBuffer:
+    """
+    Fixed-size ring of (time, value) samples for one PV.
+
+    Both columns are preallocated arrays, so memory is constant however long
+    the TUI runs. Alongside them, append() keeps (min, max) buckets of 2, 4,
+    8, ... samples up to date, one ring per level. decimate() picks the
+    finest level with no more buckets than the screen has columns, so a
+    redraw reads at most width buckets whatever the history length.
+    """
+
+    def __init__(self, capacity=TREND_SAMPLES):
+        self.capacity = capacity
+        self.times    = array('d', bytes(8 * capacity))
+        self.values   = array('d', bytes(8 * capacity))
+        self.head     = 0          # next slot to write
+        self.count    = 0
+        self.appended = 0          # total samples ever appended, also the next sample's number
+        self.levels   = []         # [(lo, hi)] per level L >= 1: bucket b holds samples b*2^L ...
+        size = 2
+        while size < 2 * capacity:
+            n = capacity // size + 2
+            self.levels.append((array('d', bytes(8 * n)), array('d', bytes(8 * n))))
+            size *= 2
+        self._cache   = (None, None)
+
+    def append(self, t, v):
+        """Add a sample; repeats of the newest timestamp (no IOC update) are ignored."""
+        if self.count and t <= self.times[self.head - 1]:
+            return
+        self.times[self.head]  = t
+        self.values[self.head] = v
+        self.head     = (self.head + 1) % self.capacity
+        self.count    = min(self.count + 1, self.capacity)
+        k = self.appended
+        for level, (lo, hi) in enumerate(self.levels, 1):
+            slot = (k >> level) % len(lo)
+            if k & ((1 << level) - 1) == 0:        # first sample of a new bucket
+                lo[slot] = hi[slot] = v
+            else:
+                lo[slot] = min(lo[slot], v)
+                hi[slot] = max(hi[slot], v)
+        self.appended += 1
+
+    def _slot(self, i):
+        """Slot of the i-th oldest sample."""
+        return (self.head - self.count + i) % self.capacity
+
+    def span(self):
+        """(oldest, newest) sample times, or None if empty."""
+        if not self.count:
+            return None
+        return self.times[self._slot(0)], self.times[self._slot(self.count - 1)]
+
+    def decimate(self, width):
+        """
+        Return up to width (min, max) pairs covering the history, oldest first: single
+        samples if they fit, else the finest bucket level that does. A bucket partly
+        overwritten by the ring is left out, so every pair covers live samples only.
+        """
+        key = (self.appended, width)
+        if self._cache[0] == key:
+            return self._cache[1]
+        if width < 1 or not self.count:
+            out = []
+        elif self.count <= width:
+            out = [(v, v) for v in (self.values[self._slot(i)] for i in range(self.count))]
+        else:
+            first, last = self.appended - self.count, self.appended - 1
+            for level, (lo, hi) in enumerate(self.levels, 1):
+                start = (first + (1 << level) - 1) >> level    # first whole bucket
+                end   = last >> level
+                if end - start + 1 <= width:
+                    break
+            n   = len(lo)
+            out = [(lo[b % n], hi[b % n]) for b in range(start, end + 1)]
+        self._cache = (key, out)
+        return out
 
+_trends: dict = {}   # {pv_name: TrendBuffer} for every PV the TUI has fetched
+
+def record_trend(pv_name, t, value):
+    buf = _trends.get(pv_name)
+    if buf is None:
+        buf = _trends[pv_name] = TrendBuffer()
+    buf.append(t, value)
+
+def sparkline(pv_name, width):
+    """Render a PV's history as a width-character sparkline ('' if no numeric history)."""
+    buf = _trends.get(pv_name)
+    if buf is None or buf.count < 2:
+        return ''
+    cols = buf.decimate(width)
+    lo   = min(c[0] for c in cols)
+    hi   = max(c[1] for c in cols)
+    if hi == lo:
+        return SPARK_CHARS[0] * len(cols)
+    top = len(SPARK_CHARS) - 1
+    return ''.join(SPARK_CHARS[round(((a + b) / 2 - lo) / (hi - lo) * top)] for a, b in cols)
+
+
+# ── Trend plot view ───────────────────────────────────────────────────────────
+def plot_view(stdscr, pv, prefix):
+    """Full-screen min/max plot of one PV's trend buffer. Keeps fetching the PV while open."""
+    curses.curs_set(0)
+    last_fetch = 0.0
     while True:
         now = time.monotonic()
         if now - last_fetch >= REFRESH_SECS:
-            pv_list    = [p for p in pv_names_from_log(lp, prefix) if not p.endswith('_time')]
-            pv_vals, pv_sevs = fetch_pv_values(pv_list)
-            fetch_missing_rtypes(pv_list)
+            vals, sevs = fetch_pv_values([pv])
             last_fetch = now
-            ts         = time.strftime('%H:%M:%S')
-            status     = f'Updated {ts}  ({len(pv_list)} PVs)' if pv_list else 'No PVs found in log'
-            cursor     = min(cursor, max(0, len(pv_list) - 1))
 
         h, w = stdscr.getmaxyx()
         stdscr.erase()
-        draw_title(stdscr, f' {prefix} — PVs: {name} ')
-
-        if not pv_list:
-            safe_addstr(stdscr, 2, 2, 'No PVs found. Is the IOC running?',
-                        curses.color_pair(C_STOPPED))
+        draw_title(stdscr, f' {prefix} — Trend: {pv} ')
+        buf    = _trends.get(pv)
+        col_y  = 12                       # y-axis label width
+        plot_h = h - 5                    # title, x-axis, help and status rows
+        plot_w = w - col_y - 2
+
+        if buf is None or buf.count < 2 or plot_h < 2 or plot_w < 2:
+            safe_addstr(stdscr, 2, 2, 'Not enough numeric samples yet.', curses.color_pair(C_DIM))
         else:
-            col_pv    = max(len(p) for p in pv_list) + 2
-            col_alarm = 9
-            col_val   = max(w - col_pv - col_alarm - 4, 10)
-
-            # Column header
-            fill_row(stdscr, 1, curses.color_pair(C_HEADER) | curses.A_BOLD)
-            safe_addstr(stdscr, 1, 1,
-                        f'{"PV":<{col_pv}}{"VALUE":<{col_val}}{"ALARM":<{col_alarm}}'[:w - 2],
-                        curses.color_pair(C_HEADER) | curses.A_BOLD)
-
-            view_rows  = h - 4
-            max_scroll = max(0, len(pv_list) - view_rows)
-            scroll     = min(scroll, max_scroll)
-
-            for i, pv in enumerate(pv_list[scroll:scroll + view_rows]):
-                abs_idx   = scroll + i
-                row       = i + 2
-                writable  = is_pv_writable(pv)
-                val       = pv_vals.get(pv, '…')
-                if len(val) > col_val:
-                    val = val[:col_val - 3] + '...'
-                sev           = pv_sevs.get(pv)
-                alarm_display = f'{severity_label(sev):<{col_alarm}}'
-                pv_display    = f'{pv:<{col_pv}}'
-                if abs_idx == cursor:
-                    fill_row(stdscr, row, curses.color_pair(C_SELECTED) | curses.A_BOLD)
-                    safe_addstr(stdscr, row, 1,
-                                (pv_display + val + alarm_display)[:w - 2],
-                                curses.color_pair(C_SELECTED) | curses.A_BOLD)
-                elif not writable:
-                    ro_attr = curses.color_pair(C_READONLY)
-                    safe_addstr(stdscr, row, 1, pv_display, ro_attr)
-                    safe_addstr(stdscr, row, 1 + col_pv, val, ro_attr)
-                    safe_addstr(stdscr, row, 1 + col_pv + col_val, alarm_display, severity_attr(sev))
-                else:
-                    val_attr = (curses.color_pair(C_STOPPED)
-                                if 'disconnected' in val or 'error' in val
-                                else curses.color_pair(C_RUNNING))
-                    alarm_attr = severity_attr(sev)
-                    safe_addstr(stdscr, row, 1, pv_display, curses.color_pair(C_WRITABLE))
-                    safe_addstr(stdscr, row, 1 + col_pv, val, val_attr)
-                    safe_addstr(stdscr, row, 1 + col_pv + col_val, alarm_display, alarm_attr)
-
-        draw_help(stdscr, [('↑↓','select'),('Enter','set value'),('f','refresh'),('d','dbl()'),('q/Esc','back')])
-        draw_status(stdscr, f'  {status}')
+            cols = buf.decimate(plot_w)
+            lo   = min(c[0] for c in cols)
+            hi   = max(c[1] for c in cols)
+            if hi == lo:
+                lo, hi = lo - 0.5, hi + 0.5
+            scale = (plot_h - 1) / (hi - lo)
+            for r, label in ((0, hi), (plot_h // 2, (hi + lo) / 2), (plot_h - 1, lo)):
+                safe_addstr(stdscr, 1 + r, 0, f'{label:>{col_y - 1}.4g}', curses.color_pair(C_DIM))
+            for x, (a, b) in enumerate(cols):
+                top    = plot_h - 1 - round((b - lo) * scale)
+                bottom = plot_h - 1 - round((a - lo) * scale)
+                for r in range(top, bottom + 1):
+                    safe_addstr(stdscr, 1 + r, col_y + x, '█' if top == bottom else '│',
+                                curses.color_pair(C_RUNNING))
+            t0, t1 = buf.span()
+            axis   = (f'{time.strftime("%H:%M:%S", time.localtime(t0))}'
+                      f'{"":<{max(plot_w - 16, 1)}}'
+                      f'{time.strftime("%H:%M:%S", time.localtime(t1))}')
+            safe_addstr(stdscr, h - 3, col_y, axis, curses.color_pair(C_DIM))
+
+        draw_help(stdscr, [('f','refresh'),('t/q/Esc','back')])
+        count = buf.count if buf is not None else 0
+        draw_status(stdscr, f'  {pv}  now {vals.get(pv, "…")}  '
+                            f'{count}/{TREND_SAMPLES} samples')
         stdscr.refresh()
 
         stdscr.timeout(REFRESH_SECS * 1000)
         key = stdscr.getch()
-
-        if key in (ord('q'), 27):
+        if key in (ord('q'), ord('t'), 27):
             return
         elif key == ord('f'):
             last_fetch = 0.0
-        elif key == ord('d'):
-            if ioc_running(name):
-                Screen(name).send_commands('dbl()')
-                status = f'Sent dbl() to {name} — refreshing…'
-                time.sleep(1)         # give the IOC a moment to write to the log
-                last_fetch = 0.0
-            else:
-                status = f'{name} is not running'
-        elif key == curses.KEY_UP and pv_list:
-            cursor = max(0, cursor - 1)
-            scroll = min(scroll, cursor)
-        elif key == curses.KEY_DOWN and pv_list:
-            cursor = min(len(pv_list) - 1, cursor + 1)
-            scroll = max(scroll, cursor - (h - 5))
-        elif key == curses.KEY_PPAGE and pv_list:
-            cursor = max(0, cursor - (h - 4))
-            scroll = min(scroll, cursor)
-        elif key == curses.KEY_NPAGE and pv_list:
-            cursor = min(len(pv_list) - 1, cursor + (h - 4))
-            scroll = max(scroll, cursor - (h - 5))
-        elif key in (curses.KEY_ENTER, ord('\n'), ord('\r')) and pv_list:
-            pv = pv_list[cursor]
-            if not is_pv_writable(pv):
-                rtyp   = _rtyp_cache.get(pv) or 'input'
-                status = f'{pv} is read-only ({rtyp} record)'
-            else:
-                current = pv_vals.get(pv, '')
-                if 'disconnected' in current or 'error' in current:
-                    current = ''
-                confirmed, new_val = input_popup(stdscr, f'Set {pv}', current)
-                stdscr.clear()
-                if confirmed and new_val != '':
-                    status = caput_pv(pv, new_val)
-                    last_fetch = 0.0
 
 
-# ── All-IOCs PV view ──────────────────────────────────────────────────────────
-def all_pvs_view(stdscr, settings, names, prefix):
-    """Full-screen view of PVs from all currently running IOCs, grouped by IOC."""
+# ── PV row model ──────────────────────────────────────────────────────────────
+def fuzzy_match(needle, hay):
+    """True if the characters of needle appear in order in hay."""
+    it = iter(hay)
+    return all(c in it for c in needle)
+
+class PVRows:
+    """
+    Row model behind the PV views.
+
+    rows holds ('header', ioc, None) / ('pv', ioc, pv) tuples and is rebuilt
+    only when the PV inventory changes; column widths and the lowercased
+    'pv ioc desc' filter keys are computed at the same time. visible holds
+    indices into rows that pass the current filter, so drawing and cursor
+    movement only ever touch the on-screen slice.
+
+    Filter text is a substring, or a fuzzy subsequence when it starts with
+    '~'. alarm_only keeps PVs with a non-zero severity.
+    """
+
+    def __init__(self, headers=True):
+        self.headers    = headers
+        self.inventory  = None
+        self.rows       = []
+        self.keys       = []
+        self.col_pv     = 30
+        self.visible    = []
+        self.text       = ''
+        self.alarm_only = False
+        self._pv_idx    = []        # indices of 'pv' rows, the base for filtering
+        self._header    = []        # index of each row's IOC header row
+        self._last_text = None      # filter text `visible` was last narrowed with
+        self._last_alarm = False
+
+    @property
+    def pvs(self):
+        return [self.rows[i][2] for i in self._pv_idx]
+
+    def rebuild(self, ioc_pv_map):
+        """Rebuild rows from {ioc: [pv, ...]}; a no-op if the inventory is unchanged."""
+        inventory = tuple((n, tuple(pvs)) for n, pvs in ioc_pv_map.items())
+        if inventory == self.inventory:
+            return False
+        self.inventory = inventory
+        self.rows, self._pv_idx, self._header = [], [], []
+        for n, pvs in inventory:
+            head = len(self.rows)
+            if self.headers:
+                self.rows.append(('header', n, None))
+                self._header.append(head)
+            for pv in pvs:
+                self._pv_idx.append(len(self.rows))
+                self._header.append(head)
+                self.rows.append(('pv', n, pv))
+        self.col_pv = (max(len(r[2]) for r in self.rows if r[0] == 'pv') + 2
+                       if self._pv_idx else 30)
+        self.refresh_keys()
+        return True
+
+    def refresh_keys(self):
+        """Recompute filter keys, e.g. once DESC fields have arrived."""
+        self.keys = [f'{r[2]} {r[1]} {pv_desc(r[2])}'.lower() if r[0] == 'pv'
+                     else '' for r in self.rows]
+        self._last_text = None
+
+    def apply_filter(self, sevs):
+        """Recompute visible rows. Extending the previous filter text narrows the previous result."""
+        text = self.text.lower()
+        fuzzy = text.startswith('~')
+        needle = text[1:] if fuzzy else text
+        if (self._last_text is not None and not self.alarm_only and not self._last_alarm
+                and text.startswith(self._last_text) and self._last_text[:1] == text[:1]):
+            base = [i for i in self.visible if self.rows[i][0] == 'pv']
+        else:
+            base = self._pv_idx
+        if needle:
+            match = fuzzy_match if fuzzy else (lambda nd, hay: nd in hay)
+            base = [i for i in base if match(needle, self.keys[i])]
+        if self.alarm_only:
+            base = [i for i in base if sevs.get(self.rows[i][2])]
+        self._last_text  = text
+        self._last_alarm = self.alarm_only
+
+        if not self.headers:
+            self.visible = list(base)
+            return
+        visible, last_head = [], None
+        for i in base:
+            if self._header[i] != last_head:
+                last_head = self._header[i]
+                visible.append(last_head)
+            visible.append(i)
+        self.visible = visible
+
+    def is_header(self, pos):
+        return self.rows[self.visible[pos]][0] == 'header'
+
+    def pv_at(self, pos):
+        if 0 <= pos < len(self.visible) and not self.is_header(pos):
+            return self.rows[self.visible[pos]][2]
+        return None
+
+    def move(self, pos, step):
+        """Move a cursor position by step rows, skipping IOC headers to land on a PV row."""
+        n = len(self.visible)
+        if n == 0:
+            return 0
+        target = min(max(pos + step, 0), n - 1)
+        for direction in ((1, -1) if step >= 0 else (-1, 1)):
+            i = target
+            while 0 <= i < n and self.is_header(i):
+                i += direction
+            if 0 <= i < n:
+                return i
+        return 0
+
+
+def draw_pv_row(stdscr, row, pv, val, sev, selected, col_pv, col_val, col_alarm, w):
+    """Draw one PV line (name, value, trend, alarm) with the usual writable/read-only colours."""
+    writable = is_pv_writable(pv)
+    if len(val) > col_val:
+        val = val[:col_val - 3] + '...'
+    trend         = f'{sparkline(pv, TREND_COLS - 2):<{TREND_COLS}}'
+    alarm_display = f'{severity_label(sev):<{col_alarm}}'
+    pv_display    = f'{pv:<{col_pv}}'
+    x_trend       = 1 + col_pv + col_val
+    x_alarm       = x_trend + TREND_COLS
+    if selected:
+        fill_row(stdscr, row, curses.color_pair(C_SELECTED) | curses.A_BOLD)
+        safe_addstr(stdscr, row, 1,
+                    (pv_display + f'{val:<{col_val}}' + trend + alarm_display)[:w - 2],
+                    curses.color_pair(C_SELECTED) | curses.A_BOLD)
+    elif not writable:
+        ro_attr = curses.color_pair(C_READONLY)
+        safe_addstr(stdscr, row, 1, pv_display, ro_attr)
+        safe_addstr(stdscr, row, 1 + col_pv, val, ro_attr)
+        safe_addstr(stdscr, row, x_trend, trend, curses.color_pair(C_DIM))
+        safe_addstr(stdscr, row, x_alarm, alarm_display, severity_attr(sev))
+    else:
+        val_attr = (curses.color_pair(C_STOPPED)
+                    if 'disconnected' in val or 'error' in val
+                    else curses.color_pair(C_RUNNING))
+        safe_addstr(stdscr, row, 1, pv_display, curses.color_pair(C_WRITABLE))
+        safe_addstr(stdscr, row, 1 + col_pv, val, val_attr)
+        safe_addstr(stdscr, row, x_trend, trend, curses.color_pair(C_DIM))
+        safe_addstr(stdscr, row, x_alarm, alarm_display, severity_attr(sev))
+
+
+# ── PV views ──────────────────────────────────────────────────────────────────
+def pv_table_view(stdscr, settings, prefix, title, inventory, single_ioc=None):
+    """
+    Full-screen live PV table shared by the single-IOC and all-IOCs views.
+
+    inventory(sessions) returns {ioc: [pv, ...]}; it is called once per
+    refresh with that refresh's screen snapshot, and the row model is only
+    rebuilt when its result changes. single_ioc enables the dbl() key for
+    that IOC.
+    """
     curses.curs_set(0)
+    model      = PVRows(headers=single_ioc is None)
     scroll     = 0
     cursor     = 0
-    status     = 'Fetching…'
-    last_fetch = 0.0
-    entries    = []   # list of ('header', ioc_name) | ('pv', ioc_name, pv_name)
     pv_vals    = {}
     pv_sevs    = {}
-
-    def _move_cursor(entries, current, direction):
-        """Move cursor in direction (+1/-1), skipping header rows."""
-        i = current + direction
-        while 0 <= i < len(entries) and entries[i][0] == 'header':
-            i += direction
-        return i if 0 <= i < len(entries) else current
+    status     = 'Fetching…'
+    last_fetch = 0.0
+    editing    = False        # True while typing into the filter
 
     while True:
         now = time.monotonic()
         if now - last_fetch >= REFRESH_SECS:
-            running = [n for n in names if ioc_running(n)]
-            ioc_pv_map = {}
-            all_pvs = []
-            for n in running:
-                lp  = log_path(settings, n)
-                pvs = [p for p in pv_names_from_log(lp, prefix) if not p.endswith('_time')]
-                ioc_pv_map[n] = pvs
-                all_pvs.extend(pvs)
-
+            sessions   = screen_sessions()
+            ioc_pv_map = inventory(sessions)
+            model.rebuild(ioc_pv_map)
+            all_pvs = model.pvs
+            if ensure_pv_meta(ioc_pv_map, sessions):
+                model.refresh_keys()
             pv_vals, pv_sevs = fetch_pv_values(all_pvs)
-            fetch_missing_rtypes(all_pvs)
-
-            entries = []
-            for n in running:
-                entries.append(('header', n))
-                for pv in ioc_pv_map.get(n, []):
-                    entries.append(('pv', n, pv))
-
+            model.apply_filter(pv_sevs)
             last_fetch = now
             ts     = time.strftime('%H:%M:%S')
-            status = (f'Updated {ts}  ({len(running)} IOCs, {len(all_pvs)} PVs)'
-                      if running else 'No running IOCs found')
-            # Keep cursor on a valid pv row after refresh
-            cursor = min(cursor, max(0, len(entries) - 1))
-            if entries and entries[cursor][0] == 'header':
-                cursor = _move_cursor(entries, cursor, 1)
+            if single_ioc is not None:
+                status = f'Updated {ts}  ({len(all_pvs)} PVs)' if all_pvs else 'No PVs found in log'
+            else:
+                status = (f'Updated {ts}  ({len(ioc_pv_map)} IOCs, {len(all_pvs)} PVs)'
+                          if ioc_pv_map else 'No running IOCs found')
+            cursor = model.move(min(cursor, max(0, len(model.visible) - 1)), 0)
 
         h, w = stdscr.getmaxyx()
         stdscr.erase()
-        draw_title(stdscr, f' {prefix} — All Active PVs ')
+        draw_title(stdscr, title)
+        view_rows = h - 4
 
-        if not entries:
-            safe_addstr(stdscr, 2, 2, 'No running IOCs found.',
+        if not model.rows:
+            safe_addstr(stdscr, 2, 2,
+                        'No PVs found. Is the IOC running?' if single_ioc is not None
+                        else 'No running IOCs found.',
                         curses.color_pair(C_STOPPED))
         else:
-            pv_names_only = [e[2] for e in entries if e[0] == 'pv']
-            col_pv    = (max(len(p) for p in pv_names_only) + 2) if pv_names_only else 30
+            col_pv    = model.col_pv
             col_alarm = 9
-            col_val   = max(w - col_pv - col_alarm - 4, 10)
+            col_val   = max(w - col_pv - TREND_COLS - col_alarm - 4, 10)
 
             fill_row(stdscr, 1, curses.color_pair(C_HEADER) | curses.A_BOLD)
             safe_addstr(stdscr, 1, 1,
-                        f'{"PV":<{col_pv}}{"VALUE":<{col_val}}{"ALARM":<{col_alarm}}'[:w - 2],
+                        (f'{"PV":<{col_pv}}{"VALUE":<{col_val}}{"TREND":<{TREND_COLS}}'
+                         f'{"ALARM":<{col_alarm}}')[:w - 2],
                         curses.color_pair(C_HEADER) | curses.A_BOLD)
 
-            view_rows  = h - 4
-            max_scroll = max(0, len(entries) - view_rows)
-            scroll     = min(scroll, max_scroll)
+            max_scroll = max(0, len(model.visible) - view_rows)
+            scroll     = min(max(scroll, cursor - view_rows + 1), cursor, max_scroll)
+            scroll     = max(0, scroll)
 
-            for i, entry in enumerate(entries[scroll:scroll + view_rows]):
-                abs_idx = scroll + i
-                row     = i + 2
-                if entry[0] == 'header':
-                    label = f'  {entry[1]} '
+            for i, idx in enumerate(model.visible[scroll:scroll + view_rows]):
+                kind, ioc, pv = model.rows[idx]
+                row = i + 2
+                if kind == 'header':
                     fill_row(stdscr, row, curses.color_pair(C_TITLE) | curses.A_BOLD)
-                    safe_addstr(stdscr, row, 1, label[:w - 2],
+                    safe_addstr(stdscr, row, 1, f'  {ioc} '[:w - 2],
                                 curses.color_pair(C_TITLE) | curses.A_BOLD)
                 else:
-                    _, _, pv = entry
-                    writable  = is_pv_writable(pv)
                     val = pv_vals.get(pv, '…')
-                    if len(val) > col_val:
-                        val = val[:col_val - 3] + '...'
-                    sev           = pv_sevs.get(pv)
-                    alarm_display = f'{severity_label(sev):<{col_alarm}}'
-                    if abs_idx == cursor:
-                        fill_row(stdscr, row, curses.color_pair(C_SELECTED) | curses.A_BOLD)
-                        safe_addstr(stdscr, row, 1,
-                                    (f'{pv:<{col_pv}}' + val + alarm_display)[:w - 2],
-                                    curses.color_pair(C_SELECTED) | curses.A_BOLD)
-                    elif not writable:
-                        ro_attr = curses.color_pair(C_READONLY)
-                        safe_addstr(stdscr, row, 1, f'{pv:<{col_pv}}', ro_attr)
-                        safe_addstr(stdscr, row, 1 + col_pv, val, ro_attr)
-                        safe_addstr(stdscr, row, 1 + col_pv + col_val, alarm_display, severity_attr(sev))
-                    else:
-                        val_attr = (curses.color_pair(C_STOPPED)
-                                    if 'disconnected' in val or 'error' in val
-                                    else curses.color_pair(C_RUNNING))
-                        alarm_attr = severity_attr(sev)
-                        safe_addstr(stdscr, row, 1, f'{pv:<{col_pv}}', curses.color_pair(C_WRITABLE))
-                        safe_addstr(stdscr, row, 1 + col_pv, val, val_attr)
-                        safe_addstr(stdscr, row, 1 + col_pv + col_val, alarm_display, alarm_attr)
-
-        draw_help(stdscr, [('↑↓','select'),('Enter','set value'),('PgUp/Dn','page'),('f','refresh'),('q/Esc','back')])
-        draw_status(stdscr, f'  {status}')
+                    egu = _pv_meta.get(pv, {}).get('egu')
+                    if egu and pv in pv_sevs and pv_sevs[pv] is not None:
+                        val = f'{val} {egu}'
+                    draw_pv_row(stdscr, row, pv, val, pv_sevs.get(pv),
+                                scroll + i == cursor, col_pv, col_val, col_alarm, w)
+
+        flt = ('  filter: ' + (model.text or '')
+               + ('_' if editing else '') + ('  [alarming]' if model.alarm_only else '')
+               if editing or model.text or model.alarm_only else '')
+        if editing:
+            draw_help(stdscr, [('type','filter'),('~','fuzzy'),('Enter','done'),('Esc','clear')])
+        else:
+            keys = [('↑↓','select'),('Enter','set value'),('t','trend'),('/','filter'),
+                    ('A','alarming'),('f','refresh')]
+            if single_ioc is not None:
+                keys.append(('d','dbl()'))
+            draw_help(stdscr, keys + [('q/Esc','back')])
+        sel = model.pv_at(cursor)
+        label = pv_range_label(sel) if sel else ''
+        desc  = f'  {sel}: {label}' if label else ''
+        draw_status(stdscr, f'  {status}  ({len(model.visible)} shown){flt}{desc}')
         stdscr.refresh()
 
         stdscr.timeout(REFRESH_SECS * 1000)
         key = stdscr.getch()
 
+        if editing:
+            if key in (curses.KEY_ENTER, ord('\n'), ord('\r')):
+                editing = False
+            elif key == 27:
+                editing, model.text = False, ''
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                model.text = model.text[:-1]
+            elif 32 <= key <= 126:
+                model.text += chr(key)
+            else:
+                continue
+            model.apply_filter(pv_sevs)
+            cursor, scroll = model.move(0, 0), 0
+            continue
+
         if key in (ord('q'), 27):
             return
         elif key == ord('f'):
             last_fetch = 0.0
-        elif key == curses.KEY_UP and entries:
-            cursor = _move_cursor(entries, cursor, -1)
-            scroll = min(scroll, cursor)
-        elif key == curses.KEY_DOWN and entries:
-            cursor = _move_cursor(entries, cursor, 1)
-            scroll = max(scroll, cursor - (h - 5))
-        elif key == curses.KEY_PPAGE and entries:
-            cursor = max(0, cursor - (h - 4))
-            if entries[cursor][0] == 'header':
-                cursor = _move_cursor(entries, cursor, 1)
-            scroll = min(scroll, cursor)
-        elif key == curses.KEY_NPAGE and entries:
-            cursor = min(len(entries) - 1, cursor + (h - 4))
-            if entries[cursor][0] == 'header':
-                cursor = _move_cursor(entries, cursor, -1)
-            scroll = max(scroll, cursor - (h - 5))
-        elif key in (curses.KEY_ENTER, ord('\n'), ord('\r')) and entries:
-            if 0 <= cursor < len(entries) and entries[cursor][0] == 'pv':
-                _, _, pv = entries[cursor]
-                if not is_pv_writable(pv):
-                    rtyp   = _rtyp_cache.get(pv) or 'input'
-                    status = f'{pv} is read-only ({rtyp} record)'
-                else:
-                    current = pv_vals.get(pv, '')
-                    if 'disconnected' in current or 'error' in current:
-                        current = ''
-                    confirmed, new_val = input_popup(stdscr, f'Set {pv}', current)
-                    stdscr.clear()
-                    if confirmed and new_val != '':
-                        status = caput_pv(pv, new_val)
-                        last_fetch = 0.0
+        elif key == ord('/'):
+            editing = True
+        elif key == ord('t'):
+            pv = model.pv_at(cursor)
+            if pv is not None:
+                plot_view(stdscr, pv, prefix)
+                last_fetch = 0.0
+        elif key == ord('A'):
+            model.alarm_only = not model.alarm_only
+            model.apply_filter(pv_sevs)
+            cursor, scroll = model.move(0, 0), 0
+        elif key == ord('d') and single_ioc is not None:
+            if ioc_running(single_ioc):
+                from screenutils import Screen
+                Screen(single_ioc).send_commands('dbl()')
+                status = f'Sent dbl() to {single_ioc} — refreshing…'
+                time.sleep(1)         # give the IOC a moment to write to the log
+                last_fetch = 0.0
+            else:
+                status = f'{single_ioc} is not running'
+        elif key == curses.KEY_UP:
+            cursor = model.move(cursor, -1)
+        elif key == curses.KEY_DOWN:
+            cursor = model.move(cursor, 1)
+        elif key == curses.KEY_PPAGE:
+            cursor = model.move(cursor, -(h - 4))
+        elif key == curses.KEY_NPAGE:
+            cursor = model.move(cursor, h - 4)
+        elif key in (curses.KEY_ENTER, ord('\n'), ord('\r')):
+            pv = model.pv_at(cursor)
+            if pv is None:
+                continue
+            if not is_pv_writable(pv):
+                rtyp   = _pv_meta.get(pv, {}).get('rtyp') or 'input'
+                status = f'{pv} is read-only ({rtyp} record)'
+            else:
+                current = pv_vals.get(pv, '')
+                if 'disconnected' in current or 'error' in current:
+                    current = ''
+                meta  = _pv_meta.get(pv, {})
+                lo, hi = meta.get('drvl'), meta.get('drvh')
+                rng   = (f'  [{lo:g}..{hi:g} {meta.get("egu") or ""}]'.replace(' ]', ']')
+                         if lo is not None and hi is not None and lo < hi else '')
+                confirmed, new_val = input_popup(stdscr, f'Set {pv}{rng}', current)
+                stdscr.clear()
+                if confirmed and new_val != '':
+                    status = caput_pv(pv, new_val)
+                    last_fetch = 0.0
+
+
+def pv_view(stdscr, settings, name, prefix):
+    """Full-screen view of all PVs for one IOC with live values."""
+    lp = log_path(settings, name)
+
+    def inventory(sessions):
+        return {name: [p for p in pv_names_from_log(lp, prefix) if not p.endswith('_time')]}
+
+    pv_table_view(stdscr, settings, prefix, f' {prefix} — PVs: {name} ', inventory,
+                  single_ioc=name)
+
+
+def all_pvs_view(stdscr, settings, names, prefix):
+    """Full-screen view of PVs from all currently running IOCs, grouped by IOC."""
+    def inventory(sessions):
+        return {n: [p for p in pv_names_from_log(log_path(settings, n), prefix)
+                    if not p.endswith('_time')]
+                for n in names if ioc_running(n, sessions)}
+
+    pv_table_view(stdscr, settings, prefix, f' {prefix} — All Active PVs ', inventory)
 
 
 # ── Main TUI loop ──────────────────────────────────────────────────────────────
@@ -959,11 +1728,13 @@ def tui(stdscr):
     settings = load_settings()
     names    = ioc_names(settings)
     prefix   = settings['general']['prefix']
+    load_pv_meta(settings)
     selected = 0
     status   = 'Ready'
 
     while True:
-        draw_main(stdscr, settings, names, selected, status, prefix)
+        sessions = screen_sessions()     # one status snapshot per refresh
+        draw_main(stdscr, settings, names, selected, status, prefix, sessions)
 
         stdscr.timeout(REFRESH_SECS * 1000)
         key = stdscr.getch()
@@ -988,29 +1759,29 @@ def tui(stdscr):
             all_pvs_view(stdscr, settings, names, prefix)
             status = 'Returned from all PVs view'
         elif key == ord('s'):
-            status = suspended(stdscr, lambda: start_ioc(settings, name))
+            status = suspended(stdscr, lambda: start_ioc(settings, name, sessions))
         elif key == ord('x'):
-            status = suspended(stdscr, lambda: stop_ioc(name))
+            status = suspended(stdscr, lambda: stop_ioc(name, sessions))
         elif key == ord('r'):
-            status = suspended(stdscr, lambda: restart_ioc(settings, name))
+            status = suspended(stdscr, lambda: restart_ioc(settings, name, sessions))
         elif key == ord('l'):
             log_view(stdscr, settings, name, prefix)
             status = f'Returned from log: {name}'
         elif key == ord('a'):
-            if ioc_running(name):
+            if ioc_running(name, sessions):
                 do_attach(stdscr, name)
                 status = f'Detached from {name}'
             else:
                 status = f'{name} is not running'
         elif key == ord('S'):
             def start_all():
-                msgs = [start_ioc(settings, n) for n in names
+                msgs = [start_ioc(settings, n, sessions) for n in names
                         if settings[n].get('autostart', False)]
                 return ' | '.join(msgs) or 'Nothing to start'
             status = suspended(stdscr, start_all)
         elif key == ord('X'):
             def stop_all():
-                msgs = [stop_ioc(n) for n in names if ioc_running(n)]
+                msgs = [stop_ioc(n, sessions) for n in names if ioc_running(n, sessions)]
                 return ' | '.join(msgs) or 'Nothing running'
             status = suspended(stdscr, stop_all)
         elif key == ord('m'):
@@ -1019,16 +1790,161 @@ def tui(stdscr):
             status = suspended(stdscr, stop_manager)
         elif key == ord('R'):
             status = suspended(stdscr, restart_manager)
+        elif key == ord('/'):
+            status = search_view(stdscr, settings, names, prefix)
         elif key == ord('?'):
             help_view(stdscr, prefix)
 
 
-def main():
+# ── Headless commands ─────────────────────────────────────────────────────────
+def emit(rows, fmt):
+    """Write a list of flat dicts to stdout as JSON or CSV."""
+    if fmt == 'csv':
+        fields = list(rows[0]) if rows else []
+        writer = csv.DictWriter(sys.stdout, fieldnames=fields, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+def _plain(val):
+    """Convert an aioca value to something json/csv can write."""
+    if hasattr(val, 'tolist'):              # waveforms arrive as numpy arrays
+        return val.tolist()
+    for base in (int, float, str):          # aioca's augmented types subclass these
+        if isinstance(val, base):
+            return base(val)
+    return str(val)
+
+def _full_pv_name(prefix, pv):
+    return pv if pv.startswith(prefix + ':') else f'{prefix}:{pv}'
+
+def _select_iocs(settings, args_iocs):
+    names   = ioc_names(settings)
+    unknown = [n for n in args_iocs if n not in names]
+    if unknown:
+        raise SystemExit(f'unknown IOC: {", ".join(unknown)}')
+    return args_iocs or names
+
+def cmd_status(settings, args):
+    sessions = screen_sessions()
+    rows = [{'ioc': n,
+             'running': n in sessions,
+             'pid': sessions.get(n),
+             'autostart': bool(settings[n].get('autostart', False))}
+            for n in _select_iocs(settings, args.iocs)]
+    rows.append({'ioc': MANAGER_SCREEN, 'running': MANAGER_SCREEN in sessions,
+                 'pid': sessions.get(MANAGER_SCREEN), 'autostart': False})
+    return rows, 0
+
+def cmd_pvs(settings, args):
+    prefix   = settings['general']['prefix']
+    sessions = screen_sessions()
+    iocs     = args.iocs or [n for n in ioc_names(settings) if n in sessions]
+    rows = []
+    for n in _select_iocs(settings, iocs):
+        for pv in pv_names_from_log(log_path(settings, n), prefix):
+            rows.append({'ioc': n, 'pv': pv})
+    return rows, 0
+
+def cmd_get(settings, args):
+    prefix = settings['general']['prefix']
+    names  = [_full_pv_name(prefix, p) for p in args.pvs]
+    _ca()
+
+    async def _get():
+        return await aioca.caget(names, format=aioca.FORMAT_TIME, timeout=args.timeout, throw=False)
+
+    rows, rc = [], 0
+    for name, val in zip(names, _loop.run_until_complete(_get())):
+        if isinstance(val, aioca.CANothing):
+            rows.append({'pv': name, 'ok': False, 'value': None, 'severity': None,
+                         'timestamp': None, 'error': str(val)})
+            rc = 1
+        else:
+            rows.append({'pv': name, 'ok': True, 'value': _plain(val),
+                         'severity': int(val.severity), 'timestamp': val.timestamp,
+                         'error': None})
+    return rows, rc
+
+def cmd_put(settings, args):
+    prefix = settings['general']['prefix']
+    values = {}
+    for item in args.assignments:
+        pv, sep, value = item.partition('=')
+        if not sep:
+            raise SystemExit(f'expected PV=VALUE, got {item!r}')
+        values[_full_pv_name(prefix, pv)] = value
+    errors = caput_pvs(values)
+    rows = [{'pv': n, 'value': values[n], 'ok': errors[n] is None, 'error': errors[n]}
+            for n in values]
+    return rows, int(any(errors.values()))
+
+def cmd_control(settings, args):
+    names    = ioc_names(settings)
+    iocs     = ([n for n in names if settings[n].get('autostart', False)]
+                if args.all and args.command != 'stop' else
+                names if args.all else _select_iocs(settings, args.iocs))
+    if not iocs:
+        raise SystemExit('no IOCs given (name them or use --all)')
+    sessions = screen_sessions()
+    rows = []
+    for n in iocs:
+        if args.command == 'start':
+            msg = start_ioc(settings, n, sessions)
+        elif args.command == 'stop':
+            msg = stop_ioc(n, sessions)
+        else:
+            msg = restart_ioc(settings, n, sessions)
+        rows.append({'ioc': n, 'result': msg.split(': ', 1)[-1]})
+    return rows, 0
+
+COMMANDS = {
+    'status': cmd_status, 'pvs': cmd_pvs, 'get': cmd_get, 'put': cmd_put,
+    'start': cmd_control, 'stop': cmd_control, 'restart': cmd_control,
+}
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='IOC Commander. Without a command, runs the interactive TUI.')
+    fmt = argparse.ArgumentParser(add_help=False)
+    fmt.add_argument('--format', choices=('json', 'csv'), default='json',
+                     help='Output format (default json)')
+    sub = parser.add_subparsers(dest='command')
+
+    p = sub.add_parser('status', parents=[fmt], help='Running state of IOCs and the manager')
+    p.add_argument('iocs', nargs='*')
+    p = sub.add_parser('pvs', parents=[fmt], help='PV names published by IOCs')
+    p.add_argument('iocs', nargs='*')
+    p = sub.add_parser('get', parents=[fmt], help='Read PVs in one batched caget')
+    p.add_argument('pvs', nargs='+')
+    p.add_argument('--timeout', type=float, default=2.0)
+    p = sub.add_parser('put', parents=[fmt], help='Write PVs in one batched caput')
+    p.add_argument('assignments', nargs='+', metavar='PV=VALUE')
+    for name in ('start', 'stop', 'restart'):
+        p = sub.add_parser(name, parents=[fmt], help=f'{name.capitalize()} IOCs')
+        p.add_argument('iocs', nargs='*')
+        p.add_argument('--all', action='store_true',
+                       help='All IOCs (autostart IOCs only for start/restart)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global curses
+    args = parse_args(sys.argv[1:] if argv is None else argv)
     os.chdir(PROJECT_ROOT)
     settings = load_settings()
     os.environ['EPICS_CA_ADDR_LIST']      = settings['general']['epics_addr_list']
     os.environ['EPICS_CA_AUTO_ADDR_LIST'] = 'NO'
 
+    if args.command:
+        rows, rc = COMMANDS[args.command](settings, args)
+        emit(rows, args.format)
+        return rc
+
+    import curses
+
     # Suppress CA library disconnect/connect noise (written at the C fd level)
     # so it doesn't corrupt the curses display.
     devnull = os.open(os.devnull, os.O_WRONLY)
@@ -1045,4 +1961,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
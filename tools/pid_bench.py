@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Closed-loop PID latency, jitter and settling benchmark.
+
+Runs the PID IOC from settings.yaml (pid_temp by default) against a
+simulated first-order thermal plant (logic_devices.thermal_plant) on a
+private CA port, optionally next to extra simulated IOCs loading the host.
+For each combination of PID 'delay' and co-hosted IOC count it measures:
+
+    sense_to_actuate  time from a timestamped input change (a sensor offset
+                      written to Test_TI_DIST) to the first heater write after it
+    period_error      |interval between heater writes - delay|
+    settling_s        time for Test_TI to stay within --band of a setpoint step
+
+    python tools/pid_bench.py --delays 0.2,0.5,1 --cohosted 0,4,8 -o pid.json
+"""
+import argparse
+import asyncio
+import bisect
+import copy
+import os
+import random
+import statistics
+import sys
+import time
+
+import yaml
+
+from benchlib import (DEFAULT_PORT, PROJECT_ROOT, LocalIOC, isolate_ca, run_metadata,
+                      sim_settings, summarize, wait_for_pvs, write_results)
+
+TEMP, HEATER = 'Test_TI', 'Test_Heater_CI'
+
+
+def pid_template(ioc):
+    with open(os.path.join(PROJECT_ROOT, 'settings.yaml')) as f:
+        settings = yaml.safe_load(f)
+    if ioc not in settings:
+        sys.exit(f'{ioc} not in settings.yaml')
+    return settings[ioc]
+
+
+def build_iocs(template, prefix, delay, cohosted, args):
+    pid = copy.deepcopy(template)
+    pid['delay'] = delay
+    pid['input_pv'] = f'{prefix}:{TEMP}'
+    pid['output_pv'] = f'{prefix}:{HEATER}'
+    pid.setdefault('outs', {})
+    pid['outs']['auto_start'] = True
+    pid['outs']['setpoint'] = args.setpoint
+    iocs = {
+        'bench_plant': {'module': 'logic_devices.thermal_plant', 'delay': args.plant_delay,
+                        'heater': HEATER, 'temperature': TEMP, 'ambient': args.ambient,
+                        'gain': args.gain, 'tau': args.tau, 'channels': []},
+        'bench_pid': pid,
+    }
+    for n in range(cohosted):
+        iocs[f'bench_load{n}'] = sim_settings(inputs=args.load_inputs, outputs=(), delay=0.05,
+                                              counter=f'Load{n}_Counter')
+        iocs[f'bench_load{n}']['channels'] = [f'Load{n}_{c}' for c in iocs[f'bench_load{n}']['channels']]
+    return iocs
+
+
+async def measure(ioc, sp_pv, delay, args):
+    import aioca
+    heater_ts, temps = [], []        # heater write timestamps; (timestamp, value) of temperature
+    dist_ts = []
+
+    heater_sub = aioca.camonitor(ioc.pv(HEATER), lambda v: heater_ts.append(v.timestamp),
+                                 format=aioca.FORMAT_TIME)
+    temp_sub = aioca.camonitor(ioc.pv(TEMP), lambda v: temps.append((v.timestamp, float(v))),
+                               format=aioca.FORMAT_TIME)
+    dist_sub = aioca.camonitor(ioc.pv(TEMP + '_DIST'), lambda v: dist_ts.append(v.timestamp),
+                               format=aioca.FORMAT_TIME)
+
+    # Settle at the initial setpoint, then step it and watch the response.
+    await asyncio.sleep(args.warmup)
+    step_sp = args.setpoint + args.step
+    t_step = time.time()
+    await aioca.caput(sp_pv, step_sp)
+    await asyncio.sleep(args.duration)
+
+    # Sensor-offset pulses at random phases of the PID period.
+    dist_ts.clear()
+    for i in range(args.pulses):
+        await asyncio.sleep(delay * (1.5 + random.random()))
+        await aioca.caput(ioc.pv(TEMP + '_DIST'), args.pulse if i % 2 == 0 else 0.0)
+    await asyncio.sleep(delay * 2)
+
+    for sub in (heater_sub, temp_sub, dist_sub):
+        sub.close()
+
+    latencies = []
+    for t in dist_ts:
+        i = bisect.bisect_right(heater_ts, t)
+        if i < len(heater_ts):
+            latencies.append((heater_ts[i] - t) * 1000)
+
+    intervals = [b - a for a, b in zip(heater_ts, heater_ts[1:])]
+    period_error = [abs(x - delay) * 1000 for x in intervals]
+
+    band = abs(args.step) * args.band
+    settled_at = None
+    for ts, value in temps:
+        if ts < t_step:
+            continue
+        if abs(value - step_sp) <= band:
+            if settled_at is None:
+                settled_at = ts
+        else:
+            settled_at = None
+
+    return {
+        'sense_to_actuate': summarize(latencies),
+        'period_error': summarize(period_error,
+                                  period_std_ms=statistics.pstdev(intervals) * 1000
+                                  if len(intervals) > 1 else None),
+        'settling_s': None if settled_at is None else settled_at - t_step,
+    }
+
+
+def run_config(template, delay, cohosted, args):
+    iocs = build_iocs(template, 'BENCH', delay, cohosted, args)
+    channel = template['channels'][0]
+    with LocalIOC(iocs) as ioc:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        sp_pv = ioc.pv(f'{channel}_SP')
+        loop.run_until_complete(wait_for_pvs([ioc.pv(TEMP), ioc.pv(HEATER), sp_pv], timeout=60))
+        return loop.run_until_complete(measure(ioc, sp_pv, delay, args))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--pid-ioc', default='pid_temp', help='PID entry in settings.yaml to benchmark')
+    parser.add_argument('--delays', default='0.2,0.5,1', help='PID delay values to sweep (s)')
+    parser.add_argument('--cohosted', default='0,4', help='Extra simulated IOC counts to sweep')
+    parser.add_argument('--load-inputs', type=int, default=50, help='Inputs per co-hosted IOC')
+    parser.add_argument('--setpoint', type=float, default=4.5)
+    parser.add_argument('--step', type=float, default=1.0, help='Setpoint step (K)')
+    parser.add_argument('--band', type=float, default=0.02, help='Settling band, fraction of step')
+    parser.add_argument('--pulse', type=float, default=0.01, help='Sensor offset pulse (K)')
+    parser.add_argument('--pulses', type=int, default=40)
+    parser.add_argument('--warmup', type=float, default=20.0)
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds after the setpoint step')
+    parser.add_argument('--ambient', type=float, default=4.0)
+    parser.add_argument('--gain', type=float, default=0.05)
+    parser.add_argument('--tau', type=float, default=5.0)
+    parser.add_argument('--plant-delay', type=float, default=0.05)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('-o', '--out', default='-')
+    args = parser.parse_args(argv)
+
+    isolate_ca(args.port)
+    template = pid_template(args.pid_ioc)
+    results = {}
+    for delay in [float(d) for d in args.delays.split(',') if d]:
+        for cohosted in [int(c) for c in args.cohosted.split(',') if c]:
+            print(f'delay {delay} s, {cohosted} co-hosted IOC(s)…', file=sys.stderr)
+            results[f'delay_{delay}_cohosted_{cohosted}'] = dict(
+                delay=delay, cohosted=cohosted, **run_config(template, delay, cohosted, args))
+
+    params = {k: v for k, v in vars(args).items() if k != 'out'}
+    write_results(args.out, {'meta': run_metadata(**params), 'results': results})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
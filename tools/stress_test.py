@@ -1,55 +1,95 @@
-import epics
-import time
-import threading
+"""
+Put-path stress test against one writable PV.
+
+    python tools/stress_test.py                         # closed loop: wait for each ack
+    python tools/stress_test.py --rate 200 --duration 20
+    python tools/stress_test.py --rates 10,20,50,100,200,500
+    python tools/stress_test.py --pv TGT:MEOP:Some_VC [--ack TGT:MEOP:Some_VC_RBV]   # a live PV
+
+By default a throwaway simulated IOC (logic_devices.sim) is started on a
+private CA port, and puts go to its Sim_VC with acks read from the echo on
+Sim_VC_RBV, so no plant hardware is touched. --pv targets a live PV
+instead; the ack is then its own monitor unless --ack names a readback.
+
+Closed loop sends the next put only after the previous ack, so it hides
+queueing delay. Open loop (--rate/--rates) sends on a fixed schedule whether
+or not earlier puts were acknowledged, and measures each latency from the
+put's intended send time into an HDR-style histogram, so stalls are charged
+to every put they delay (no coordinated omission). A put never acked is
+charged as a latency up to the end of the grace period. Stepping through
+--rates prints the achieved-throughput curve of the put path.
+"""
+import argparse
+import asyncio
+import json
 import random
 import statistics
+import time
+
+import aioca
+
+from benchlib import DEFAULT_PORT, Histogram, LocalIOC, isolate_ca, sim_settings, wait_for_pvs
 
-TARGET_PV = 'TGT:MEOP:Voltage1_VC'
+IOC_NAME = 'stress_sim'
 BURST_SIZE = 100  # Number of back-to-back updates
+VALUE_LOW, VALUE_HIGH = 0.1, 3.9   # Stay away from hard limits
+VALUE_STEP = 0.0001                # Open-loop puts use distinct values on this grid
+ACK_GRACE = 2.0                    # Seconds to wait for stragglers after an open-loop run
+
+
+def value_key(value):
+    return round(float(value) / VALUE_STEP)
 
 
 class StressBenchmark:
-    def __init__(self):
+    def __init__(self, pv_name, ack_name=None):
+        self.pv_name = pv_name
+        self.ack_name = ack_name or pv_name
         self.latencies = []
-        self.event = threading.Event()
-        self.start_time = None
         self.last_value = 0
-        self.pv = epics.PV(TARGET_PV, callback=self.on_change)
-
-    def on_change(self, value=None, **kw):
-        if self.start_time is not None:
-            end_time = time.perf_counter()
-            self.latencies.append((end_time - self.start_time) * 1000)
-            self.start_time = None
-            self.event.set()
 
     def get_new_random(self):
         while True:
-            new_val = random.uniform(0.1, 3.9)  # Stay away from hard limits
+            new_val = random.uniform(VALUE_LOW, VALUE_HIGH)
             if abs(new_val - self.last_value) >= 0.3:
                 return new_val
 
-    def run_stress_test(self):
-        print(f"Connecting to {TARGET_PV}...")
-        if not self.pv.wait_for_connection(timeout=5):
+    async def connect(self):
+        print(f"Connecting to {self.pv_name}...")
+        try:
+            await wait_for_pvs([self.pv_name, self.ack_name], timeout=30)   # a local IOC needs to boot
+        except TimeoutError:
             print("Connection Failed.")
-            return
+            return False
+        return True
 
+    async def run_stress_test(self):
+        if not await self.connect():
+            return
         print(f"Starting Stress Test: {BURST_SIZE} rapid-fire updates...")
-        self.last_value = self.pv.get()
+        self.last_value = float(await aioca.caget(self.pv_name))
+        pending = {}
+        arrived = asyncio.Event()
 
-        test_start = time.perf_counter()
+        def on_ack(value):
+            t0 = pending.pop(value_key(value), None)
+            if t0 is not None:
+                self.latencies.append((time.perf_counter() - t0) * 1000)
+                arrived.set()
 
+        sub = aioca.camonitor(self.ack_name, on_ack)
+        test_start = time.perf_counter()
         for i in range(BURST_SIZE):
-            self.event.clear()
-            target_val = self.get_new_random()
+            arrived.clear()
+            target_val = round(self.get_new_random() / VALUE_STEP) * VALUE_STEP
             self.last_value = target_val
-
-            self.start_time = time.perf_counter()
-            self.pv.put(target_val)
+            pending[value_key(target_val)] = time.perf_counter()
+            await aioca.caput(self.pv_name, target_val)
 
             # Wait for response, but with a shorter timeout for stress
-            if not self.event.wait(timeout=0.5):
+            try:
+                await asyncio.wait_for(arrived.wait(), 0.5)
+            except asyncio.TimeoutError:
                 print(f"!!! SATURATION REACHED at iteration {i} !!!")
                 break
 
@@ -58,14 +98,11 @@ class StressBenchmark:
             if i % 10 == 0 and i > 0:
                 recent_avg = sum(self.latencies[-10:]) / 10
                 print(f"Progress: {i}/{BURST_SIZE} | Recent Latency Avg: {recent_avg:.3f} ms")
-
-        test_end = time.perf_counter()
-        total_time = test_end - test_start
-
-        self.print_results(total_time)
+        sub.close()
+        self.print_results(time.perf_counter() - test_start)
 
     def print_results(self, total_time):
-        if not self.latencies: return
+        if len(self.latencies) < 2: return
         print(f"\n" + "=" * 30)
         print(f"STRESS TEST COMPLETE")
         print(f"=" * 30)
@@ -78,6 +115,104 @@ class StressBenchmark:
         print(f"Max Latency (Peak): {max(self.latencies):.3f} ms")
         print(f"=" * 30)
 
+    # ── Open loop ─────────────────────────────────────────────────────────────
+    async def run_open_loop(self, rate, duration):
+        """
+        Issue puts at a fixed rate for duration seconds without waiting for
+        acks. Returns a histogram summary with target and achieved rates.
+        Acks arrive on this event loop, and each run has its own histogram and
+        subscription, so a late ack can never touch a later run.
+        """
+        histogram = Histogram()
+        intended = {}     # value key -> intended send time of a put not yet acked
+
+        def on_ack(value):
+            sent = intended.pop(value_key(value), None)
+            if sent is not None:
+                histogram.record((time.perf_counter() - sent) * 1000)
+
+        sub = aioca.camonitor(self.ack_name, on_ack)
+        await asyncio.sleep(0.5)                 # let the initial update go by
+        slots = int((VALUE_HIGH - VALUE_LOW) / VALUE_STEP)
+        total = int(rate * duration)
+        interval = 1.0 / rate
+        late = 0
+        puts = []
+
+        t0 = time.perf_counter()
+        for i in range(total):
+            when = t0 + i * interval
+            now = time.perf_counter()
+            if when > now:
+                await asyncio.sleep(when - now)
+            elif now - when > interval:
+                late += 1               # sender fell behind; latency still counts from `when`
+            value = VALUE_LOW + (i % slots) * VALUE_STEP
+            intended[value_key(value)] = when
+            puts.append(asyncio.ensure_future(aioca.caput(self.pv_name, value, throw=False)))
+        send_end = time.perf_counter()
+
+        deadline = send_end + ACK_GRACE
+        while intended and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        sub.close()
+        await asyncio.gather(*puts)
+        acked = histogram.total
+        lost = len(intended)              # never acked: merged monitor events or dropped puts
+        for sent in intended.values():    # charged as waiting until we gave up on them
+            histogram.record((deadline - sent) * 1000)
+        elapsed = max(time.perf_counter() - t0 - (ACK_GRACE if lost else 0), send_end - t0)
+        return histogram.summary(target_rate=rate, sent=total,
+                                 achieved_rate=acked / elapsed if elapsed else 0.0,
+                                 lost=lost, late_sends=late)
+
+    async def run_rate_sweep(self, rates, duration):
+        if not await self.connect():
+            return []
+        curve = []
+        print(f"{'TARGET/s':>10}{'ACHIEVED/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+              f"{'p99.9 ms':>10}{'max ms':>10}{'LOST':>7}")
+        for rate in rates:
+            r = await self.run_open_loop(rate, duration)
+            curve.append(r)
+            fmt = lambda v: f"{v:>10.2f}" if v is not None else f"{'-':>10}"
+            print(f"{rate:>10.1f}{r['achieved_rate']:>12.1f}{fmt(r['p50'])}{fmt(r['p99'])}"
+                  f"{fmt(r['p99.9'])}{fmt(r['max'])}{r['lost']:>7}")
+        saturated = [r for r in curve if r['achieved_rate'] < 0.95 * r['target_rate']]
+        if saturated:
+            print(f"Saturation: {saturated[0]['target_rate']:.1f}/s target "
+                  f"-> {max(r['achieved_rate'] for r in curve):.1f}/s peak achieved")
+        return curve
+
+
+def run(args, pv, ack):
+    bench = StressBenchmark(pv, ack)
+    loop = asyncio.new_event_loop()     # kept open: aioca's threads outlive a closed loop badly
+    asyncio.set_event_loop(loop)
+    if args.rate or args.rates:
+        rates = [args.rate] if args.rate else [float(r) for r in args.rates.split(",") if r]
+        curve = loop.run_until_complete(bench.run_rate_sweep(rates, args.duration))
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"pv": pv, "ack": ack, "duration": args.duration, "curve": curve}, f, indent=2)
+    else:
+        loop.run_until_complete(bench.run_stress_test())
+
 
 if __name__ == "__main__":
-    StressBenchmark().run_stress_test()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Put-path stress test.")
+    parser.add_argument("--pv", help="Live PV to put to (default: Sim_VC of a local simulated IOC)")
+    parser.add_argument("--ack", help="PV whose monitor acknowledges a put (default: the put PV)")
+    parser.add_argument("--rate", type=float, help="Open loop at this many puts/s")
+    parser.add_argument("--rates", help="Open loop, stepping through comma-separated rates")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per open-loop rate")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Private CA port for the local IOC")
+    parser.add_argument("-o", "--out", help="Write the open-loop curve as JSON")
+    args = parser.parse_args()
+
+    if args.pv:
+        run(args, args.pv, args.ack)
+    else:
+        isolate_ca(args.port)
+        with LocalIOC({IOC_NAME: sim_settings(inputs=1, delay=0.1)}) as ioc:
+            run(args, ioc.pv('Sim_VC'), ioc.pv('Sim_VC_RBV'))